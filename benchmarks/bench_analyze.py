@@ -0,0 +1,76 @@
+"""
+Measures analyzer throughput (MB/s) & peak memory on large documents, for
+``make_tokens`` + ``make_ngrams`` against the streaming ``make_terms``.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_analyze --megabytes 1 8
+"""
+import argparse
+import io
+import random
+import time
+import tracemalloc
+
+from pysearch import tokenization
+
+from . import corpus
+
+
+def make_blob(megabytes, seed=0):
+    """
+    Builds a text blob of about ``megabytes`` MB, with a few punctuated
+    sentences & paragraphs, from a mid-sized vocabulary.
+    """
+    rng = random.Random(seed)
+    vocabulary = corpus.WORDS + corpus.make_vocabulary(5000, seed)
+    target = megabytes * 1024 * 1024
+    paragraphs = []
+    size = 0
+
+    while size < target:
+        paragraph = '. '.join(corpus.make_text(rng, 12, vocabulary).capitalize() for _ in range(10)) + '.'
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+
+    return '\n\n'.join(paragraphs)
+
+
+def list_based(blob):
+    tokens = tokenization.make_tokens(blob)
+    return tokenization.make_ngrams(tokens), len(tokens)
+
+
+def measured(label, blob, callback):
+    start = time.perf_counter()
+    callback()
+    elapsed = time.perf_counter() - start
+
+    # Tracing slows everything down, so memory gets its own run.
+    tracemalloc.start()
+    callback()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    megabytes = len(blob.encode('utf-8')) / (1024 * 1024)
+    print('{0:<24} {1:>6.1f} MB {2:>8.2f} MB/s {3:>9.1f} MB peak'.format(
+        label, megabytes, megabytes / elapsed, peak / (1024 * 1024)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--megabytes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--chunk-size', type=int, default=tokenization.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    for megabytes in args.megabytes:
+        blob = make_blob(megabytes)
+
+        measured('make_tokens+make_ngrams', blob, lambda: list_based(blob))
+        measured('make_terms (str)', blob, lambda: tokenization.make_terms(blob, chunk_size=args.chunk_size))
+        measured('make_terms (file)', blob,
+                 lambda: tokenization.make_terms(io.StringIO(blob), chunk_size=args.chunk_size))
+
+
+if __name__ == '__main__':
+    main()
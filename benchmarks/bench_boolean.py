@@ -0,0 +1,96 @@
+"""
+Compares ``AND`` queries run by the boolean query engine (postings cursors
+with skip pointers, only scoring the matches) with plain queries for the
+same words, which score every document with any of them.
+
+Each query pairs a word found in most documents with a rare one, where
+walking the postings by the shortest list pays off the most.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_boolean --docs 5000 --queries 500
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from pysearch import PySearch
+from pysearch import booleanQuery
+
+from . import corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--vocabulary', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    vocabulary = corpus.make_vocabulary(args.vocabulary)
+    rng = random.Random(1)
+    # A handful of words go in most documents, the others are rare.
+    common, rare = vocabulary[:5], vocabulary[5:]
+    documents = []
+
+    for doc_id, document in corpus.make_documents(args.docs, length=60, vocabulary=rare):
+        document['text'] += ' ' + ' '.join(rng.sample(common, 3))
+        documents.append((doc_id, document))
+
+    pairs = [(rng.choice(common), rng.choice(rare)) for _ in range(args.queries)]
+    base = tempfile.mkdtemp()
+
+    try:
+        PySearch.PySearch(base, document_store='packed').bulk_index(documents)
+
+        variants = [
+            ('plain (union)', lambda pair: ('{0} {1}'.format(*pair), {})),
+            ('boolean AND', lambda pair: ('{0} AND {1}'.format(*pair), {'boolean': True})),
+        ]
+
+        for label, make_query in variants:
+            engine = PySearch.PySearch(base)
+            hits = 0
+            start = time.perf_counter()
+
+            for pair in pairs:
+                query, options = make_query(pair)
+                hits += engine.search(query, limit=args.limit, **options)['total_hits']
+
+            seconds = time.perf_counter() - start
+            print('{0:<16} {1:>6} queries {2:>8.2f}s {3:>8.2f}ms/query {4:>10.1f} hits/query'.format(
+                label, len(pairs), seconds, 1000 * seconds / len(pairs), hits / len(pairs)))
+
+        # The intersection alone, on postings already in memory.
+        engine = PySearch.PySearch(base)
+        loaded = [engine.load_postings_many([word[:6] for word in pair], counts=True) for pair in pairs]
+        trees = [booleanQuery.parse('{0} AND {1}'.format(*pair)) for pair in pairs]
+        start = time.perf_counter()
+
+        for tree, postings in zip(trees, loaded):
+            booleanQuery.evaluate(tree, {term: ordinals for term, (ordinals, _, _) in postings.items()}, [])
+
+        cursors = time.perf_counter() - start
+        start = time.perf_counter()
+
+        for postings in loaded:
+            per_doc = {}
+
+            for term, (ordinals, _, _) in postings.items():
+                for ordinal in ordinals:
+                    per_doc.setdefault(ordinal, []).append(term)
+
+            [ordinal for ordinal, terms in per_doc.items() if len(terms) == len(postings)]
+
+        union = time.perf_counter() - start
+        print('intersection only: cursors {0:.3f}s, per-doc union {1:.3f}s ({2:.1f}x)'.format(
+            cursors, union, union / cursors))
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
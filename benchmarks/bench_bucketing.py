@@ -0,0 +1,90 @@
+"""
+Compares the bucketing strategies (see ``pysearch.bucketing``): how fast a
+term is hashed, how fast documents are ingested & how evenly the terms are
+spread over the segments, on a corpus mixing ASCII & non-ASCII words.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_bucketing --docs 2000 --words 5000
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from pysearch import PySearch
+from pysearch import bucketing
+
+from .corpus import make_documents, make_vocabulary
+
+# Mapped onto ASCII letters to make non-ASCII words, e.g. Cyrillic & Greek.
+ALPHABETS = ['абвгдежзийклмнопрстуфхцчшщ', 'αβγδεζηθικλμνξοπρστυφχψωάέ']
+
+
+def make_multilingual_vocabulary(count, seed=0):
+    """
+    Builds ``count`` words, a third of them ASCII & the rest transliterated
+    into other alphabets.
+    """
+    rng = random.Random(seed)
+    words = []
+
+    for number, word in enumerate(make_vocabulary(count, seed)):
+        if number % 3:
+            alphabet = rng.choice(ALPHABETS)
+            word = ''.join(alphabet[ord(letter) - ord('a')] for letter in word)
+
+        words.append(word)
+
+    return words
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=5000)
+    parser.add_argument('--buckets', type=int, nargs='+', default=[256, 1024, 4096])
+    args = parser.parse_args()
+
+    vocabulary = make_multilingual_vocabulary(args.words)
+    documents = list(make_documents(args.docs, vocabulary=vocabulary))
+    strategies = [('md5', None)] + [('crc32', buckets) for buckets in args.buckets]
+
+    print('{0:<14} {1:>12} {2:>9} {3:>9} {4:>11} {5:>11} {6:>11}'.format(
+        'bucketing', 'hash ns/term', 'ingest s', 'segments', 'p50 terms', 'max terms', 'max KB'))
+
+    for name, buckets in strategies:
+        strategy = bucketing.make_strategy(name, buckets)
+        base = tempfile.mkdtemp()
+
+        try:
+            engine = PySearch.PySearch(base, bucketing=name, buckets=buckets)
+            grams = set()
+
+            for _, document in documents[:200]:
+                grams.update(engine.analyze(document['text'])[0])
+
+            grams = list(grams)
+            start = time.perf_counter()
+
+            for _ in range(10):
+                for term in grams:
+                    strategy.bucket(term)
+
+            hashing = 1e9 * (time.perf_counter() - start) / (10 * len(grams))
+            start = time.perf_counter()
+            engine.bulk_index(documents, max_docs=500)
+            ingest = time.perf_counter() - start
+            stats = engine.bucket_stats()
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+        label = name if buckets is None else '{0}/{1}'.format(name, buckets)
+        print('{0:<14} {1:>12.0f} {2:>9.2f} {3:>9} {4:>11} {5:>11} {6:>11.1f}'.format(
+            label, hashing, ingest, stats['buckets'], stats['terms']['p50'], stats['terms']['max'],
+            stats['bytes']['max'] / 1024))
+
+
+if __name__ == '__main__':
+    main()
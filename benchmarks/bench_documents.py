@@ -0,0 +1,86 @@
+"""
+Compares the document stores: disk usage & the latency of loading a page of
+random documents, for a JSON file per document against the packed store, in
+full & with only a small field projected out of them.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_documents --docs 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from pysearch import docIdTable
+from pysearch import documentStore
+
+from . import corpus
+
+
+def disk_usage(path):
+    total = 0
+
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            # Every file takes at least a block.
+            total += max(4096, os.path.getsize(os.path.join(directory, filename)))
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--length', type=int, default=150)
+    parser.add_argument('--block-size', type=int, default=16 * 1024)
+    args = parser.parse_args()
+
+    documents = [(doc_id, dict(document, subject='Re: {0}'.format(doc_id)))
+                 for doc_id, document in corpus.make_documents(args.docs, length=args.length)]
+    rng = random.Random(0)
+    pages = [[rng.choice(documents)[0] for _ in range(args.page_size)] for _ in range(args.pages)]
+
+    with tempfile.TemporaryDirectory() as base:
+        doc_ids = docIdTable.DocIdTable(os.path.join(base, 'docids'))
+        stores = [('files', documentStore.FileDocumentStore(os.path.join(base, 'files')))]
+
+        for codec in ('none', 'zlib', 'zstd'):
+            if codec == 'zstd' and documentStore.zstandard is None:
+                continue
+
+            path = os.path.join(base, codec)
+            os.makedirs(path)
+            stores.append(('packed ({0})'.format(codec), documentStore.PackedDocumentStore(
+                path, doc_ids, codec=codec, block_size=args.block_size)))
+
+        for label, store in stores:
+            start = time.perf_counter()
+
+            for doc_id, document in documents:
+                store.save(doc_id, document)
+
+            store.flush()
+            saved = time.perf_counter() - start
+
+            start = time.perf_counter()
+
+            for page in pages:
+                store.read_many(page)
+
+            loaded = (time.perf_counter() - start) / args.pages
+            start = time.perf_counter()
+
+            for page in pages:
+                store.read_many(page, fields=['subject'])
+
+            projected = (time.perf_counter() - start) / args.pages
+            print('{0:<16} {1:>8.1f}MB on disk {2:>8.2f}s to save {3:>8.2f}ms per page {4:>8.2f}ms projected'.format(
+                label, disk_usage(store.docs_path) / 2 ** 20, saved, loaded * 1000, projected * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares ingest throughput of ``PySearch.index`` (per document) with
+``PySearch.bulk_index`` (batched segment flushes).
+
+Run from the repository root::
+
+    python -m benchmarks.bench_ingest --docs 500
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from pysearch import PySearch
+
+from .corpus import make_documents
+
+
+def run(label, docs, callback):
+    base = tempfile.mkdtemp()
+
+    try:
+        engine = PySearch.PySearch(base)
+        start = time.perf_counter()
+        callback(engine)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    print('{0:<24} {1:>8} docs {2:>9.2f}s {3:>10.1f} docs/s'.format(
+        label, docs, elapsed, docs / elapsed))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--max-docs', type=int, default=1000)
+    args = parser.parse_args()
+
+    def per_document(engine):
+        for doc_id, document in make_documents(args.docs):
+            engine.index(doc_id, document)
+
+    def bulk(engine):
+        engine.bulk_index(make_documents(args.docs), max_docs=args.max_docs)
+
+    slow = run('index (per document)', args.docs, per_document)
+    fast = run('bulk_index', args.docs, bulk)
+    print('speedup: {0:.1f}x'.format(slow / fast))
+
+
+if __name__ == '__main__':
+    main()
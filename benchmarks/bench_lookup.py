@@ -0,0 +1,72 @@
+"""
+Compares single-term lookup latency of a legacy (tab-separated JSON)
+segment with a binary segment holding the same terms.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_lookup --terms 1000000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from pysearch import segmentFormat
+from pysearch import segmentHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--terms', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    terms = ['term{0:08d}'.format(number) for number in range(args.terms)]
+    postings = {0: [0, 4], 1: [7]}
+
+    with tempfile.TemporaryDirectory() as base:
+        legacy_name = os.path.join(base, 'legacy.index')
+        binary_name = os.path.join(base, 'binary.index')
+
+        with open(legacy_name, 'w') as seg_file:
+            for term in terms:
+                seg_file.write(segmentHandler._make_record(term, postings))
+
+        encoded = segmentFormat.encode_postings(postings)
+
+        with open(binary_name, 'wb') as seg_file:
+            segmentFormat.write_segment(seg_file, ((term, encoded) for term in terms))
+
+        print('segment size: legacy {0:.1f}MB, binary {1:.1f}MB'.format(
+            os.path.getsize(legacy_name) / 2 ** 20, os.path.getsize(binary_name) / 2 ** 20))
+
+        rng = random.Random(0)
+        wanted = [rng.choice(terms) for _ in range(args.lookups)]
+
+        def legacy_lookup(term):
+            with open(legacy_name, 'r') as seg_file:
+                for line in seg_file:
+                    seg_term, term_info = segmentHandler._parse_record(line)
+
+                    if seg_term == term:
+                        return json.loads(term_info)
+
+        def binary_lookup(term):
+            with open(binary_name, 'rb') as seg_file:
+                return segmentFormat.SegmentFile.from_file(seg_file).find(term)
+
+        for label, lookup in [('legacy (linear scan)', legacy_lookup), ('binary (block index)', binary_lookup)]:
+            count = args.lookups if lookup is binary_lookup else max(1, args.lookups // 20)
+            start = time.perf_counter()
+
+            for term in wanted[:count]:
+                assert lookup(term) is not None
+
+            elapsed = time.perf_counter() - start
+            print('{0:<24} {1:>10.3f} ms/lookup'.format(label, 1000 * elapsed / count))
+
+
+if __name__ == '__main__':
+    main()
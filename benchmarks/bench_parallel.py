@@ -0,0 +1,37 @@
+"""
+Compares ingest throughput of ``PySearch.bulk_index`` (one process) with
+``PySearch.parallel_index`` for growing numbers of worker processes.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_parallel --docs 5000 --workers 1 2 4 8
+"""
+import argparse
+
+from .bench_ingest import run
+from .corpus import make_documents, make_vocabulary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--shard-size', type=int, default=1000)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    args = parser.parse_args()
+
+    vocabulary = make_vocabulary(args.vocabulary)
+
+    def documents():
+        return make_documents(args.docs, vocabulary=vocabulary)
+
+    baseline = run('bulk_index', args.docs, lambda engine: engine.bulk_index(documents()))
+
+    for workers in args.workers:
+        elapsed = run('parallel_index ({0} workers)'.format(workers), args.docs,
+                      lambda engine: engine.parallel_index(documents(), workers=workers, shard_size=args.shard_size))
+        print('speedup: {0:.1f}x'.format(baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
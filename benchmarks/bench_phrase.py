@@ -0,0 +1,67 @@
+"""
+Compares the latency of phrase queries & proximity boosting, which load
+positions, with plain (bag of n-grams) queries for the same words.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_phrase --docs 5000 --queries 500
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from pysearch import PySearch
+
+from . import corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--vocabulary', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    vocabulary = corpus.make_vocabulary(args.vocabulary)
+    documents = list(corpus.make_documents(args.docs, length=60, vocabulary=vocabulary))
+    rng = random.Random(1)
+    pairs = []
+
+    # Two words next to each other in some document, so every phrase matches.
+    for _ in range(args.queries):
+        words = rng.choice(documents)[1]['text'].split()
+        start = rng.randrange(len(words) - 1)
+        pairs.append(' '.join(words[start:start + 2]))
+
+    base = tempfile.mkdtemp()
+
+    try:
+        PySearch.PySearch(base, document_store='packed').bulk_index(documents)
+
+        variants = [
+            ('bag of n-grams', lambda pair: (pair, {})),
+            ('phrase', lambda pair: ('"{0}"'.format(pair), {})),
+            ('proximity', lambda pair: (pair, {'proximity': 1.0})),
+        ]
+
+        for label, make_query in variants:
+            engine = PySearch.PySearch(base)
+            hits = 0
+            start = time.perf_counter()
+
+            for pair in pairs:
+                query, options = make_query(pair)
+                hits += engine.search(query, limit=args.limit, **options)['total_hits']
+
+            seconds = time.perf_counter() - start
+            print('{0:<16} {1:>6} queries {2:>8.2f}s {3:>8.2f}ms/query {4:>10.1f} hits/query'.format(
+                label, len(pairs), seconds, 1000 * seconds / len(pairs), hits / len(pairs)))
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares scoring every matching document with ``bm25_relevance`` against
+the batched ``scoring.bm25_scores`` (NumPy & pure Python), without & with
+length normalization (``LengthNorms``).
+
+Run from the repository root::
+
+    python -m benchmarks.bench_scoring --docs 100000 1000000
+"""
+import argparse
+import random
+import time
+from unittest import mock
+
+from pysearch import PySearch
+from pysearch import scoring
+
+
+def make_matches(matching_docs, term_count, seed=0):
+    """
+    Builds postings for ``term_count`` terms that together match
+    ``matching_docs`` documents, like a broad prefix query would.
+    """
+    rng = random.Random(seed)
+    terms = ['term{0}'.format(number) for number in range(term_count)]
+    per_term_counts = {}
+
+    for number, term in enumerate(terms):
+        # The first term matches everything, the others a shrinking share.
+        step = number + 1
+        ordinals = list(range(0, matching_docs, step))
+        per_term_counts[term] = (ordinals, [rng.randint(1, 9) for _ in ordinals])
+
+    per_term_docs = {term: len(ordinals) for term, (ordinals, _) in per_term_counts.items()}
+    return terms, per_term_docs, per_term_counts
+
+
+def per_document(terms, per_term_docs, per_term_counts, total_docs):
+    per_doc_counts = {}
+
+    for term, (ordinals, counts) in per_term_counts.items():
+        for ordinal, count in zip(ordinals, counts):
+            per_doc_counts.setdefault(ordinal, {})[term] = count
+
+    return [PySearch.bm25_relevance(terms, per_term_docs, current_doc, total_docs)
+            for current_doc in per_doc_counts.values()]
+
+
+def timed(label, matching_docs, callback):
+    start = time.perf_counter()
+    callback()
+    elapsed = time.perf_counter() - start
+    print('{0:<24} {1:>9} docs {2:>10.1f} ms'.format(label, matching_docs, 1000 * elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--terms', type=int, default=4)
+    args = parser.parse_args()
+
+    for matching_docs in args.docs:
+        matches = make_matches(matching_docs, args.terms)
+        total_docs = matching_docs * 2
+        rng = random.Random(1)
+        doc_norms = bytes(scoring.encode_norm(rng.randint(10, 1000)) for _ in range(total_docs))
+
+        timed('bm25_relevance per doc', matching_docs, lambda: per_document(*matches, total_docs))
+
+        with mock.patch.object(scoring, 'numpy', None):
+            norms = scoring.LengthNorms(doc_norms, 500.0)
+            timed('bm25_scores (python)', matching_docs, lambda: scoring.bm25_scores(*matches, total_docs))
+            timed('  with norms', matching_docs, lambda: scoring.bm25_scores(*matches, total_docs, norms=norms))
+
+        if scoring.numpy is not None:
+            norms = scoring.LengthNorms(doc_norms, 500.0)
+            timed('bm25_scores (numpy)', matching_docs, lambda: scoring.bm25_scores(*matches, total_docs))
+            timed('  with norms', matching_docs, lambda: scoring.bm25_scores(*matches, total_docs, norms=norms))
+        else:
+            print('bm25_scores (numpy)      skipped, NumPy is not installed')
+
+
+if __name__ == '__main__':
+    main()
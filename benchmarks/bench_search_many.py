@@ -0,0 +1,68 @@
+"""
+Compares query throughput of a loop over ``PySearch.search`` with the
+batched ``PySearch.search_many`` on a frozen index.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_search_many --docs 5000 --queries 5000
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from pysearch import PySearch
+
+from . import corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--vocabulary', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--postings-cache-bytes', type=int, default=16 * 1024 * 1024)
+    args = parser.parse_args()
+
+    vocabulary = corpus.make_vocabulary(args.vocabulary)
+    rng = random.Random(1)
+    # Query words follow a Zipf-like distribution, like real query logs.
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    queries = [' '.join(rng.choices(vocabulary, weights, k=rng.randint(1, 3))) for _ in range(args.queries)]
+    base = tempfile.mkdtemp()
+
+    try:
+        PySearch.PySearch(base, document_store='packed').bulk_index(
+            corpus.make_documents(args.docs, length=60, vocabulary=vocabulary))
+
+        timings = {}
+
+        for label in ('search (loop)', 'search_many'):
+            # A fresh engine each time, so neither gets a warm postings cache.
+            engine = PySearch.PySearch(base, postings_cache_bytes=args.postings_cache_bytes)
+            start = time.perf_counter()
+
+            if label == 'search_many':
+                output = engine.search_many(queries, limit=args.limit, batch_size=args.batch_size)
+            else:
+                for query in queries:
+                    engine.search(query, limit=args.limit)
+
+            timings[label] = time.perf_counter() - start
+            print('{0:<16} {1:>7} queries {2:>8.2f}s {3:>10.1f} queries/s'.format(
+                label, len(queries), timings[label], len(queries) / timings[label]))
+
+        seconds = {step: sum(batch['seconds'][step] for batch in output['batches'])
+                   for step in ('postings', 'documents', 'scoring')}
+        print('search_many: {postings:.2f}s postings, {documents:.2f}s documents, {scoring:.2f}s scoring'.format(
+            **seconds))
+        print('speedup: {0:.1f}x'.format(timings['search (loop)'] / timings['search_many']))
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
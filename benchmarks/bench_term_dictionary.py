@@ -0,0 +1,79 @@
+"""
+Compares indexing words by their n-grams (the default) with indexing whole
+words & expanding prefix & fuzzy queries through the ``TermDictionary``
+(``analysis='tokens'``): ingest time, index size on disk & query latency.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_term_dictionary --docs 5000 --words 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from pysearch import PySearch
+
+from .corpus import make_documents, make_vocabulary
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def timed_queries(engine, queries):
+    start = time.perf_counter()
+
+    for query in queries:
+        engine.search(query, limit=10)
+
+    return 1000 * (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    vocabulary = make_vocabulary(args.words)
+    documents = list(make_documents(args.docs, vocabulary=vocabulary))
+    rng = random.Random(1)
+    words = [rng.choice(vocabulary) for _ in range(args.queries)]
+
+    print('{0:<8} {1:>9} {2:>10} {3:>12} {4:>12} {5:>12} {6:>10}'.format(
+        'analysis', 'ingest s', 'index MB', 'word ms/q', 'prefix ms/q', 'fuzzy ms/q', 'dict MB'))
+
+    for analysis in ('ngrams', 'tokens'):
+        base = tempfile.mkdtemp()
+
+        try:
+            engine = PySearch.PySearch(base, analysis=analysis)
+            start = time.perf_counter()
+            engine.bulk_index(documents, max_docs=1000)
+            ingest = time.perf_counter() - start
+            index_size = directory_size(engine.index_path) / 1024 / 1024
+            exact = timed_queries(engine, words)
+
+            if analysis == 'tokens':
+                dictionary_size = directory_size(engine.terms_path) / 1024 / 1024
+                prefix = '{0:.2f}'.format(timed_queries(engine, [word[:3] + '*' for word in words]))
+                fuzzy = '{0:.2f}'.format(timed_queries(engine, [word[:-1] + 'x~1' for word in words]))
+            else:
+                # n-grams match prefixes of 3 to 6 letters by themselves, but
+                # nothing fuzzy.
+                dictionary_size = 0.0
+                prefix = '{0:.2f}'.format(timed_queries(engine, [word[:3] for word in words]))
+                fuzzy = '-'
+
+            print('{0:<8} {1:>9.2f} {2:>10.2f} {3:>12.2f} {4:>12} {5:>12} {6:>10.2f}'.format(
+                analysis, ingest, index_size, exact, prefix, fuzzy, dictionary_size))
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
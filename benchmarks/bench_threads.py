@@ -0,0 +1,103 @@
+"""
+Compares query throughput by number of threads with an engine per thread
+(nothing shared but the mapped segments) & with a single ``thread_safe``
+engine shared by all of them, optionally while another thread keeps
+indexing.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_threads --docs 5000 --queries 4000 --threads 1 2 4 8
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from pysearch import PySearch
+
+from . import corpus
+
+
+def run(label, base, queries, threads, shared, limit, writing):
+    engines = [PySearch.PySearch(base, thread_safe=True)] * threads if shared else \
+        [PySearch.PySearch(base) for _ in range(threads)]
+    done = threading.Event()
+    written = [0]
+    errors = []
+
+    def search(engine, shard):
+        try:
+            for query in shard:
+                engine.search(query, limit=limit)
+        except Exception as error:
+            errors.append(error)
+
+    def write():
+        # Through the first engine, as a server would.
+        rng = random.Random(2)
+
+        while not done.is_set():
+            engines[0].index('new_{0}'.format(written[0]), {'text': corpus.make_text(rng, 60)})
+            written[0] += 1
+
+    workers = [threading.Thread(target=search, args=(engines[number], queries[number::threads]))
+               for number in range(threads)]
+    writer = threading.Thread(target=write)
+    start = time.perf_counter()
+
+    if writing:
+        writer.start()
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    seconds = time.perf_counter() - start
+    done.set()
+
+    if writing:
+        writer.join()
+
+    print('{0:<12} {1:>8} {2:>12.1f} {3:>10} {4:>8}'.format(
+        label, threads, len(queries) / seconds, written[0] if writing else '-', len(errors)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=4000)
+    parser.add_argument('--vocabulary', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--write', action='store_true', help='Index documents while searching.')
+    args = parser.parse_args()
+
+    vocabulary = corpus.make_vocabulary(args.vocabulary)
+    rng = random.Random(1)
+    # Query words follow a Zipf-like distribution, like real query logs.
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    queries = [' '.join(rng.choices(vocabulary, weights, k=rng.randint(1, 3))) for _ in range(args.queries)]
+    base = tempfile.mkdtemp()
+
+    try:
+        PySearch.PySearch(base, document_store='packed', snapshots=True).bulk_index(
+            corpus.make_documents(args.docs, length=60, vocabulary=vocabulary))
+        print('{0:<12} {1:>8} {2:>12} {3:>10} {4:>8}'.format('engines', 'threads', 'queries/s', 'indexed',
+                                                             'errors'))
+
+        for threads in args.threads:
+            # Only a thread-safe engine can be written to while searched.
+            if not args.write:
+                run('per thread', base, queries, threads, False, args.limit, False)
+
+            run('shared', base, queries, threads, True, args.limit, args.write)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares how fast ``PySearch.index`` acknowledges documents without the
+write-ahead log & with it (``wal=True``, from one & from many threads), how
+fast they're applied to the index & how many ``fsync``s the log's group
+commit needed for them.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_wal --docs 500 --threads 1 8
+"""
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+from pysearch import PySearch
+
+from .corpus import make_documents
+
+
+def run(label, documents, threads, **options):
+    base = tempfile.mkdtemp()
+
+    try:
+        engine = PySearch.PySearch(base, **options)
+        shards = [documents[number::threads] for number in range(threads)]
+
+        def index(shard):
+            for doc_id, document in shard:
+                engine.index(doc_id, document)
+
+        workers = [threading.Thread(target=index, args=(shard,)) for shard in shards]
+        start = time.perf_counter()
+
+        for worker in workers:
+            worker.start()
+
+        for worker in workers:
+            worker.join()
+
+        acknowledged = time.perf_counter() - start
+        syncs = engine.wal.syncs if engine.wal is not None else '-'
+        engine.close()
+        applied = time.perf_counter() - start
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    print('{0:<18} {1:>8} {2:>12.1f} {3:>12.1f} {4:>8}'.format(
+        label, threads, len(documents) / acknowledged, len(documents) / applied, syncs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--sync-interval', type=float, default=0.005)
+    args = parser.parse_args()
+
+    documents = list(make_documents(args.docs))
+    print('{0:<18} {1:>8} {2:>12} {3:>12} {4:>8}'.format('mode', 'threads', 'acked doc/s', 'applied doc/s',
+                                                         'fsyncs'))
+
+    for threads in args.threads:
+        # Without the log, writes from different threads take turns.
+        run('index', documents, threads)
+        run('index (wal)', documents, threads, wal=True, wal_sync_interval=args.sync_interval)
+
+
+if __name__ == '__main__':
+    main()
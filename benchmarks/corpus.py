@@ -0,0 +1,42 @@
+import random
+
+WORDS = [
+    'peter', 'lumbergh', 'milton', 'stapler', 'reports', 'tps', 'desk',
+    'saturday', 'management', 'bobs', 'memo', 'cover', 'sheet', 'printer',
+    'meeting', 'consultant', 'efficiency', 'initech', 'software', 'glitch',
+    'fractions', 'penny', 'account', 'layoffs', 'basement', 'office',
+    'cubicle', 'coffee', 'friday', 'weekend', 'hawaiian', 'shirt', 'boss',
+    'deadline', 'project', 'budget', 'review', 'schedule', 'client', 'team',
+]
+
+
+def make_text(rng, length=150, vocabulary=WORDS):
+    """
+    Builds a roughly email-sized blob (about 1KB at the default ``length``).
+    """
+    return ' '.join(rng.choice(vocabulary) for _ in range(length))
+
+
+def make_documents(count, seed=0, length=150, vocabulary=WORDS):
+    """
+    Yields ``count`` reproducible ``(doc_id, document)`` pairs.
+    """
+    rng = random.Random(seed)
+
+    for number in range(count):
+        yield 'email_{0}'.format(number), {'text': make_text(rng, length, vocabulary)}
+
+
+def make_vocabulary(count, seed=0):
+    """
+    Builds a list of ``count`` distinct pseudo-words, for benchmarks that
+    need more variety than ``WORDS``.
+    """
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+
+    while len(words) < count:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+
+    return sorted(words)
@@ -1,9 +1,18 @@
-import math
+import copy
 import os
-
+import time
+
+from . import booleanQuery
+from . import bulkWriter
+from . import caching
+from . import parallelIndexer
+from . import positional
+from . import scoring
+from . import searchResult
 from . import segmentHandler
 from . import documentHandler
 from . import tokenization
+from . import writeAheadLog
 
 def bm25_relevance(terms, matches, current_doc, total_docs, b=0, k=1.2):
     """
@@ -32,8 +41,11 @@ def bm25_relevance(terms, matches, current_doc, total_docs, b=0, k=1.2):
     score = b
 
     for term in terms:
-        idf = math.log(
-            (total_docs - matches[term] + 1.0) / matches[term]) / math.log(1.0 + total_docs)
+        if not matches.get(term):
+            # No document has the term, so it can't contribute.
+            continue
+
+        idf = scoring.idf(matches[term], total_docs)
         score = score + \
             current_doc.get(term, 0) * idf / (current_doc.get(term, 0) + k)
 
@@ -42,18 +54,143 @@ def bm25_relevance(terms, matches, current_doc, total_docs, b=0, k=1.2):
 
 class PySearch(documentHandler.DocumentHandler, segmentHandler.SegmentHandler):
 
-    def __init__(self, base_directory) -> None:
+    def __init__(self, base_directory, cache_size=0, cache_ttl=None, postings_cache_bytes=16 * 1024 * 1024,
+                 stats_flush_interval=None, layout=None, document_store=None, bm25_k1=1.2, bm25_b=0.75,
+                 analysis=None, bucketing=None, buckets=None, wal=False, wal_sync_interval=0.005,
+                 snapshots=False, thread_safe=False) -> None:
+        """
+        Takes the ``base_directory`` where all the data is stored.
+
+        Optionally accepts a ``cache_size`` parameter, which is the number of
+        search results to keep in an LRU cache. Default is ``0`` (no cache).
+
+        Optionally accepts a ``cache_ttl`` parameter, which is the number of
+        seconds a cached result stays valid. Default is ``None`` (until the
+        index changes).
+
+        Optionally accepts a ``postings_cache_bytes`` parameter, which is the
+        approximate memory budget for decoded postings of hot terms. Default
+        is ``16MB``.
+
+        Optionally accepts a ``stats_flush_interval`` parameter, which is the
+        number of seconds the index stats may be held in memory before they
+        are written out. Call ``close`` to write them out right away.
+        Default is ``None`` (on every commit).
+
+        Optionally accepts a ``layout`` parameter, which is either
+        ``'buckets'`` (every term's segment is rewritten on update) or
+        ``'lsm'`` (updates append new segments, see ``LSMIndex``) & only
+        matters for new indexes. Default is ``None`` (whatever the index
+        already uses, or ``'buckets'``).
+
+        Optionally accepts a ``document_store`` parameter, which is either
+        ``'files'`` (a JSON file per document) or ``'packed'`` (a single,
+        block-compressed file, see ``PackedDocumentStore``) & only matters
+        for new indexes. Default is ``None`` (whatever the index already
+        uses, or ``'files'``).
+
+        Optionally accepts ``bm25_k1`` & ``bm25_b`` parameters, which are the
+        BM25 parameters: how quickly repeated terms stop adding to a score &
+        how much scores are normalized by document length, from ``0`` (not
+        at all) to ``1``. Defaults are ``1.2`` & ``0.75``.
+
+        Optionally accepts an ``analysis`` parameter, which is either
+        ``'ngrams'`` (words are indexed & looked up by their n-grams) or
+        ``'tokens'`` (whole words are the terms & queries can expand
+        ``word*`` & ``word~`` patterns, see ``use_token_terms``) & only
+        matters for new indexes. Default is ``None`` (whatever the index
+        already uses, or ``'ngrams'``).
+
+        Optionally accepts ``bucketing`` & ``buckets`` parameters, which are
+        the strategy (see ``bucketing.STRATEGIES``) spreading the terms over
+        the segments & its number of buckets, & only matter for new indexes
+        (see ``use_bucketing``). Defaults are ``None`` (whatever the index
+        already uses, or ``'crc32'`` with ``1024`` buckets).
+
+        Optionally accepts a ``wal`` parameter, which is a boolean & makes
+        ``index`` & ``delete`` go through a ``WriteAheadLog``: a write is
+        durable once its record is appended & ``fsync``ed along with the
+        others of the last ``wal_sync_interval`` seconds, & it's applied to
+        the index (& becomes searchable) shortly after, in the background.
+        ``close`` the engine when done. Defaults are ``False`` & ``0.005``.
+
+        Whatever is left in the log of an earlier engine, e.g. after a
+        crash, is applied either way when the engine is created.
+
+        Optionally accepts a ``snapshots`` parameter, which is a boolean &
+        makes every commit publish a snapshot that searches pin, so they
+        never see a commit half done (see ``use_snapshots``). It's kept on
+        disk, so it only has to be passed once. Default is ``False``.
+
+        Optionally accepts a ``thread_safe`` parameter, which is a boolean &
+        makes the engine safe to share between the threads of a server, so
+        they share its mapped segments, decoded postings & stats instead of
+        each reading their own: searches of every thread run side by side,
+        without a lock, & never see a write of another thread half done, as
+        they pin ``snapshots``, which this turns on. Not available with the
+        ``'lsm'`` layout. Writes take turns behind the ``write_lock`` either
+        way. Default is ``False``.
+        """
         super().__init__(base_directory)
-
-    def index(self, doc_id, document):
+        self.stats.flush_interval = stats_flush_interval
+
+        if layout == 'lsm':
+            self.use_lsm()
+        elif layout == 'buckets' and self.lsm is not None:
+            raise ValueError('The index at {0!r} uses the lsm layout.'.format(base_directory))
+        elif layout not in (None, 'buckets', 'lsm'):
+            raise ValueError('Unknown layout {0!r}.'.format(layout))
+
+        if bucketing is not None or buckets is not None:
+            self.use_bucketing(bucketing or self.bucketing.name, buckets)
+
+        if analysis == 'tokens':
+            self.use_token_terms()
+        elif analysis == 'ngrams' and self.term_dictionary is not None:
+            raise ValueError('The index at {0!r} uses whole tokens as terms.'.format(base_directory))
+        elif analysis not in (None, 'ngrams', 'tokens'):
+            raise ValueError('Unknown analysis {0!r}.'.format(analysis))
+
+        if document_store is not None:
+            self.use_document_store(document_store)
+
+        if thread_safe and self.lsm is not None:
+            # Its deletes would drop the stored documents of searches still
+            # running.
+            raise ValueError("The index at {0!r} uses the lsm layout, which isn't thread-safe.".format(
+                base_directory))
+
+        if snapshots or thread_safe:
+            self.use_snapshots()
+
+        self.bm25_k1 = bm25_k1
+        self.bm25_b = bm25_b
+        self.norms = None
+        self.norms_key = None
+        self.postings_cache = caching.PostingsCache(postings_cache_bytes)
+        self.result_cache = None
+        self.cache_generation = None
+
+        if cache_size:
+            self.result_cache = caching.LRUCache(cache_size, ttl=cache_ttl)
+
+        self.wal = None
+
+        if wal or os.path.isdir(self.wal_path):
+            log = writeAheadLog.WriteAheadLog(self.wal_path, self._apply_logged, sync_interval=wal_sync_interval)
+            log.replay()
+
+            if wal:
+                log.start()
+                self.wal = log
+            else:
+                log.close()
+
+    def _validate_document(self, doc_id, document):
         """
-        Given a ``doc_id`` string & a ``document`` dict, does everything needed
-        to save & index the document for searching.
-
-        The ``document`` dict must have a ``text`` key, which should contain the
-        blob to be indexed. All other fields are simply stored.
+        Checks that a ``document`` can be indexed.
 
-        Returns ``True`` on success.
+        Returns the ``doc_id`` as a string.
         """
         # Ensure that the ``document`` looks like a dictionary.
         if not hasattr(document, 'items'):
@@ -66,82 +203,360 @@ class PySearch(documentHandler.DocumentHandler, segmentHandler.SegmentHandler):
                 'You must provide `index` with a document with a `text` field in it.')
 
         # Make sure the document ID is a string.
+        return str(doc_id)
+
+    def _prepare_document(self, doc_id, document):
+        """
+        Validates a ``document`` & analyzes its ``text`` field.
+
+        Returns a tuple of the ``doc_id`` (as a string), its ordinal from the
+        ``DocIdTable``, the dict of terms to positions that should be written
+        to the segments & the length of the document (in tokens).
+        """
+        doc_id = self._validate_document(doc_id, document)
+
+        # Start analysis & indexing. The text is streamed through the
+        # analyzer, so large documents never get a full list of tokens.
+        terms, length = self.analyze(document.get('text', ''))
+        return doc_id, self.doc_ids.assign(doc_id), terms, length
+
+    def index(self, doc_id, document):
+        """
+        Given a ``doc_id`` string & a ``document`` dict, does everything needed
+        to save & index the document for searching.
+
+        The ``document`` dict must have a ``text`` key, which should contain the
+        blob to be indexed. All other fields are simply stored.
+
+        With the ``wal`` on, only the record of the write is stored before
+        returning, see ``sync``.
+
+        Returns ``True`` on success.
+        """
+        if self.wal is not None:
+            doc_id = self._validate_document(doc_id, document)
+            self.wal.wait_durable(self.wal.append({'op': 'index', 'id': doc_id, 'document': document}))
+            return True
+
+        with self.write_lock:
+            doc_id, ordinal, terms, length = self._prepare_document(doc_id, document)
+
+            # store docs
+            self.save_document(doc_id, document)
+            self.doc_ids.flush()
+            self.flush_documents()
+
+            # store segments, replacing whatever an older version of the
+            # document left behind.
+            self.forward.refresh()
+            old_terms = self.forward.terms(ordinal)
+            self.replace_postings({term: {ordinal: positions} for term, positions in terms.items()},
+                                  [ordinal], {ordinal: old_terms} if old_terms is not None else {})
+            self.forward.set(ordinal, terms)
+            self.forward.flush()
+
+            self.stats.add_document(ordinal, length, replace=old_terms is not None)
+            self.commit()
 
-        # store docs
+        return True
+
+    def delete(self, doc_id):
+        """
+        Given a ``doc_id`` string, removes the document & all of its postings
+        from the index.
+
+        Only the segments of the document's own terms are touched (see
+        ``ForwardIndex``). With the log-structured layout, the document is
+        tombstoned instead & dropped by the next merge.
+
+        With the ``wal`` on, the writes logged before are applied first, to
+        tell whether the document is there, & so is the delete itself.
+
+        Returns ``True`` on success, ``False`` if the document isn't in the
+        index.
+        """
         doc_id = str(doc_id)
-        self.save_document(doc_id, document)
 
-        # store segments
-        # Start analysis & indexing.
-        tokens = tokenization.make_tokens(document.get('text', ''))
-        terms = tokenization.make_ngrams(tokens)
+        if self.wal is not None:
+            self.wal.wait_applied()
 
-        for term, positions in terms.items():
-            self.save_segment(term, {doc_id: positions})
+            if self._indexed_terms(doc_id) is None:
+                return False
+
+            self.wal.wait_applied(self.wal.append({'op': 'delete', 'id': doc_id}))
+            return True
+
+        return self._delete(doc_id)
+
+    def _indexed_terms(self, doc_id):
+        """
+        Returns a tuple of the ordinal & the terms of the document with
+        ``doc_id``, or ``None`` if it isn't in the index.
+        """
+        ordinal = self.doc_ids.ordinal(doc_id)
+
+        if ordinal is None and self.doc_ids.refresh():
+            ordinal = self.doc_ids.ordinal(doc_id)
+
+        if ordinal is None:
+            return None
+
+        self.forward.refresh()
+        old_terms = self.forward.terms(ordinal)
+        return None if old_terms is None else (ordinal, old_terms)
+
+    def _delete(self, doc_id):
+        with self.write_lock:
+            indexed = self._indexed_terms(doc_id)
+
+            if indexed is None:
+                return False
+
+            ordinal, old_terms = indexed
+            self.delete_postings({ordinal: old_terms})
+            self.forward.remove(ordinal)
+            self.forward.flush()
+
+            if self.snapshots is None:
+                self.delete_document(doc_id)
+            else:
+                # Searches pinned before the delete may still return it.
+                self.snapshots.retire_document(doc_id)
+
+            self.stats.remove_document(ordinal)
+            self.commit()
 
-        self.increment_total_docs()
         return True
 
+    def writer(self, **options):
+        """
+        Returns a ``BulkWriter`` that buffers documents in memory & writes
+        their postings in batches. Use it as a context manager so the last
+        batch gets flushed.
+
+        Accepts the same ``max_docs`` & ``max_bytes`` options as
+        ``BulkWriter``.
+
+        With the ``wal`` on, returns a ``LogWriter`` instead, which logs the
+        documents & waits for them to be durable once per batch.
+        """
+        if self.wal is not None:
+            return writeAheadLog.LogWriter(self, **options)
+
+        return bulkWriter.BulkWriter(self, **options)
+
+    def bulk_index(self, documents, **options):
+        """
+        Given an iterable of ``(doc_id, document)`` pairs, indexes all of them
+        through a ``BulkWriter``.
+
+        Much faster than calling ``index`` per document, since each touched
+        segment is only rewritten once per flush. Accepts the same
+        ``max_docs`` & ``max_bytes`` options as ``BulkWriter``.
+
+        Returns the number of documents indexed.
+        """
+        count = 0
+
+        with self.writer(**options) as writer:
+            for doc_id, document in documents:
+                writer.add(doc_id, document)
+                count += 1
+
+        return count
+
+    def parallel_index(self, documents, workers=None, shard_size=1000):
+        """
+        Given an iterable of ``(doc_id, document)`` pairs, indexes all of them
+        across a pool of worker processes through a ``ParallelIndexer``.
+
+        Optionally accepts a ``workers`` parameter, which is the number of
+        worker processes. Default is ``None`` (one per CPU).
+
+        Optionally accepts a ``shard_size`` parameter, which is the number of
+        documents each worker indexes at a time. Default is ``1000``.
+
+        The documents don't go through the ``wal``, they're only durable once
+        this returns.
+
+        Returns the number of documents indexed.
+        """
+        if self.wal is not None:
+            # Whatever was logged before goes in first.
+            self.wal.wait_applied()
+
+        with self.write_lock:
+            return parallelIndexer.ParallelIndexer(self, workers=workers, shard_size=shard_size).index(documents)
+
     def __parse_query(self, query: str):
         """
         Convert query to terms for searching
         """
-        tokens = tokenization.make_tokens(query)
-        return tokenization.make_ngrams(tokens)
+        if self.term_dictionary is None:
+            tokens = tokenization.make_tokens(query)
+            return tokenization.make_ngrams(tokens)
+
+        terms = {}
+
+        # Patterns are expanded into the terms they match, other words are
+        # terms as they are.
+        for word in query.split():
+            expanded = self.expand_word(word)
+            terms.update(dict.fromkeys(tokenization.make_tokens(word) if expanded is None else expanded))
 
-    def __collect_results(self, terms):
+        return terms
+
+    def __collect_results(self, terms, postings=None):
         """
         For a list of ``terms``, collects all the documents from the index
         containing those terms.
 
-        The returned data is a tuple of two dicts. This is done to make the
+        Optionally accepts a ``postings`` parameter, which is the dict
+        ``load_postings_many(terms, counts=True)`` returns, if they were
+        already loaded. Default is ``None`` (load them).
+
+        The returned data is a tuple of three dicts. This is done to make the
         process of scoring easy & require no further information.
 
         The first dict contains all the terms as keys & a count (integer) of
         the matching docs as values.
 
-        The second dict inverts this, with ``doc_ids`` as the keys. The values
-        are a nested dict, which contains the ``terms`` as the keys and a
-        count of the number of positions within that doc.
+        The second dict also has the ``terms`` as keys. The values are a
+        tuple of two aligned lists: the doc ordinals (see ``DocIdTable``)
+        containing the term, in ascending order, & the number of positions
+        within each of those docs.
+
+        The third dict has the highest number of positions within any doc for
+        each term, as stored in the segments.
 
         Since this is complex, an example return value::
 
-            >>> per_term_docs, per_doc_counts = ms.collect_results(['hello', 'world'])
+            >>> per_term_docs, per_term_counts, per_term_max_counts = ms.collect_results(['hello', 'world'])
             >>> per_term_docs
             {
                 'hello': 2,
                 'world': 1
             }
-            >>> per_doc_counts
+            >>> per_term_counts
+            {
+                'hello': ([0, 1], [4, 1]),
+                'world': ([1], [3])
+            }
+            >>> per_term_max_counts
             {
-                'doc-1': {
-                    'hello': 4
-                },
-                'doc-2': {
-                    'hello': 1,
-                    'world': 3
-                }
+                'hello': 4,
+                'world': 3
             }
 
         """
         per_term_docs = {}
-        per_doc_counts = {}
+        per_term_counts = {}
+        per_term_max_counts = {}
+
+        if postings is None:
+            postings = self.load_postings_many(terms, counts=True)
 
         for term in terms:
-            term_matches = self.load_segment(term)
+            if term not in postings:
+                # The term isn't there.
+                continue
+
+            ordinals, counts, per_term_max_counts[term] = postings[term]
+            per_term_docs[term] = len(ordinals)
+            per_term_counts[term] = (ordinals, counts)
+
+        return per_term_docs, per_term_counts, per_term_max_counts
+
+    def __match_positions(self, phrases, tokens, per_term_counts, proximity, together=True):
+        """
+        Finds the docs with each of the ``phrases`` & works out the
+        ``proximity`` boost of the docs with all the ``tokens`` (terms) of
+        the query.
+
+        Only the docs that have all the terms of a phrase (or all the
+        ``tokens``) get their positions loaded, by yielding a ``('positions',
+        {term: ordinals})`` request like ``_search_steps`` does.
+
+        Optionally accepts a ``together`` parameter, which is a boolean &
+        tells that only the docs with every phrase matter, so each phrase
+        only checks those. Default is ``True``.
+
+        Returns a tuple of a list of the sorted ordinals of the docs with
+        each phrase & a dict of ordinals to their boost.
+        """
+        def ordinals_of(term):
+            return per_term_counts[term][0] if term in per_term_counts else []
+
+        def has_phrase(phrase, ordinal):
+            if not all(ordinal in positions.get(term, ()) for term, _ in phrase):
+                return False
+
+            return positional.phrase_match([positions[term][ordinal] for term, _ in phrase],
+                                           [offset for _, offset in phrase])
+
+        wanted = {}
+        close = []
+
+        if together:
+            shared = positional.intersect([ordinals_of(term) for phrase in phrases for term, _ in phrase])
+            candidates = [shared for _ in phrases]
+        else:
+            candidates = [positional.intersect([ordinals_of(term) for term, _ in phrase]) for phrase in phrases]
 
-            per_term_docs.setdefault(term, 0)
-            per_term_docs[term] += len(term_matches.keys())
+        for phrase, ordinals in zip(phrases, candidates):
+            for term, _ in phrase:
+                wanted[term] = sorted(set(wanted.get(term, ())).union(ordinals))
 
-            for doc_id, positions in term_matches.items():
-                per_doc_counts.setdefault(doc_id, {})
-                per_doc_counts[doc_id].setdefault(term, 0)
-                per_doc_counts[doc_id][term] += len(positions)
+        if len(tokens) > 1:
+            close = positional.intersect([ordinals_of(term) for term in tokens] +
+                                          (candidates[:1] if together else []))
 
-        return per_term_docs, per_doc_counts
+            for term in tokens:
+                wanted[term] = sorted(set(wanted.get(term, ())).union(close))
 
+        if not any(wanted.values()):
+            return candidates, {}
 
-    def search(self, query, offset=0, limit=20):
+        positions = yield 'positions', wanted
+        matches = [[ordinal for ordinal in ordinals if has_phrase(phrase, ordinal)]
+                   for phrase, ordinals in zip(phrases, candidates)]
+
+        if together and phrases:
+            close = positional.intersect([close] + matches)
+
+        boosts = {}
+
+        for ordinal in close:
+            if all(ordinal in positions.get(term, ()) for term in tokens):
+                boosts[ordinal] = positional.proximity_boost([positions[term][ordinal] for term in tokens],
+                                                             proximity)
+
+        return matches, boosts
+
+    def length_norms(self, snapshot=None):
+        """
+        Returns the ``LengthNorms`` scoring uses, or ``None`` when ``bm25_b``
+        turns length normalization off. They're only rebuilt when something
+        was indexed.
+
+        Optionally accepts a ``snapshot`` parameter, whose average document
+        length is used. Default is ``None`` (the one of the stats).
+        """
+        if not self.bm25_b:
+            return None
+
+        with self.stats.lock:
+            average = self.stats.average_length() if snapshot is None else snapshot.average_length()
+            key = (self.stats.generation, self.stats.total_length, len(self.stats.doc_norms), average)
+
+            if key != self.norms_key:
+                self.norms = scoring.LengthNorms(self.stats.doc_norms, average, self.bm25_k1, self.bm25_b)
+                self.norms_key = key
+
+            return self.norms
+
+    def search(self, query, offset=0, limit=20, prune=False, fields=None, lazy=False, proximity=0.0,
+               boolean=False):
         """
         Given a ``query``, performs a search on the index & returns the results.
 
@@ -152,49 +567,383 @@ class PySearch(documentHandler.DocumentHandler, segmentHandler.SegmentHandler):
         Optionally accepts a ``limit`` parameter, which is an integer &
         controls how many results to return. Default is ``20``.
 
+        Optionally accepts a ``prune`` parameter, which is a boolean & enables
+        WAND dynamic pruning: documents that can't make it into the returned
+        page are skipped instead of scored. The results are the same, but
+        ``total_hits`` may only be a lower bound. Default is ``False``.
+
+        Optionally accepts a ``fields`` parameter, which is a list of the
+        stored fields to return with every result (besides ``id`` &
+        ``score``). The packed document store only decodes those. Default is
+        ``None`` (all of them).
+
+        Optionally accepts a ``lazy`` parameter, which is a boolean & returns
+        ``SearchResult`` objects instead of dicts, whose stored fields are
+        only loaded when first accessed. Default is ``False``.
+
+        Optionally accepts a ``proximity`` parameter, which is a number &
+        boosts the score of documents with all the words of the query close
+        together: by ``proximity`` when they're next to each other, less the
+        further they're apart. Can't be combined with ``prune``. Default is
+        ``0.0`` (off).
+
+        Parts of the ``query`` in double quotes are phrases: only documents
+        with those words next to each other & in that order match, e.g.
+        ``'"tps reports" desk'``.
+
+        With ``analysis='tokens'``, words ending in ``*`` match every word
+        starting with them & words ending in ``~`` (or ``~1``) every word
+        within two (or one) typos of them, e.g. ``'rep* stapelr~'`` (see
+        ``expand_word``).
+
+        Optionally accepts a ``boolean`` parameter, which is a boolean &
+        reads the ``query`` as a boolean one instead, with ``AND``, ``OR``,
+        ``NOT`` & parentheses, e.g. ``'peter (tps OR stapler) NOT milton'``
+        (see ``booleanQuery.parse``). Only the documents matching it are
+        scored, on the terms that aren't excluded. Can't be combined with
+        ``proximity``. Default is ``False``.
+
         Returns a dictionary containing the ``total_hits`` (integer), which is
-        a count of all the documents that matched, and ``results``, which is
-        a list of results (in descending ``score`` order) & sliced to the
-        provided ``offset/limit`` combination.
+        a count of all the documents that matched, ``total_hits_exact``
+        (boolean), which is ``False`` when ``total_hits`` is only a lower
+        bound, and ``results``, which is a list of results (in descending
+        ``score`` order) & sliced to the provided ``offset/limit``
+        combination.
+        """
+        steps = self._search_steps(query, offset, limit, prune, fields, lazy, proximity, boolean)
+        reply = None
+
+        # Every read of the search sees the same commit.
+        with self.snapshot():
+            try:
+                while True:
+                    request = steps.send(reply)
+
+                    if request[0] == 'postings':
+                        reply = self.load_postings_many(request[1], counts=True)
+                    elif request[0] == 'positions':
+                        reply = self.load_positions_many(request[1])
+                    else:
+                        reply = self.load_documents(*request[1:])
+            except StopIteration as stop:
+                return stop.value
+
+    def _search_steps(self, query, offset, limit, prune, fields, lazy, proximity=0.0, boolean=False):
+        """
+        Does the work of ``search``, but hands every read out to its caller
+        instead of doing it, so ``AsyncPySearch`` can issue the reads
+        concurrently.
+
+        Reads the counts of the snapshot pinned by the thread it runs on, if
+        any, so its caller pins one before starting it (see ``snapshot``).
+
+        A generator that yields requests & expects their results sent back:
+
+        * ``('postings', terms)``, answered with the same as
+          ``load_postings_many(terms, counts=True)``.
+        * ``('positions', {term: ordinals})``, answered with the same as
+          ``load_positions_many`` (only for phrases & ``proximity``).
+        * ``('documents', doc_ids, fields)``, answered with the same as
+          ``load_documents(doc_ids, fields)``.
+
+        Returns (through ``StopIteration``) the same as ``search``.
         """
         results = {
             'total_hits': 0,
+            'total_hits_exact': True,
             'results': []
         }
 
+        if prune and proximity:
+            raise ValueError("'prune' can't be combined with 'proximity'.")
+
+        if boolean and proximity:
+            raise ValueError("'boolean' can't be combined with 'proximity'.")
+
         if not len(query):
             return results
 
-        total_docs = self.get_total_docs()
+        # Picks up commits from other instances.
+        self.stats.refresh()
+        total_docs = self.stats.total_docs
+        snapshot = self.pinned_snapshot()
+
+        if snapshot is not None:
+            total_docs = snapshot.total_docs
 
         if total_docs == 0:
             return results
 
-        terms = self.__parse_query(query)
-        per_term_docs, per_doc_counts = self.__collect_results(terms)
-        scored_results = []
+        tree = None
+        tokens = []
+
+        if boolean:
+            tree = booleanQuery.parse(query, *self.gram_range, expand=self.expand_word)
+
+            if tree is None:
+                return results
+
+            terms, excluded = booleanQuery.query_terms(tree)
+            phrases = booleanQuery.query_phrases(tree)
+        else:
+            terms = self.__parse_query(query)
+            excluded = []
+            phrases = positional.parse_phrases(query, *self.gram_range)
+
+        if proximity:
+            # The longest gram of each token stands for it.
+            tokens = list(dict.fromkeys(term for term, _ in positional.token_terms(query, *self.gram_range)))
+
+        cache_key = None
+
+        if self.result_cache is not None:
+            generation = self.stats.generation if snapshot is None else ('snapshot', snapshot.generation)
+
+            if generation != self.cache_generation:
+                # Something was indexed since, every cached result is stale.
+                self.result_cache.clear()
+                self.cache_generation = generation
+
+            # The generation is part of the key too, so a search of another
+            # thread that started before the last commit can't cache its
+            # results as the newer ones.
+            cache_key = (generation, tuple(sorted(terms)), offset, limit, prune,
+                         None if fields is None else tuple(fields), lazy,
+                         tuple(tuple(phrase) for phrase in phrases), proximity, boolean and query)
+            cached = self.result_cache.get(cache_key)
+
+            if cached is not None:
+                if lazy:
+                    # Only the ids & scores are cached.
+                    return dict(cached, results=[searchResult.SearchResult(self, doc_id, score, fields)
+                                                 for doc_id, score in cached['results']])
+
+                return copy.deepcopy(cached)
+
+        postings = yield 'postings', list(terms) + excluded
+        per_term_docs, per_term_counts, per_term_max_counts = self.__collect_results(list(terms) + excluded,
+                                                                                     postings)
+        boosts = None
+
+        if tree is not None:
+            # Walks the postings with cursors, so only the matches get scored.
+            matches, _ = yield from self.__match_positions(phrases, [], per_term_counts, 0.0, together=False)
+            per_term_ordinals = {term: ordinals for term, (ordinals, _) in per_term_counts.items()}
+            allowed = booleanQuery.evaluate(tree, per_term_ordinals, matches)
+            per_term_counts = {term: positional.restrict(*per_term_counts[term], allowed)
+                               for term in terms if term in per_term_counts}
+        elif phrases or len(tokens) > 1:
+            matches, boosts = yield from self.__match_positions(phrases, tokens, per_term_counts, proximity)
+
+            if phrases:
+                allowed = positional.intersect(matches)
+                # The document frequencies stay those of the whole index.
+                per_term_counts = {term: positional.restrict(ordinals, counts, allowed)
+                                   for term, (ordinals, counts) in per_term_counts.items()}
+
+        norms = self.length_norms(snapshot)
+
+        # Only keep as many of the best documents as the page needs.
+        if prune:
+            best, total_hits, exact = scoring.wand_top_k(
+                terms, per_term_docs, per_term_counts, per_term_max_counts, total_docs, offset + limit,
+                k=self.bm25_k1, norms=norms)
+        else:
+            ordinals, scores = scoring.bm25_scores(terms, per_term_docs, per_term_counts, total_docs,
+                                                   k=self.bm25_k1, norms=norms)
+            ordinals, scores = scoring.add_boosts(ordinals, scores, boosts)
+            best = scoring.top_k(ordinals, scores, offset + limit)
+            total_hits, exact = len(ordinals), True
+
+        results['total_hits'] = total_hits
+        results['total_hits_exact'] = exact
+
+        page = best[offset:]
+        doc_ids = [self.doc_ids.external(ordinal) for ordinal, _ in page]
+
+        if lazy:
+            results['results'] = [searchResult.SearchResult(self, doc_id, score, fields)
+                                  for doc_id, (_, score) in zip(doc_ids, page)]
+
+            if cache_key is not None:
+                self.result_cache.put(cache_key, dict(results, results=[
+                    (result.id, result.score) for result in results['results']]))
 
-        # Score the results per document.
-        for doc_id, current_doc in per_doc_counts.items():
-            scored_results.append({
+            return results
+
+        # Load up the docs of the page in one go & update their dicts.
+        documents = yield 'documents', doc_ids, fields
+
+        for doc_id, (ordinal, score), doc_dict in zip(doc_ids, page, documents):
+            doc_dict.update({
                 'id': doc_id,
-                'score': bm25_relevance(terms, per_term_docs, current_doc, total_docs),
+                'score': score,
             })
+            results['results'].append(doc_dict)
+
+        if cache_key is not None:
+            self.result_cache.put(cache_key, copy.deepcopy(results))
 
-        # Sort based on score.
-        sorted_results = sorted(scored_results, key=lambda res: res['score'], reverse=True)
-        results['total_hits'] = len(sorted_results)
+        return results
 
-        # Slice the results.
-        sliced_results = sorted_results[offset:offset + limit]
+    def search_many(self, queries, offset=0, limit=20, prune=False, fields=None, batch_size=1000, proximity=0.0,
+                    boolean=False):
+        """
+        Given a list of ``queries``, searches for all of them, sharing the
+        reads between them: in every batch of ``batch_size`` queries, each
+        segment is read once for the union of their terms & each document
+        loaded once, however many queries want it.
+
+        Accepts the same ``offset``, ``limit``, ``prune``, ``fields``,
+        ``proximity`` & ``boolean`` options as ``search``.
+
+        Returns a dictionary containing the ``results``, which is a list of
+        what ``search`` returns for each query, in the same order, and
+        ``batches``, which is a list of a dict per batch with its number of
+        ``queries``, distinct ``terms`` & ``documents`` read & the
+        ``seconds`` spent on each step (``postings``, ``documents`` &
+        ``scoring``, which includes parsing the queries) & in ``total``.
+        """
+        output = {
+            'results': [],
+            'batches': [],
+        }
 
-        # For each result, load up the doc & update the dict.
-        for res in sliced_results:
-            doc_dict = self.load_document(res['id'])
-            doc_dict.update(res)
-            results['results'].append(doc_dict)
+        for start in range(0, len(queries), batch_size):
+            # The queries of a batch share their reads, so they see the same
+            # commit.
+            with self.snapshot():
+                results, batch = self.__search_batch(queries[start:start + batch_size], offset, limit, prune,
+                                                     fields, proximity, boolean)
+            output['results'].extend(results)
+            output['batches'].append(batch)
 
-        return results
+        return output
+
+    def __search_batch(self, queries, offset, limit, prune, fields, proximity, boolean):
+        """
+        Runs the ``_search_steps`` of every query in lock step, answering the
+        requests of all of them with a single read.
+
+        Returns a tuple of the list of results & the timing dict of the batch.
+        """
+        batch = {'queries': len(queries), 'terms': 0, 'documents': 0,
+                 'seconds': {'postings': 0.0, 'documents': 0.0, 'scoring': 0.0, 'total': 0.0}}
+        seconds = batch['seconds']
+        started = time.perf_counter()
+        results = [None] * len(queries)
+        steps = {}
+        requests = {}
+
+        def advance(number, reply):
+            try:
+                requests[number] = steps[number].send(reply)
+            except StopIteration as stop:
+                results[number] = stop.value
+                del steps[number]
+                requests.pop(number, None)
+
+        for number, query in enumerate(queries):
+            steps[number] = self._search_steps(query, offset, limit, prune, fields, False, proximity, boolean)
+            advance(number, None)
+
+        while requests:
+            # Every query is at the same step, unless the result cache
+            # answered it already.
+            kind = next(kind for kind in ('postings', 'positions', 'documents')
+                        if any(request[0] == kind for request in requests.values()))
+            waiting = [number for number, request in requests.items() if request[0] == kind]
+            read_started = time.perf_counter()
+
+            if kind == 'documents':
+                doc_ids = list(dict.fromkeys(doc_id for number in waiting for doc_id in requests[number][1]))
+                loaded = dict(zip(doc_ids, self.load_documents(doc_ids, fields)))
+                batch['documents'] += len(doc_ids)
+                seconds['documents'] += time.perf_counter() - read_started
+                # Each result gets its own copy, since they're updated.
+                replies = {number: [dict(loaded[doc_id]) for doc_id in requests[number][1]] for number in waiting}
+            elif kind == 'positions':
+                wanted = {}
+
+                for number in waiting:
+                    for term, ordinals in requests[number][1].items():
+                        wanted.setdefault(term, set()).update(ordinals)
+
+                positions = self.load_positions_many({term: sorted(ordinals) for term, ordinals in wanted.items()})
+                seconds['postings'] += time.perf_counter() - read_started
+                replies = {number: positions for number in waiting}
+            else:
+                terms = list(dict.fromkeys(term for number in waiting for term in requests[number][1]))
+                postings = self.load_postings_many(terms, counts=True)
+
+                if not prune:
+                    # Converted once for every query sharing them.
+                    postings = {term: scoring.as_arrays(ordinals, counts) + (max_count,)
+                                for term, (ordinals, counts, max_count) in postings.items()}
+
+                batch['terms'] += len(terms)
+                seconds['postings'] += time.perf_counter() - read_started
+                replies = {number: postings for number in waiting}
+
+            for number in waiting:
+                advance(number, replies[number])
+
+        seconds['total'] = time.perf_counter() - started
+        seconds['scoring'] = seconds['total'] - seconds['postings'] - seconds['documents']
+        return results, batch
+
+    def _apply_logged(self, records):
+        """
+        Applies the ``records`` of the ``WriteAheadLog`` to the index, the
+        documents through a single ``BulkWriter``.
+        """
+        with self.write_lock:
+            writer = bulkWriter.BulkWriter(self, max_docs=len(records) + 1)
+
+            for record in records:
+                if record['op'] == 'index':
+                    writer.add(record['id'], record['document'])
+                else:
+                    writer.flush()
+                    self._delete(record['id'])
+
+            writer.flush()
+
+    def sync(self):
+        """
+        With the ``wal`` on, blocks until every write logged so far is
+        applied to the index, so searches see it.
+        """
+        if self.wal is not None:
+            self.wal.wait_applied()
+
+    def close(self):
+        """
+        Writes out anything still held in memory (e.g. stats waiting for
+        their ``flush_interval``), after applying what's left in the
+        ``wal``.
+        """
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+
+        with self.write_lock:
+            if self.snapshots is not None:
+                self.snapshots.collect()
+
+            self.stats.flush()
+            self.doc_ids.flush()
+            self.flush_documents()
+
+    def cache_stats(self):
+        """
+        Returns the hit, miss & eviction counters of the result cache, or
+        ``None`` if it's disabled.
+        """
+        if self.result_cache is None:
+            return None
+
+        return self.result_cache.stats()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from . import PySearch
+
+
+def _advance(steps, reply):
+    """
+    Sends ``reply`` into the ``steps`` of a search. Returns a tuple of
+    whether the search is done & either its next request or its results.
+
+    ``StopIteration`` can't travel through a future, hence the tuple.
+    """
+    try:
+        return False, steps.send(reply)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def _pinned(engine, snapshot, function, *args):
+    """
+    Calls ``function`` with the ``snapshot`` pinned on the thread it runs on
+    (see ``PySearch.snapshot``), so every read of a search sees the same
+    commit, whichever thread does it.
+    """
+    with engine.snapshot(snapshot):
+        return function(*args)
+
+
+class AsyncPySearch(object):
+    """
+    An ``asyncio`` front end to ``PySearch``, for use from an async web
+    server without blocking its event loop.
+
+    Every read & all the scoring run on a bounded pool of threads. A search
+    looks up the segments of its terms concurrently, reading each segment
+    once for all of its terms (different terms often hash to the same
+    segment), & loads the documents of the page concurrently too. Writes
+    are done one at a time, while searches keep going::
+
+        engine = AsyncPySearch(os.path.join(os.getcwd(), "SearchData"), max_workers=8)
+        await engine.index('email_1', {'text': 'Peter, ...'})
+        results = await engine.search('peter')
+        await engine.close()
+    """
+
+    def __init__(self, base_directory, max_workers=8, **options) -> None:
+        """
+        Takes the ``base_directory`` where all the data is stored.
+
+        Optionally accepts a ``max_workers`` parameter, which is the number of
+        threads reads & writes run on. Default is ``8``.
+
+        Accepts the same ``options`` as ``PySearch``.
+        """
+        self.engine = PySearch.PySearch(base_directory, **options)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pysearch')
+        # Created on first use, so it belongs to the running loop.
+        self.write_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _run(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(function, *args, **kwargs))
+
+    async def _write(self, function, *args, **kwargs):
+        if self.write_lock is None:
+            self.write_lock = asyncio.Lock()
+
+        async with self.write_lock:
+            return await self._run(function, *args, **kwargs)
+
+    async def _read(self, snapshot, function, *args):
+        return await self._run(_pinned, self.engine, snapshot, function, *args)
+
+    async def _load_postings(self, snapshot, terms):
+        groups = self.engine.group_terms(terms)
+        found = {}
+
+        for group_found in await asyncio.gather(*[self._read(snapshot, self.engine.load_postings_many, group, True)
+                                                  for group in groups]):
+            found.update(group_found)
+
+        return found
+
+    async def _load_positions(self, snapshot, wanted):
+        found = {}
+
+        groups = self.engine.group_terms(list(wanted))
+
+        for group_found in await asyncio.gather(*[
+                self._read(snapshot, self.engine.load_positions_many, {term: wanted[term] for term in group})
+                for group in groups]):
+            found.update(group_found)
+
+        return found
+
+    async def _load_documents(self, snapshot, doc_ids, fields):
+        if self.engine.documents.kind == 'packed' or len(doc_ids) < 2:
+            # One batch of sorted reads beats many concurrent ones.
+            return await self._read(snapshot, self.engine.load_documents, doc_ids, fields)
+
+        return await asyncio.gather(*[self._read(snapshot, self.engine.load_document, doc_id, fields)
+                                      for doc_id in doc_ids])
+
+    async def search(self, query, offset=0, limit=20, prune=False, fields=None, lazy=False, proximity=0.0,
+                     boolean=False):
+        """
+        Same as ``PySearch.search``.
+
+        With ``lazy=True``, accessing the fields of a result reads from disk
+        on the calling thread, so prefer ``fields`` within the event loop.
+        """
+        steps = self.engine._search_steps(query, offset, limit, prune, fields, lazy, proximity, boolean)
+        # Pinned here & on every thread the search runs on (see ``_pinned``).
+        snapshot = None if self.engine.snapshots is None else self.engine.snapshots.acquire()
+
+        try:
+            done, request = await self._read(snapshot, _advance, steps, None)
+
+            while not done:
+                if request[0] == 'postings':
+                    reply = await self._load_postings(snapshot, request[1])
+                elif request[0] == 'positions':
+                    reply = await self._load_positions(snapshot, request[1])
+                else:
+                    reply = await self._load_documents(snapshot, *request[1:])
+
+                done, request = await self._read(snapshot, _advance, steps, reply)
+        finally:
+            if snapshot is not None:
+                self.engine.snapshots.release(snapshot)
+
+        return request
+
+    async def index(self, doc_id, document):
+        """
+        Same as ``PySearch.index``.
+        """
+        return await self._write(self.engine.index, doc_id, document)
+
+    async def bulk_index(self, documents, **options):
+        """
+        Same as ``PySearch.bulk_index``. Takes a (regular) iterable of
+        ``(doc_id, document)`` pairs.
+        """
+        return await self._write(self.engine.bulk_index, documents, **options)
+
+    async def delete(self, doc_id):
+        """
+        Same as ``PySearch.delete``.
+        """
+        return await self._write(self.engine.delete, doc_id)
+
+    async def close(self):
+        """
+        Writes out anything still held in memory & stops the threads.
+        """
+        await self._write(self.engine.close)
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,393 @@
+import re
+from bisect import bisect_left
+
+from . import positional
+
+# Parentheses, double quoted phrases & words, in that order.
+TOKEN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+OPERATORS = ('AND', 'OR', 'NOT')
+
+# The ordinal of an exhausted cursor, past any real one.
+END = 1 << 62
+ONLY_EXCLUDES = 'NOT needs something to exclude from, e.g. "peter NOT milton"'
+
+
+class PostingsCursor(object):
+    """
+    Walks the sorted doc ordinals of a term.
+
+    Every ``skip_interval`` ordinals has a skip pointer, so ``advance`` can
+    jump over whole blocks that come before its target instead of stepping
+    through them one at a time, then only searches the block it lands in.
+    """
+
+    def __init__(self, ordinals, skip_interval=None) -> None:
+        """
+        Takes the sorted ``ordinals`` (a list or an array).
+
+        Optionally accepts a ``skip_interval`` parameter, which is the number
+        of ordinals between skip pointers. Default is ``None`` (the square
+        root of their number).
+        """
+        self.ordinals = ordinals
+        self.cost = len(ordinals)
+        self.skip_interval = skip_interval or max(1, int(len(ordinals) ** 0.5))
+        self.skips = ordinals[::self.skip_interval]
+        self.index = 0
+        self.doc = int(ordinals[0]) if len(ordinals) else END
+
+    def advance(self, target):
+        """
+        Moves to the first doc at or after ``target`` & returns its ordinal
+        (``END`` if there's none).
+        """
+        if self.doc >= target:
+            return self.doc
+
+        ordinals = self.ordinals
+        interval = self.skip_interval
+        block = self.index // interval
+
+        while block + 1 < len(self.skips) and self.skips[block + 1] <= target:
+            block += 1
+
+        # The target is within the block, a binary search finds it.
+        index = bisect_left(ordinals, target, max(self.index, block * interval),
+                            min(len(ordinals), (block + 1) * interval))
+
+        self.index = index
+        self.doc = int(ordinals[index]) if index < len(ordinals) else END
+        return self.doc
+
+
+class AndCursor(object):
+    """
+    Walks the docs that all the ``required`` cursors have & none of the
+    ``excluded`` ones do.
+
+    The cursors leapfrog each other, the rarest first, so it costs time in
+    proportion to the shortest list rather than their union.
+    """
+
+    def __init__(self, required, excluded=()) -> None:
+        self.required = sorted(required, key=lambda cursor: cursor.cost)
+        self.excluded = list(excluded)
+        self.cost = self.required[0].cost
+        self.doc = -1
+        self.advance(0)
+
+    def advance(self, target):
+        """
+        Same as ``PostingsCursor.advance``.
+        """
+        if self.doc >= target:
+            return self.doc
+
+        while target < END:
+            for cursor in self.required:
+                doc = cursor.advance(target)
+
+                if doc != target:
+                    target = doc
+                    break
+            else:
+                if any(cursor.advance(target) == target for cursor in self.excluded):
+                    target += 1
+                    continue
+
+                break
+
+        self.doc = target
+        return target
+
+
+class OrCursor(object):
+    """
+    Walks the docs that any of the ``cursors`` has.
+    """
+
+    def __init__(self, cursors) -> None:
+        self.cursors = list(cursors)
+        self.cost = sum(cursor.cost for cursor in self.cursors)
+        # An expansion without any term has no cursors, & no docs.
+        self.doc = min((cursor.doc for cursor in self.cursors), default=END)
+
+    def advance(self, target):
+        """
+        Same as ``PostingsCursor.advance``.
+        """
+        if self.doc >= target:
+            return self.doc
+
+        self.doc = min((cursor.advance(target) for cursor in self.cursors), default=END)
+        return self.doc
+
+
+def parse(query, min_gram=3, max_gram=6, expand=None):
+    """
+    Parses a boolean ``query`` into a tree of tuples:
+
+    * ``('term', term)`` for a word, looked up by its longest n-gram (or the
+      whole word, with a ``max_gram`` of ``None``).
+    * ``('phrase', [(term, offset), ...])`` for words in double quotes (see
+      ``positional.parse_phrases``).
+    * ``('and', [nodes])``, ``('or', [nodes])`` & ``('not', node)``.
+
+    ``AND``, ``OR`` & ``NOT`` (upper case) are the operators, binding in the
+    reverse order, & parentheses group. Words next to each other without an
+    operator are ``AND``-ed, e.g. ``'peter (tps OR stapler) NOT milton'``.
+    Stop words & words too short for an n-gram are left out.
+
+    Optionally accepts an ``expand`` parameter, which is a function taking
+    a word & returning the list of terms it expands into, or ``None`` if it
+    doesn't (see ``SegmentHandler.expand_word``). Expanded words become an
+    ``('or', [('term', term), ...])`` node, which is empty when nothing
+    matched. Default is ``None`` (no expansion).
+
+    Returns ``None`` when nothing is left to search for. Raises a
+    ``ValueError`` if the ``query`` isn't well formed, or some part of it
+    only excludes (e.g. ``'NOT peter'``), since it'd match almost every
+    document.
+    """
+    tokens = []
+    pos = 0
+    query = query.strip()
+
+    while pos < len(query):
+        match = TOKEN.match(query, pos)
+
+        if match is None:
+            raise ValueError('Unbalanced double quote in query: {0!r}'.format(query))
+
+        pos = match.end()
+        opening, closing, phrase, word = match.groups()
+
+        if phrase is not None:
+            tokens.append(('phrase', phrase))
+        elif word is not None:
+            tokens.append(('operator', word) if word in OPERATORS else ('word', word))
+        else:
+            tokens.append(('paren', opening or closing))
+
+    parser = _Parser(tokens, min_gram, max_gram, expand)
+    tree = parser.parse_or()
+
+    if parser.pos != len(tokens):
+        raise ValueError('Unexpected {0!r} in query: {1!r}'.format(tokens[parser.pos][1], query))
+
+    if tree is not None:
+        _check_negations(tree)
+
+    return tree
+
+
+def _check_negations(node):
+    kind, value = node
+
+    if kind == 'not':
+        raise ValueError(ONLY_EXCLUDES)
+
+    if kind == 'and':
+        if all(child[0] == 'not' for child in value):
+            raise ValueError(ONLY_EXCLUDES)
+
+        for child in value:
+            _check_negations(child[1] if child[0] == 'not' else child)
+    elif kind == 'or':
+        for child in value:
+            _check_negations(child)
+
+
+class _Parser(object):
+
+    def __init__(self, tokens, min_gram, max_gram, expand=None) -> None:
+        self.tokens = tokens
+        self.pos = 0
+        self.min_gram = min_gram
+        self.max_gram = max_gram
+        self.expand = expand
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+
+        return None, None
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+
+        while self.peek() == ('operator', 'OR'):
+            self.pos += 1
+            nodes.append(self.parse_and())
+
+        return _combine('or', nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+
+        while True:
+            kind, value = self.peek()
+
+            if (kind, value) == ('operator', 'AND'):
+                self.pos += 1
+            elif kind is None or kind == 'paren' and value == ')' or (kind, value) == ('operator', 'OR'):
+                break
+
+            nodes.append(self.parse_not())
+
+        return _combine('and', nodes)
+
+    def parse_not(self):
+        if self.peek() == ('operator', 'NOT'):
+            self.pos += 1
+            node = self.parse_not()
+
+            if node is None:
+                return None
+
+            # Two negations cancel out.
+            return node[1] if node[0] == 'not' else ('not', node)
+
+        return self.parse_operand()
+
+    def parse_operand(self):
+        kind, value = self.peek()
+        self.pos += 1
+
+        if kind == 'word' and self.expand is not None:
+            expanded = self.expand(value)
+
+            if expanded is not None:
+                return ('or', [('term', term) for term in expanded])
+
+        if kind in ('word', 'phrase'):
+            terms = positional.token_terms(value, self.min_gram, self.max_gram)
+
+            if not terms:
+                return None
+
+            return ('term', terms[0][0]) if len(terms) == 1 else ('phrase', terms)
+
+        if (kind, value) == ('paren', '('):
+            node = self.parse_or()
+
+            if self.peek() != ('paren', ')'):
+                raise ValueError('Missing closing parenthesis in query')
+
+            self.pos += 1
+            return node
+
+        raise ValueError('Expected a word, a phrase or "(" but got {0}'.format(
+            'the end of the query' if kind is None else repr(value)))
+
+
+def _combine(kind, nodes):
+    nodes = [node for node in nodes if node is not None]
+
+    if not nodes:
+        return None
+
+    if len(nodes) == 1:
+        return nodes[0]
+
+    return (kind, nodes)
+
+
+def query_terms(tree):
+    """
+    Returns a tuple of two lists of the distinct terms in ``tree``: the
+    ones that count towards the score & the ones only ever excluded.
+    """
+    scored = {}
+    excluded = {}
+
+    def walk(node, negated):
+        kind, value = node
+
+        if kind == 'term':
+            (excluded if negated else scored)[value] = None
+        elif kind == 'phrase':
+            for term, _ in value:
+                (excluded if negated else scored)[term] = None
+        elif kind == 'not':
+            walk(value, not negated)
+        else:
+            for child in value:
+                walk(child, negated)
+
+    if tree is not None:
+        walk(tree, False)
+
+    return list(scored), [term for term in excluded if term not in scored]
+
+
+def query_phrases(tree):
+    """
+    Returns a list of the phrases in ``tree``, each a list of ``(term,
+    offset)`` pairs.
+    """
+    if tree is None:
+        return []
+
+    kind, value = tree
+
+    if kind == 'phrase':
+        return [value]
+
+    if kind == 'term':
+        return []
+
+    if kind == 'not':
+        return query_phrases(value)
+
+    return [phrase for child in value for phrase in query_phrases(child)]
+
+
+def make_cursor(tree, per_term_ordinals, phrase_ordinals):
+    """
+    Builds the cursor walking the docs that match ``tree``, given a dict of
+    terms to their sorted doc ordinals & a list of the sorted ordinals of
+    the docs matching each phrase (in ``query_phrases`` order).
+    """
+    phrases = iter(phrase_ordinals)
+
+    def build(node):
+        kind, value = node
+
+        if kind == 'term':
+            return PostingsCursor(per_term_ordinals.get(value, []))
+
+        if kind == 'phrase':
+            return PostingsCursor(next(phrases))
+
+        if kind == 'or':
+            return OrCursor([build(child) for child in value])
+
+        required = []
+        excluded = []
+
+        for child in value:
+            if child[0] == 'not':
+                excluded.append(build(child[1]))
+            else:
+                required.append(build(child))
+
+        return AndCursor(required, excluded)
+
+    return build(tree)
+
+
+def evaluate(tree, per_term_ordinals, phrase_ordinals):
+    """
+    Returns the sorted list of the ordinals of all the docs matching
+    ``tree`` (see ``make_cursor``).
+    """
+    cursor = make_cursor(tree, per_term_ordinals, phrase_ordinals)
+    matches = []
+    doc = cursor.doc
+
+    while doc < END:
+        matches.append(doc)
+        doc = cursor.advance(doc + 1)
+
+    return matches
@@ -0,0 +1,133 @@
+import zlib
+
+from . import tokenization
+
+DEFAULT_STRATEGY = 'crc32'
+DEFAULT_BUCKETS = 1024
+
+
+class MD5Buckets(object):
+    """
+    The original bucketing: the first 6 hex digits of the MD5 of a term (see
+    ``tokenization.hash_name``), so up to 16M buckets.
+
+    Only the ASCII characters of a term are hashed, so terms made of other
+    characters all land in the same bucket. Kept for indexes built with it.
+    """
+
+    name = 'md5'
+
+    def __init__(self, buckets=None) -> None:
+        if buckets not in (None, 16 ** 6):
+            raise ValueError("The 'md5' bucketing has a fixed number of buckets.")
+
+        self.buckets = 16 ** 6
+
+    def bucket(self, term):
+        """
+        Returns the number of the bucket ``term`` goes to.
+        """
+        return int(tokenization.hash_name(term), 16)
+
+    def file_name(self, bucket):
+        """
+        Returns the name of the segment file of ``bucket``.
+        """
+        return '{0:06x}.index'.format(bucket)
+
+    def config(self):
+        """
+        Returns the dict recorded in ``stats.json``.
+        """
+        return {'strategy': self.name}
+
+
+class CRC32Buckets(object):
+    """
+    Hashes all the UTF-8 bytes of a term with CRC-32 (``zlib.crc32``, which
+    runs in C & isn't cryptographic, so it costs a fraction of MD5) into one
+    of ``buckets`` buckets.
+
+    Fewer, bigger buckets mean fewer files, but more of them to rewrite on
+    every update; ``maintenance rebucket`` changes the number later.
+    """
+
+    name = 'crc32'
+
+    def __init__(self, buckets=None) -> None:
+        self.buckets = DEFAULT_BUCKETS if buckets is None else int(buckets)
+
+        if self.buckets < 1:
+            raise ValueError('The number of buckets must be positive, got {0!r}.'.format(buckets))
+
+        self.width = len('{0:x}'.format(self.buckets - 1))
+
+    def bucket(self, term):
+        """
+        Returns the number of the bucket ``term`` goes to.
+        """
+        return zlib.crc32(term.encode('utf-8')) % self.buckets
+
+    def file_name(self, bucket):
+        """
+        Returns the name of the segment file of ``bucket``.
+        """
+        return '{0:0{1}x}.index'.format(bucket, self.width)
+
+    def config(self):
+        """
+        Returns the dict recorded in ``stats.json``.
+        """
+        return {'strategy': self.name, 'buckets': self.buckets}
+
+
+# Every bucketing strategy by name. Others can be added, as long as they
+# hash the same way in every process.
+STRATEGIES = {
+    MD5Buckets.name: MD5Buckets,
+    CRC32Buckets.name: CRC32Buckets,
+}
+
+
+def make_strategy(strategy=DEFAULT_STRATEGY, buckets=None):
+    """
+    Returns the bucketing ``strategy`` (a name from ``STRATEGIES``) with
+    ``buckets`` buckets (``None`` for its default).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError('Unknown bucketing {0!r}, expected one of {1}.'.format(strategy, sorted(STRATEGIES)))
+
+    return STRATEGIES[strategy](buckets)
+
+
+def from_config(config):
+    """
+    Returns the bucketing strategy recorded in ``stats.json`` (see
+    ``config``).
+    """
+    return make_strategy(config.get('strategy', DEFAULT_STRATEGY), config.get('buckets'))
+
+
+def size_stats(sizes):
+    """
+    Summarizes a list of sizes into a dict of their ``count``, ``total``,
+    ``mean``, ``min``, ``max`` & ``p50``, ``p90`` & ``p99`` percentiles.
+    """
+    sizes = sorted(sizes)
+
+    if not sizes:
+        return {'count': 0, 'total': 0, 'mean': 0.0, 'min': 0, 'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}
+
+    def percentile(share):
+        return sizes[min(len(sizes) - 1, int(share * len(sizes)))]
+
+    return {
+        'count': len(sizes),
+        'total': sum(sizes),
+        'mean': sum(sizes) / len(sizes),
+        'min': sizes[0],
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': sizes[-1],
+    }
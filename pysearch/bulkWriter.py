@@ -0,0 +1,135 @@
+class BulkWriter(object):
+    """
+    Buffers postings for many documents in memory & writes them to the
+    segments in batches.
+
+    Each flush groups the buffered terms by the segment they hash to (see
+    ``SegmentHandler.use_bucketing``), so every touched segment is rewritten once
+    per flush instead of once per term per document.
+
+    Every ``add`` & ``flush`` holds the engine's ``write_lock``, so writes
+    of other threads may come in between, but never in the middle of one.
+
+    Can be used as a context manager, which flushes on exit::
+
+        with engine.writer(max_docs=500) as writer:
+            for doc_id, document in documents:
+                writer.add(doc_id, document)
+    """
+
+    def __init__(self, engine, max_docs=1000, max_bytes=64 * 1024 * 1024) -> None:
+        """
+        Takes the ``engine`` (a ``PySearch`` instance) to write through.
+
+        Optionally accepts a ``max_docs`` parameter, which is the number of
+        documents to buffer before flushing. Default is ``1000``.
+
+        Optionally accepts a ``max_bytes`` parameter, which is the approximate
+        size (in bytes) of the buffered postings before flushing. Default is
+        ``64MB``.
+        """
+        self.engine = engine
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.postings = {}
+        # The terms & lengths of every buffered document, by ordinal.
+        self.terms = {}
+        self.lengths = {}
+        # The terms of the older version of re-indexed documents, looked up
+        # by ``flush``.
+        self.old_terms = {}
+        self.buffered_docs = 0
+        self.buffered_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, doc_id, document):
+        """
+        Stores the ``document`` & buffers its postings for the next flush.
+
+        Flushes automatically once ``max_docs`` or ``max_bytes`` is reached.
+        """
+        with self.engine.write_lock:
+            doc_id, ordinal, terms, length = self.engine._prepare_document(doc_id, document)
+            self.engine.save_document(doc_id, document)
+
+        if ordinal in self.lengths:
+            # Indexed twice in the same batch, the last version wins.
+            for term in self.terms[ordinal]:
+                self.postings[term].pop(ordinal, None)
+
+        for term, positions in terms.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                self.buffered_bytes += len(term) + 64
+
+            self.postings[term][ordinal] = positions
+            self.buffered_bytes += 8 * len(positions) + 64
+
+        self.terms[ordinal] = list(terms)
+        self.lengths[ordinal] = length
+        self.buffered_docs += 1
+
+        if self.buffered_docs >= self.max_docs or self.buffered_bytes >= self.max_bytes:
+            self.flush()
+
+        return True
+
+    def flush(self):
+        """
+        Writes all the buffered postings out, rewriting each touched segment
+        once, then updates the index stats.
+
+        Returns the number of documents flushed.
+        """
+        flushed = self.buffered_docs
+        engine = self.engine
+
+        with engine.write_lock:
+            # The ordinals have to be on disk before any posting refers to
+            # them.
+            engine.doc_ids.flush()
+            engine.flush_documents()
+
+            if flushed:
+                # Looked up only now, in case another thread re-indexed some
+                # of the documents since they were added.
+                engine.forward.refresh()
+
+                for ordinal in self.lengths:
+                    old_terms = engine.forward.terms(ordinal)
+
+                    if old_terms is not None:
+                        self.old_terms[ordinal] = old_terms
+
+                postings = {term: term_info for term, term_info in self.postings.items() if term_info}
+                engine.replace_postings(postings, list(self.lengths), self.old_terms)
+
+                for ordinal, terms in self.terms.items():
+                    engine.forward.set(ordinal, terms)
+
+                engine.forward.flush()
+
+                for ordinal, length in self.lengths.items():
+                    engine.stats.add_document(ordinal, length, replace=ordinal in self.old_terms)
+
+                engine.commit()
+
+        self.postings = {}
+        self.terms = {}
+        self.lengths = {}
+        self.old_terms = {}
+        self.buffered_docs = 0
+        self.buffered_bytes = 0
+        return flushed
+
+    def close(self):
+        """
+        Flushes anything still buffered.
+        """
+        return self.flush()
@@ -0,0 +1,233 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A bounded, least-recently-used cache with an optional time-to-live.
+
+    Keeps ``hits``, ``misses``, ``evictions`` (entries pushed out to make
+    room), ``expirations`` (entries that outlived the ``ttl``) &
+    ``invalidations`` (entries dropped by ``clear``) counters for tuning.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=1000, ttl=None, clock=time.monotonic) -> None:
+        """
+        Optionally accepts a ``max_entries`` parameter, which is the number of
+        entries to keep. Default is ``1000``.
+
+        Optionally accepts a ``ttl`` parameter, which is the number of
+        seconds an entry stays valid. Default is ``None`` (forever).
+
+        Optionally accepts a ``clock`` parameter, a callable returning the
+        current time in seconds. Default is ``time.monotonic``.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for ``key``, or ``default`` if there's none
+        (or it expired).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires = entry
+
+            if expires is not None and expires <= self.clock():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Caches ``value`` under ``key``, evicting the least recently used
+        entries if the cache is full.
+        """
+        with self.lock:
+            if self.max_entries <= 0:
+                return
+
+            expires = None
+
+            if self.ttl is not None:
+                expires = self.clock() + self.ttl
+
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Returns the counters & current size as a dict.
+        """
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+def approximate_postings_size(term_info):
+    """
+    Roughly estimates how many bytes a decoded ``term_info`` dict takes up
+    in memory: the dict itself, plus a list & an integer per position for
+    each of its docs.
+    """
+    size = 64 + 104 * len(term_info)
+
+    for positions in term_info.values():
+        size += 8 * len(positions)
+
+    return size
+
+
+class PostingsCache(object):
+    """
+    Keeps decoded postings of recently searched terms, bounded by their
+    approximate size in bytes rather than the number of entries.
+
+    Entries remember which segment they were read from (both its name & the
+    ``SegmentFile`` it was decoded from), so they can be dropped segment by
+    segment when it gets rewritten & never outlive the file they came from.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024) -> None:
+        """
+        Optionally accepts a ``max_bytes`` parameter, which is the
+        approximate memory budget. Default is ``16MB``.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.per_segment = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, term, segment):
+        """
+        Returns the postings cached for ``term``, provided they were decoded
+        from ``segment``. Otherwise returns ``None``.
+        """
+        with self.lock:
+            entry = self.entries.get(term)
+
+            if entry is None or entry[1] is not segment:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(term)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, term, seg_name, segment, postings, size):
+        """
+        Caches the ``postings`` of ``term``, decoded from ``segment`` (found
+        at ``seg_name``) & taking up about ``size`` bytes.
+        """
+        with self.lock:
+            if size > self.max_bytes:
+                return
+
+            self._drop(term)
+            self.entries[term] = (postings, segment, seg_name, size)
+            self.per_segment.setdefault(seg_name, set()).add(term)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate_segment(self, seg_name):
+        """
+        Drops every cached term read from the segment at ``seg_name``.
+        """
+        with self.lock:
+            for term in list(self.per_segment.get(seg_name, ())):
+                self._drop(term)
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.per_segment.clear()
+            self.size = 0
+
+    def _drop(self, term):
+        entry = self.entries.pop(term, None)
+
+        if entry is None:
+            return
+
+        _, _, seg_name, size = entry
+        self.size -= size
+        terms = self.per_segment[seg_name]
+        terms.discard(term)
+
+        if not terms:
+            del self.per_segment[seg_name]
+
+    def stats(self):
+        """
+        Returns the counters, current size & entry count as a dict.
+        """
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
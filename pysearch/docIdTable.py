@@ -0,0 +1,163 @@
+import sys
+import threading
+from array import array
+
+
+class DocIdTable(object):
+    """
+    Maps external document ids (strings) to dense integer ordinals & back.
+
+    Ordinals are handed out in order (``0``, ``1``, ``2``...) as documents get
+    indexed, so postings can store small, delta-encodable integers instead of
+    repeating the full id.
+
+    The table is persisted as two append-only files next to each other:
+
+    * ``<path>.dat`` holds the UTF-8 encoded ids, back to back.
+    * ``<path>.off`` holds one unsigned 64-bit end offset per id, so id ``n``
+      lives between ``off[n - 1]`` & ``off[n]``.
+
+    Newly assigned ids are buffered until ``flush`` is called.
+
+    Safe to share between threads, though only one of them should assign
+    ids at a time (see ``SegmentHandler.write_lock``).
+    """
+
+    def __init__(self, path) -> None:
+        self.data_path = f"{path}.dat"
+        self.offsets_path = f"{path}.off"
+        self.ids = []
+        self.ordinals = {}
+        self.flushed = 0
+        self.flushed_bytes = 0
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        """
+        Reads the table from disk. Anything written past the last complete
+        offset (e.g. a torn write) is ignored & cut off on the next flush.
+        """
+        with self.lock:
+            self.ids = []
+            self.ordinals = {}
+            self.flushed = 0
+            self.flushed_bytes = 0
+            self.refresh()
+
+    def refresh(self):
+        """
+        Reads any ids flushed to disk (e.g. by another ``PySearch`` instance)
+        since the table was loaded.
+
+        Only possible while nothing is waiting to be flushed, since those ids
+        would clash. Returns the number of ids read.
+        """
+        with self.lock:
+            if len(self.ids) > self.flushed:
+                return 0
+
+            offsets = array('Q')
+
+            try:
+                with open(self.offsets_path, 'rb') as offsets_file:
+                    offsets_file.seek(self.flushed * offsets.itemsize)
+                    raw = offsets_file.read()
+            except FileNotFoundError:
+                return 0
+
+            offsets.frombytes(raw[:len(raw) - len(raw) % offsets.itemsize])
+
+            if not offsets:
+                return 0
+
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+
+            with open(self.data_path, 'rb') as data_file:
+                data_file.seek(self.flushed_bytes)
+                data = data_file.read(offsets[-1] - self.flushed_bytes)
+
+            start = 0
+
+            for end in offsets:
+                doc_id = data[start:end - self.flushed_bytes].decode('utf-8')
+                self.ordinals[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                start = end - self.flushed_bytes
+
+            self.flushed = len(self.ids)
+            self.flushed_bytes = offsets[-1]
+            return len(offsets)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ordinal(self, doc_id):
+        """
+        Returns the ordinal of ``doc_id``, or ``None`` if it was never
+        assigned one.
+        """
+        return self.ordinals.get(doc_id)
+
+    def assign(self, doc_id):
+        """
+        Returns the ordinal of ``doc_id``, handing out the next free one if it
+        doesn't have one yet.
+        """
+        with self.lock:
+            ordinal = self.ordinals.get(doc_id)
+
+            if ordinal is None and self.refresh():
+                ordinal = self.ordinals.get(doc_id)
+
+            if ordinal is None:
+                ordinal = len(self.ids)
+                self.ids.append(doc_id)
+                self.ordinals[doc_id] = ordinal
+
+            return ordinal
+
+    def external(self, ordinal):
+        """
+        Returns the external doc id for an ``ordinal``.
+        """
+        if ordinal >= len(self.ids):
+            self.refresh()
+
+        return self.ids[ordinal]
+
+    def flush(self):
+        """
+        Appends every newly assigned id to disk.
+
+        Returns the number of ids written.
+        """
+        with self.lock:
+            pending = self.ids[self.flushed:]
+
+            if not pending:
+                return 0
+
+            data = bytearray()
+            offsets = array('Q')
+
+            for doc_id in pending:
+                data += doc_id.encode('utf-8')
+                offsets.append(self.flushed_bytes + len(data))
+
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+
+            # The data goes first, so the offsets never point past it.
+            with open(self.data_path, 'ab') as data_file:
+                data_file.truncate(self.flushed_bytes)
+                data_file.write(data)
+
+            with open(self.offsets_path, 'ab') as offsets_file:
+                offsets_file.truncate(self.flushed * offsets.itemsize)
+                offsets_file.write(offsets.tobytes())
+
+            self.flushed = len(self.ids)
+            self.flushed_bytes += len(data)
+            return len(pending)
@@ -1,44 +1,91 @@
 import os
-import json
 
+from . import documentStore
 from . import pathsSetUp
-from . import tokenization
 
 
 class DocumentHandler(pathsSetUp.PathSetUp):
     def __init__(self, base_directory) -> None:
         super().__init__(base_directory)
+        # Where the documents are kept, see ``use_document_store``.
+        if os.path.exists(os.path.join(self.docs_path, 'store.json')):
+            self.documents = documentStore.PackedDocumentStore(self.docs_path, self.doc_ids)
+        else:
+            self.documents = documentStore.FileDocumentStore(self.docs_path)
+
+    def use_document_store(self, kind, **options):
+        """
+        Switches where the documents are kept: ``'files'`` keeps every
+        document in its own JSON file (see ``FileDocumentStore``) & ``'packed'``
+        appends them to a single, block-compressed file (see
+        ``PackedDocumentStore``), which accepts ``codec`` & ``block_size``
+        ``options``.
+
+        Only works on an index that doesn't hold documents in the other kind
+        of store yet. Use ``maintenance.pack_documents`` to convert one.
+        """
+        if kind not in ('files', 'packed'):
+            raise ValueError('Unknown document store {0!r}.'.format(kind))
+
+        if kind == self.documents.kind:
+            if options:
+                self.documents = documentStore.PackedDocumentStore(self.docs_path, self.doc_ids, **options)
+
+            return self.documents
+
+        if kind == 'files' or any(os.path.isdir(os.path.join(self.docs_path, name))
+                                  for name in os.listdir(self.docs_path)):
+            raise ValueError('The documents at {0!r} are in a {1!r} store.'.format(
+                self.docs_path, self.documents.kind))
+
+        self.documents = documentStore.PackedDocumentStore(self.docs_path, self.doc_ids, **options)
+        return self.documents
 
     def set_name_docs(self, doc_id):
         """
         Constructs a path where the document should be stored from doc_id
         """
-        return os.path.join(self.docs_path, tokenization.hash_name(doc_id), f"{doc_id}.json")
+        return documentStore.file_path(self.docs_path, doc_id)
 
     def save_document(self, doc_id, document):
         """
         Save the document
         """
-        doc_path = self.set_name_docs(doc_id)
-        base_path = os.path.dirname(doc_path)
+        self.documents.save(doc_id, document)
+
+    def flush_documents(self):
+        """
+        Writes out the documents the store still buffers.
+        """
+        return self.documents.flush()
 
-        if not os.path.exists(base_path):
-            os.makedirs(base_path)
+    def delete_document(self, doc_id):
+        """
+        Deletes the stored document. Returns ``False`` if there was none.
+        """
+        return self.documents.delete(doc_id)
 
-        with open(doc_path, 'w') as doc_file:
-            doc_file.write(json.dumps(document, ensure_ascii=False))
+    def load_document(self, doc_id, fields=None):
+        """
+        Loads the document with ``doc_id``.
 
-    def load_document(self, doc_id):
-        doc_path = self.set_name_docs(doc_id)
+        Optionally accepts a ``fields`` parameter, which is a list of the
+        stored fields to return. Default is ``None`` (all of them).
+        """
+        return self.documents.read(doc_id, fields)
 
-        with open(doc_path, 'r') as doc_file:
-            data = json.loads(doc_file.read())
+    def load_documents(self, doc_ids, fields=None):
+        """
+        Loads the documents with ``doc_ids`` in one go, in the same order.
 
-        return data
+        The packed store reads every block needed once, in file order, & only
+        decodes the ``fields`` asked for (all of them if ``None``).
+        """
+        return self.documents.read_many(doc_ids, fields)
 
 
 if __name__ == '__main__':
     dh = DocumentHandler(os.path.join(os.getcwd(), "SearchData"))
     dh.save_document('100', {1:2})
+    dh.flush_documents()
     print(dh.load_document('100'))
-
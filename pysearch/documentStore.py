@@ -0,0 +1,591 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import zlib
+from array import array
+
+from . import caching
+from . import segmentFormat
+from . import tokenization
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The first byte of every packed block says how the rest is compressed.
+CODECS = {'none': 0, 'zlib': 1, 'zstd': 2}
+# The first byte of a record with a field index. Older records are a plain
+# JSON object, starting with ``{``.
+FIELDS_RECORD = 1
+
+
+def project(document, fields):
+    """
+    Returns the ``document`` with only the ``fields`` it has, or all of them
+    if ``fields`` is ``None``.
+    """
+    if fields is None:
+        return document
+
+    return {field: document[field] for field in fields if field in document}
+
+
+def encode_record(document):
+    """
+    Encodes a ``document`` dict as a packed record: a field index (the
+    number of fields, then the name & the length of the JSON value of each)
+    followed by the JSON values, so fields can be decoded one by one.
+    """
+    header = bytearray([FIELDS_RECORD])
+    values = []
+    segmentFormat.encode_varint(len(document), header)
+
+    for field, value in document.items():
+        # Same as JSON object keys.
+        name = (field if isinstance(field, str) else json.dumps(field).strip('"')).encode('utf-8')
+        value = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        segmentFormat.encode_varint(len(name), header)
+        header += name
+        segmentFormat.encode_varint(len(value), header)
+        values.append(value)
+
+    return bytes(header) + b''.join(values)
+
+
+def decode_record(raw, fields=None):
+    """
+    Decodes a packed record back into a document dict, only decoding the
+    JSON values of ``fields`` (all of them if ``None``).
+    """
+    if not raw or raw[0] != FIELDS_RECORD:
+        return project(json.loads(bytes(raw)), fields)
+
+    wanted = None if fields is None else set(fields)
+    count, pos = segmentFormat.decode_varint(raw, 1)
+    index = []
+
+    for _ in range(count):
+        name_length, pos = segmentFormat.decode_varint(raw, pos)
+        name = bytes(raw[pos:pos + name_length]).decode('utf-8')
+        value_length, pos = segmentFormat.decode_varint(raw, pos + name_length)
+        index.append((name, value_length))
+
+    document = {}
+
+    for name, value_length in index:
+        if wanted is None or name in wanted:
+            document[name] = json.loads(bytes(raw[pos:pos + value_length]))
+
+        pos += value_length
+
+    return project(document, fields)
+
+
+def file_path(docs_path, doc_id):
+    """
+    Returns where ``FileDocumentStore`` keeps the document with ``doc_id``.
+    """
+    return os.path.join(docs_path, tokenization.hash_name(doc_id), f"{doc_id}.json")
+
+
+class FileDocumentStore(object):
+    """
+    Stores every document as its own JSON file, in directories named after
+    the hash of its id.
+
+    Simple, but every document costs an inode & every load an ``open``.
+    """
+
+    kind = 'files'
+
+    def __init__(self, docs_path) -> None:
+        self.docs_path = docs_path
+
+    def save(self, doc_id, document):
+        doc_path = file_path(self.docs_path, doc_id)
+        base_path = os.path.dirname(doc_path)
+
+        if not os.path.exists(base_path):
+            # Other processes may be creating it at the same time.
+            os.makedirs(base_path, exist_ok=True)
+
+        # Moved into place once written, so a search reading it meanwhile
+        # gets either version, never half of one.
+        fd, temp_name = tempfile.mkstemp(dir=base_path, prefix='.', suffix='.tmp')
+
+        with os.fdopen(fd, 'w') as doc_file:
+            doc_file.write(json.dumps(document, ensure_ascii=False))
+
+        os.replace(temp_name, doc_path)
+
+    def read(self, doc_id, fields=None):
+        """
+        Returns the document with ``doc_id``, with only its ``fields`` if
+        given. The whole file gets decoded either way.
+        """
+        with open(file_path(self.docs_path, doc_id), 'r') as doc_file:
+            return project(json.loads(doc_file.read()), fields)
+
+    def read_many(self, doc_ids, fields=None):
+        return [self.read(doc_id, fields) for doc_id in doc_ids]
+
+    def delete(self, doc_id):
+        try:
+            os.remove(file_path(self.docs_path, doc_id))
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def flush(self):
+        return 0
+
+    def iter_documents(self):
+        """
+        Yields every stored ``(doc_id, document)``.
+        """
+        for directory in sorted(os.listdir(self.docs_path)):
+            directory_path = os.path.join(self.docs_path, directory)
+
+            if not os.path.isdir(directory_path):
+                continue
+
+            for filename in sorted(os.listdir(directory_path)):
+                if filename.endswith('.json'):
+                    doc_id = filename[:-len('.json')]
+                    yield doc_id, self.read(doc_id)
+
+
+class PackedDocumentStore(object):
+    """
+    Appends documents to a single packed file, in blocks of about
+    ``block_size`` bytes that are compressed as a whole.
+
+    An offset table holds three unsigned 64-bit integers per doc ordinal
+    (see ``DocIdTable``): the offset of its block in the packed file, the
+    block's length (``0`` when there's no such document) & the offset of its
+    record in the uncompressed block (high 32 bits) & the record's length
+    (low 32 bits). Entries are patched in place when documents get replaced
+    or deleted, which leaves their old records behind until ``compact``.
+
+    ``store.json`` names the current packed file & offset table, so
+    ``compact`` can swap them atomically.
+
+    Every record starts with a field index (see ``encode_record``), so
+    loading a few fields of a document skips decoding the others.
+    """
+
+    kind = 'packed'
+
+    def __init__(self, docs_path, doc_ids, codec=None, block_size=16 * 1024) -> None:
+        """
+        Takes the ``docs_path`` to store the files in & the ``doc_ids`` table
+        to resolve ids with.
+
+        Optionally accepts a ``codec`` parameter, which is ``'none'``,
+        ``'zlib'`` or ``'zstd'`` (needs the ``zstandard`` package). Default
+        is ``None`` (whatever the store already uses, or ``'zlib'``).
+
+        Optionally accepts a ``block_size`` parameter, which is the size of
+        the blocks (uncompressed) in bytes. Bigger blocks compress better, but
+        every load decompresses a whole block. Default is ``16KB``.
+        """
+        self.docs_path = docs_path
+        self.meta_path = os.path.join(docs_path, 'store.json')
+        self.doc_ids = doc_ids
+        self.block_size = block_size
+        self.lock = threading.RLock()
+        # Decompressed blocks, by offset. Cleared whenever the packed file is
+        # swapped.
+        self.blocks = caching.LRUCache(32)
+        self.load()
+
+        if codec is not None and codec != self.codec:
+            self._check_codec(codec)
+            self.codec = codec
+            self._write_meta()
+        elif self.identity is None:
+            self._write_meta()
+
+    @staticmethod
+    def _check_codec(codec):
+        if codec not in CODECS:
+            raise ValueError('Unknown codec {0!r}.'.format(codec))
+
+        if codec == 'zstd' and zstandard is None:
+            raise ImportError('The zstd codec needs the zstandard package.')
+
+    def load(self):
+        """
+        (Re)reads the offset table from disk, dropping anything not flushed.
+        """
+        with self.lock:
+            meta = {}
+            self.identity = None
+
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path, 'r') as meta_file:
+                    stat = os.fstat(meta_file.fileno())
+                    self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                    meta = json.load(meta_file)
+
+            self.codec = meta.get('codec', 'zlib')
+            self.generation = meta.get('generation', 0)
+            self.pack_path = os.path.join(self.docs_path, 'docs-{0}.pack'.format(self.generation))
+            self.table_path = os.path.join(self.docs_path, 'docs-{0}.off'.format(self.generation))
+            self.table = array('Q')
+            self.table_identity = None
+
+            try:
+                with open(self.table_path, 'rb') as table_file:
+                    stat = os.fstat(table_file.fileno())
+                    self.table_identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                    raw = table_file.read()
+            except FileNotFoundError:
+                raw = b''
+
+            entry_size = 3 * self.table.itemsize
+            self.table.frombytes(raw[:len(raw) - len(raw) % entry_size])
+
+            if sys.byteorder == 'big':
+                self.table.byteswap()
+
+            try:
+                self.pack_size = os.path.getsize(self.pack_path)
+            except FileNotFoundError:
+                self.pack_size = 0
+
+            self.flushed = len(self.table) // 3
+            self.changed = set()
+            self.pending = {}
+            self.blocks.clear()
+
+    def refresh(self):
+        """
+        Picks up changes flushed by another instance, unless there are
+        changes waiting to be flushed here.
+        """
+        with self.lock:
+            if self.pending or self.changed:
+                return False
+
+            try:
+                meta_stat = os.stat(self.meta_path)
+            except FileNotFoundError:
+                return False
+
+            try:
+                table_stat = os.stat(self.table_path)
+                table_identity = (table_stat.st_ino, table_stat.st_size, table_stat.st_mtime_ns)
+            except FileNotFoundError:
+                # Gone once ``compact`` swapped the files, the meta tells.
+                table_identity = None
+
+            if ((meta_stat.st_ino, meta_stat.st_size, meta_stat.st_mtime_ns) == self.identity
+                    and table_identity == self.table_identity):
+                return False
+
+            self.load()
+            return True
+
+    def _write_meta(self):
+        meta = {'codec': self.codec, 'generation': self.generation}
+        fd, temp_name = tempfile.mkstemp(dir=self.docs_path, prefix='.store-')
+
+        with os.fdopen(fd, 'w') as meta_file:
+            json.dump(meta, meta_file)
+            meta_file.flush()
+            stat = os.fstat(meta_file.fileno())
+            self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        os.replace(temp_name, self.meta_path)
+
+    def _entry(self, ordinal):
+        if ordinal is None or 3 * ordinal + 2 >= len(self.table) or not self.table[3 * ordinal + 1]:
+            return None
+
+        return self.table[3 * ordinal], self.table[3 * ordinal + 1], self.table[3 * ordinal + 2]
+
+    def _set_entry(self, ordinal, block_offset, block_length, record):
+        if 3 * ordinal + 2 >= len(self.table):
+            self.table.extend([0] * (3 * ordinal + 3 - len(self.table)))
+
+        self.table[3 * ordinal:3 * ordinal + 3] = array('Q', [block_offset, block_length, record])
+
+        if ordinal < self.flushed:
+            self.changed.add(ordinal)
+
+    def save(self, doc_id, document):
+        """
+        Buffers the ``document`` until the next ``flush``.
+        """
+        raw = encode_record(document)
+
+        with self.lock:
+            self.pending[self.doc_ids.assign(doc_id)] = raw
+
+    def delete(self, doc_id):
+        """
+        Forgets the document with ``doc_id``. Returns ``False`` if there was
+        none.
+        """
+        with self.lock:
+            ordinal = self.doc_ids.ordinal(doc_id)
+
+            if ordinal is None:
+                return False
+
+            found = self.pending.pop(ordinal, None) is not None or self._entry(ordinal) is not None
+
+            if self._entry(ordinal) is not None:
+                self._set_entry(ordinal, 0, 0, 0)
+                self._flush_table()
+
+            return found
+
+    def _compress(self, raw):
+        if self.codec == 'zlib':
+            raw = zlib.compress(raw)
+        elif self.codec == 'zstd':
+            raw = zstandard.ZstdCompressor().compress(raw)
+
+        return bytes([CODECS[self.codec]]) + raw
+
+    @staticmethod
+    def _decompress(block):
+        codec, payload = block[0], block[1:]
+
+        if codec == CODECS['zlib']:
+            return zlib.decompress(payload)
+
+        if codec == CODECS['zstd']:
+            if zstandard is None:
+                raise ImportError('The zstd codec needs the zstandard package.')
+
+            return zstandard.ZstdDecompressor().decompress(payload)
+
+        return bytes(payload)
+
+    def flush(self):
+        """
+        Appends the buffered documents in blocks of about ``block_size``,
+        then patches their entries in the offset table.
+
+        Returns the number of documents written.
+        """
+        with self.lock:
+            if not self.pending:
+                self._flush_table()
+                return 0
+
+            written = len(self.pending)
+            data = bytearray()
+            block = bytearray()
+            members = []
+
+            def close_block():
+                stored = self._compress(bytes(block))
+                block_offset = self.pack_size + len(data)
+
+                for ordinal, record_offset, record_length in members:
+                    self._set_entry(ordinal, block_offset, len(stored), (record_offset << 32) | record_length)
+
+                data.extend(stored)
+
+            for ordinal, raw in sorted(self.pending.items()):
+                if block and len(block) + len(raw) > self.block_size:
+                    close_block()
+                    block = bytearray()
+                    members = []
+
+                members.append((ordinal, len(block), len(raw)))
+                block += raw
+
+            close_block()
+
+            # The data goes first, so the offsets never point past it.
+            with open(self.pack_path, 'ab') as pack_file:
+                pack_file.truncate(self.pack_size)
+                pack_file.write(data)
+
+            self.pack_size += len(data)
+            self.pending = {}
+            self._flush_table()
+            return written
+
+    def _flush_table(self):
+        if not self.changed and self.flushed == len(self.table) // 3:
+            return
+
+        entry_size = 3 * self.table.itemsize
+        mode = 'r+b' if os.path.exists(self.table_path) else 'w+b'
+
+        with open(self.table_path, mode) as table_file:
+            for ordinal in sorted(self.changed):
+                table_file.seek(ordinal * entry_size)
+                table_file.write(self._to_bytes(self.table[3 * ordinal:3 * ordinal + 3]))
+
+            table_file.seek(self.flushed * entry_size)
+            table_file.write(self._to_bytes(self.table[3 * self.flushed:]))
+            table_file.truncate()
+            table_file.flush()
+            stat = os.fstat(table_file.fileno())
+            self.table_identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        self.flushed = len(self.table) // 3
+        self.changed = set()
+
+    @staticmethod
+    def _to_bytes(table):
+        if sys.byteorder == 'big':
+            table = array('Q', table)
+            table.byteswap()
+
+        return table.tobytes()
+
+    def read(self, doc_id, fields=None):
+        """
+        Returns the document with ``doc_id``. Raises a ``KeyError`` if there
+        is none.
+        """
+        return self.read_many([doc_id], fields)[0]
+
+    def read_many(self, doc_ids, fields=None, max_gap=4096):
+        """
+        Returns the documents with ``doc_ids``, in the same order. With
+        ``fields``, only those fields are decoded & returned.
+
+        Reads every block needed once, in file order, coalescing blocks less
+        than ``max_gap`` bytes apart into a single read.
+        """
+        self.refresh()
+
+        with self.lock:
+            ordinals = []
+
+            for doc_id in doc_ids:
+                ordinal = self.doc_ids.ordinal(doc_id)
+
+                if ordinal is None and self.doc_ids.refresh():
+                    ordinal = self.doc_ids.ordinal(doc_id)
+
+                if ordinal not in self.pending and self._entry(ordinal) is None:
+                    raise KeyError(doc_id)
+
+                ordinals.append(ordinal)
+
+            entries = [self._entry(ordinal) for ordinal in ordinals if ordinal not in self.pending]
+            blocks = self._read_blocks(sorted(set(
+                (block_offset, block_length) for block_offset, block_length, _ in entries)), max_gap)
+            documents = []
+
+            for ordinal in ordinals:
+                if ordinal in self.pending:
+                    raw = self.pending[ordinal]
+                else:
+                    block_offset, _, record = self._entry(ordinal)
+                    record_offset, record_length = record >> 32, record & 0xffffffff
+                    raw = blocks[block_offset][record_offset:record_offset + record_length]
+
+                documents.append(decode_record(raw, fields))
+
+            return documents
+
+    def _read_blocks(self, wanted, max_gap, pack_path=None):
+        """
+        Returns a dict of block offsets to their decompressed contents, for
+        the ``(offset, length)`` of every ``wanted`` block (in file order).
+
+        Optionally accepts a ``pack_path`` parameter, which is the packed
+        file to read. Default is ``None`` (the current one).
+        """
+        blocks = {}
+        runs = []
+
+        for block_offset, block_length in wanted:
+            cached = self.blocks.get(block_offset)
+
+            if cached is not None:
+                blocks[block_offset] = cached
+            elif runs and block_offset - runs[-1][1] <= max_gap:
+                runs[-1][1] = block_offset + block_length
+                runs[-1][2].append((block_offset, block_length))
+            else:
+                runs.append([block_offset, block_offset + block_length, [(block_offset, block_length)]])
+
+        if not runs:
+            return blocks
+
+        with open(pack_path or self.pack_path, 'rb') as pack_file:
+            for start, end, members in runs:
+                pack_file.seek(start)
+                buf = memoryview(pack_file.read(end - start))
+
+                for block_offset, block_length in members:
+                    block = self._decompress(buf[block_offset - start:block_offset - start + block_length])
+                    blocks[block_offset] = block
+                    self.blocks.put(block_offset, block)
+
+        return blocks
+
+    def iter_documents(self):
+        """
+        Yields every stored ``(doc_id, document)``, in ordinal order.
+        """
+        self.flush()
+        live = [ordinal for ordinal in range(len(self.table) // 3) if self._entry(ordinal) is not None]
+
+        for start in range(0, len(live), 1024):
+            doc_ids = [self.doc_ids.external(ordinal) for ordinal in live[start:start + 1024]]
+            yield from zip(doc_ids, self.read_many(doc_ids, max_gap=1 << 20))
+
+    def compact(self):
+        """
+        Rewrites the live documents into a new packed file, dropping
+        replaced & deleted records. They're copied over 1024 at a time, so
+        only those are held in memory, in full blocks but the last of each
+        batch.
+
+        Returns the number of bytes reclaimed.
+        """
+        with self.lock:
+            self.flush()
+            old_size = self.pack_size
+            old_pack, old_table_path, old_table = self.pack_path, self.table_path, self.table
+
+            self.generation += 1
+            self.pack_path = os.path.join(self.docs_path, 'docs-{0}.pack'.format(self.generation))
+            self.table_path = os.path.join(self.docs_path, 'docs-{0}.off'.format(self.generation))
+            self.table = array('Q')
+            self.flushed = 0
+            self.changed = set()
+            self.pack_size = 0
+            self.blocks.clear()
+
+            for start in range(0, len(old_table) // 3, 1024):
+                entries = {ordinal: old_table[3 * ordinal:3 * ordinal + 3]
+                           for ordinal in range(start, min(start + 1024, len(old_table) // 3))
+                           if old_table[3 * ordinal + 1]}
+                wanted = sorted(set((entry[0], entry[1]) for entry in entries.values()))
+                blocks = self._read_blocks(wanted, 1 << 20, old_pack)
+
+                for ordinal, (block_offset, _, record) in entries.items():
+                    record_offset, record_length = record >> 32, record & 0xffffffff
+                    raw = blocks[block_offset][record_offset:record_offset + record_length]
+                    self.pending[ordinal] = bytes(raw)
+
+                self.flush()
+
+            # Cached by their offsets in the old file.
+            self.blocks.clear()
+            self._flush_table()
+            self._write_meta()
+
+            for path in (old_pack, old_table_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+            return old_size - self.pack_size
@@ -0,0 +1,191 @@
+import os
+import sys
+from array import array
+
+
+class ForwardIndex(object):
+    """
+    Records which terms every live document contributed to the index, so a
+    document can be replaced or deleted by touching only the postings of its
+    own terms, instead of scanning every segment.
+
+    Persisted as two files next to each other:
+
+    * ``<path>.dat`` holds the terms of each version of a document, newline
+      separated & back to back. It's only ever appended to.
+    * ``<path>.off`` holds two unsigned 64-bit integers per doc ordinal: the
+      offset of its current terms in ``<path>.dat`` & their length plus one.
+      A length of ``0`` means the document isn't in the index (never
+      indexed, or deleted). Entries are patched in place.
+
+    Changes are buffered until ``flush`` is called.
+    """
+
+    def __init__(self, path) -> None:
+        self.data_path = f"{path}.dat"
+        self.offsets_path = f"{path}.off"
+        self.load()
+
+    def load(self):
+        """
+        (Re)reads the offsets from disk, dropping anything not flushed.
+        """
+        self.offsets = array('Q')
+        self.identity = None
+
+        try:
+            with open(self.offsets_path, 'rb') as offsets_file:
+                stat = os.fstat(offsets_file.fileno())
+                self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                raw = offsets_file.read()
+        except FileNotFoundError:
+            raw = b''
+
+        # An odd trailing half-entry (e.g. a torn write) is ignored.
+        entry_size = 2 * self.offsets.itemsize
+        self.offsets.frombytes(raw[:len(raw) - len(raw) % entry_size])
+
+        if sys.byteorder == 'big':
+            self.offsets.byteswap()
+
+        try:
+            self.data_size = os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            self.data_size = 0
+
+        self.flushed = len(self.offsets) // 2
+        self.changed = set()
+        self.pending = {}
+        self.live = sum(1 for number in range(1, len(self.offsets), 2) if self.offsets[number])
+
+    def refresh(self):
+        """
+        Picks up changes flushed by another instance, unless there are
+        changes waiting to be flushed here. Costs a single ``stat`` call when
+        nothing changed.
+        """
+        if self.pending or self.changed:
+            return False
+
+        try:
+            stat = os.stat(self.offsets_path)
+        except FileNotFoundError:
+            return False
+
+        if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self.identity:
+            return False
+
+        self.load()
+        return True
+
+    def __len__(self):
+        """
+        Returns the number of live documents.
+        """
+        return self.live
+
+    def __contains__(self, ordinal):
+        """
+        Checks whether the document with ``ordinal`` is in the index.
+        """
+        if ordinal in self.pending:
+            return True
+
+        return 2 * ordinal + 1 < len(self.offsets) and bool(self.offsets[2 * ordinal + 1])
+
+    def terms(self, ordinal):
+        """
+        Returns the list of terms of the document with ``ordinal``, or
+        ``None`` if it isn't in the index.
+        """
+        if ordinal in self.pending:
+            return self.pending[ordinal]
+
+        if 2 * ordinal + 1 >= len(self.offsets) or not self.offsets[2 * ordinal + 1]:
+            return None
+
+        offset, length = self.offsets[2 * ordinal], self.offsets[2 * ordinal + 1] - 1
+
+        with open(self.data_path, 'rb') as data_file:
+            data_file.seek(offset)
+            raw = data_file.read(length)
+
+        return raw.decode('utf-8').split('\n') if raw else []
+
+    def _set(self, ordinal, offset, length):
+        if 2 * ordinal + 1 >= len(self.offsets):
+            self.offsets.extend([0] * (2 * ordinal + 2 - len(self.offsets)))
+
+        was_live = bool(self.offsets[2 * ordinal + 1])
+        self.offsets[2 * ordinal] = offset
+        self.offsets[2 * ordinal + 1] = length
+        self.live += bool(length) - was_live
+
+        if ordinal < self.flushed:
+            self.changed.add(ordinal)
+
+    def set(self, ordinal, terms):
+        """
+        Records the ``terms`` of the (new or replaced) document with
+        ``ordinal``.
+        """
+        self.pending[ordinal] = sorted(terms)
+
+    def remove(self, ordinal):
+        """
+        Records that the document with ``ordinal`` was deleted.
+        """
+        self.pending.pop(ordinal, None)
+        self._set(ordinal, 0, 0)
+
+    def flush(self):
+        """
+        Appends the terms of every changed document, then patches their
+        offsets.
+
+        Returns the number of documents written.
+        """
+        if not self.pending and not self.changed and self.flushed == len(self.offsets) // 2:
+            return 0
+
+        data = bytearray()
+        written = len(self.pending)
+
+        for ordinal, terms in sorted(self.pending.items()):
+            raw = '\n'.join(terms).encode('utf-8')
+            self._set(ordinal, self.data_size + len(data), len(raw) + 1)
+            data += raw
+
+        # The data goes first, so the offsets never point past it.
+        with open(self.data_path, 'ab') as data_file:
+            data_file.truncate(self.data_size)
+            data_file.write(data)
+
+        self.data_size += len(data)
+        self.pending = {}
+        entry_size = 2 * self.offsets.itemsize
+        mode = 'r+b' if os.path.exists(self.offsets_path) else 'w+b'
+
+        with open(self.offsets_path, mode) as offsets_file:
+            for ordinal in sorted(self.changed):
+                offsets_file.seek(ordinal * entry_size)
+                offsets_file.write(self._to_bytes(self.offsets[2 * ordinal:2 * ordinal + 2]))
+
+            offsets_file.seek(self.flushed * entry_size)
+            offsets_file.write(self._to_bytes(self.offsets[2 * self.flushed:]))
+            offsets_file.truncate()
+            offsets_file.flush()
+            stat = os.fstat(offsets_file.fileno())
+            self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        self.flushed = len(self.offsets) // 2
+        self.changed = set()
+        return written
+
+    @staticmethod
+    def _to_bytes(offsets):
+        if sys.byteorder == 'big':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+
+        return offsets.tobytes()
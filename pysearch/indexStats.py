@@ -0,0 +1,314 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+from . import scoring
+
+
+class IndexStats(object):
+    """
+    The index-wide stats, kept in memory by the engine & written out on
+    commit (or at most every ``flush_interval`` seconds).
+
+    Holds the ``total_docs`` & ``generation`` counters, plus what BM25 needs
+    to normalize by document length: the length (in tokens) of every
+    document, by ordinal, & their sum.
+
+    The counters live in ``stats.json``, tagged with the ``version`` of the
+    format, along with the ``bucketing`` of the segments (see
+    ``bucketing.from_config``). The lengths live next to it in a flat array
+    of unsigned 32-bit integers, indexed by doc ordinal. So do their norms,
+    a byte per document holding its length quantized by
+    ``scoring.encode_norm``, which is all scoring needs.
+    """
+
+    def __init__(self, stats_path, lengths_path, version, flush_interval=None, norms_path=None) -> None:
+        """
+        Takes the ``stats_path`` (``stats.json``), the ``lengths_path`` & the
+        ``version`` string written to the stats.
+
+        Optionally accepts a ``flush_interval`` parameter, which is the number
+        of seconds commits may be held in memory before they're written out.
+        Default is ``None`` (write on every commit).
+
+        Optionally accepts a ``norms_path`` parameter, which is where the
+        norms are written. Default is ``None`` (``lengths_path`` with a
+        ``.norms`` suffix).
+        """
+        self.stats_path = stats_path
+        self.lengths_path = lengths_path
+        self.norms_path = norms_path or lengths_path + '.norms'
+        self.version = version
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.timer = None
+        self.load()
+
+    def load(self):
+        """
+        (Re)reads the stats from disk, dropping anything not flushed.
+        """
+        with self.lock:
+            current_stats = {}
+            self.identity = None
+
+            if os.path.exists(self.stats_path):
+                with open(self.stats_path, 'r') as stats_file:
+                    self.identity = self._stat_identity(stats_file.fileno())
+                    current_stats = json.load(stats_file)
+
+            self.file_version = current_stats.get('version', self.version)
+            self.total_docs = int(current_stats.get('total_docs', 0))
+            self.generation = int(current_stats.get('generation', 0))
+            self.total_length = int(current_stats.get('total_length', 0))
+            # Only ever set once, so it's kept if the file doesn't have it yet.
+            self.bucketing = current_stats.get('bucketing', getattr(self, 'bucketing', None))
+            self.doc_lengths = self._read_array(self.lengths_path, 'I')
+            self.doc_norms = self._read_array(self.norms_path, 'B')[:len(self.doc_lengths)]
+            self.flushed_lengths = len(self.doc_lengths)
+            self.flushed_norms = len(self.doc_norms)
+            self.changed_lengths = set()
+            self.changed_norms = set()
+
+            if len(self.doc_norms) < len(self.doc_lengths):
+                # Written before norms were, they're written out with the
+                # next flush.
+                self.doc_norms.extend(scoring.encode_norm(length)
+                                      for length in self.doc_lengths[len(self.doc_norms):])
+
+            self.dirty = False
+            self.last_flush = time.monotonic()
+
+    @staticmethod
+    def _read_array(path, typecode):
+        values = array(typecode)
+
+        if os.path.exists(path):
+            with open(path, 'rb') as array_file:
+                raw = array_file.read()
+
+            values.frombytes(raw[:len(raw) - len(raw) % values.itemsize])
+
+            if sys.byteorder == 'big':
+                values.byteswap()
+
+        return values
+
+    @staticmethod
+    def _stat_identity(fileno):
+        stat = os.fstat(fileno)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def refresh(self):
+        """
+        Picks up stats written by another instance since they were read. Costs
+        a single ``stat`` call when nothing changed.
+
+        Stats with unflushed changes are left alone.
+        """
+        with self.lock:
+            if self.dirty:
+                return False
+
+            try:
+                stat = os.stat(self.stats_path)
+            except FileNotFoundError:
+                return False
+
+            if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self.identity:
+                return False
+
+            self.load()
+            return True
+
+    def average_length(self):
+        """
+        Returns the average document length, in tokens.
+        """
+        if not self.total_docs:
+            return 0.0
+
+        return self.total_length / self.total_docs
+
+    def set_lengths(self, lengths):
+        """
+        Replaces the length of every document with the ones in ``lengths``
+        (a list by ordinal), recounting the ``total_length``. Call
+        ``commit`` once done.
+        """
+        with self.lock:
+            self.doc_lengths = array('I', lengths)
+            self.doc_norms = array('B', [scoring.encode_norm(length) for length in lengths])
+            self.total_length = sum(lengths)
+            # Both get rewritten from the start.
+            self.flushed_lengths = self.flushed_norms = 0
+            self.changed_lengths = set()
+            self.changed_norms = set()
+            self.dirty = True
+
+    def doc_length(self, ordinal):
+        """
+        Returns the length of the document with ``ordinal``, or ``0`` if it
+        isn't known.
+        """
+        if ordinal < len(self.doc_lengths):
+            return self.doc_lengths[ordinal]
+
+        return 0
+
+    def add_document(self, ordinal, length, replace=False):
+        """
+        Records a new document with ``ordinal`` & ``length`` (in tokens).
+        Call ``commit`` once done adding.
+
+        Optionally accepts a ``replace`` parameter, which is a boolean &
+        should be ``True`` when the document was already in the index, so it
+        isn't counted twice. Default is ``False``.
+        """
+        with self.lock:
+            self._set_length(ordinal, length)
+
+            if not replace:
+                self.total_docs += 1
+
+            self.dirty = True
+
+    def remove_document(self, ordinal):
+        """
+        Forgets the (deleted) document with ``ordinal``. Call ``commit`` once
+        done removing.
+        """
+        with self.lock:
+            self._set_length(ordinal, 0)
+            self.total_docs = max(0, self.total_docs - 1)
+            self.dirty = True
+
+    def _set_length(self, ordinal, length):
+        if ordinal >= len(self.doc_lengths):
+            self.doc_lengths.extend([0] * (ordinal + 1 - len(self.doc_lengths)))
+            self.doc_norms.extend([0] * (ordinal + 1 - len(self.doc_norms)))
+
+        self.total_length += length - self.doc_lengths[ordinal]
+        self.doc_lengths[ordinal] = length
+        self.doc_norms[ordinal] = scoring.encode_norm(length)
+
+        if ordinal < self.flushed_lengths:
+            self.changed_lengths.add(ordinal)
+
+        if ordinal < self.flushed_norms:
+            self.changed_norms.add(ordinal)
+
+    def commit(self):
+        """
+        Bumps the ``generation`` & writes the stats out, unless the
+        ``flush_interval`` says they can wait (a timer writes them later).
+        """
+        with self.lock:
+            self.generation += 1
+            self.dirty = True
+
+            if self.flush_interval is None or time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(
+                    self.flush_interval - (time.monotonic() - self.last_flush), self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """
+        Writes any unflushed changes out. Returns ``True`` if there were any.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+            if not self.dirty:
+                return False
+
+            self._flush_lengths()
+            self._write_json(self.as_dict())
+            self.dirty = False
+            self.last_flush = time.monotonic()
+            return True
+
+    def _flush_lengths(self):
+        self._flush_array(self.lengths_path, self.doc_lengths, self.flushed_lengths, self.changed_lengths)
+        self._flush_array(self.norms_path, self.doc_norms, self.flushed_norms, self.changed_norms)
+        self.flushed_lengths = len(self.doc_lengths)
+        self.flushed_norms = len(self.doc_norms)
+        self.changed_lengths = set()
+        self.changed_norms = set()
+
+    def _flush_array(self, path, values, flushed, changed):
+        if not changed and flushed == len(values):
+            return
+
+        mode = 'r+b' if os.path.exists(path) else 'w+b'
+
+        with open(path, mode) as array_file:
+            # Re-indexed documents are patched in place, new ones appended.
+            for ordinal in sorted(changed):
+                array_file.seek(ordinal * values.itemsize)
+                array_file.write(self._to_bytes(values[ordinal:ordinal + 1]))
+
+            array_file.seek(flushed * values.itemsize)
+            array_file.write(self._to_bytes(values[flushed:]))
+            array_file.truncate()
+
+    @staticmethod
+    def _to_bytes(values):
+        if sys.byteorder == 'big':
+            values = array(values.typecode, values)
+            values.byteswap()
+
+        return values.tobytes()
+
+    def _write_json(self, new_stats):
+        # Written to a temporary file & moved into place, so readers never
+        # see half of it.
+        stats_dir = os.path.dirname(self.stats_path)
+        fd, temp_name = tempfile.mkstemp(dir=stats_dir, prefix='.stats-')
+
+        with os.fdopen(fd, 'w') as stats_file:
+            json.dump(new_stats, stats_file)
+            stats_file.flush()
+            self.identity = self._stat_identity(stats_file.fileno())
+
+        os.replace(temp_name, self.stats_path)
+
+        self.file_version = new_stats['version']
+
+    def update(self, new_stats):
+        """
+        Replaces the counters with the ones in the ``new_stats`` dict & writes
+        them out.
+        """
+        with self.lock:
+            self.total_docs = int(new_stats.get('total_docs', self.total_docs))
+            self.generation = int(new_stats.get('generation', self.generation))
+            self.total_length = int(new_stats.get('total_length', self.total_length))
+            self.bucketing = new_stats.get('bucketing', self.bucketing)
+            self.dirty = True
+            self.flush()
+
+    def as_dict(self):
+        """
+        Returns the counters the way they're stored in ``stats.json``.
+        """
+        stats = {
+            'version': self.version,
+            'total_docs': self.total_docs,
+            'generation': self.generation,
+            'total_length': self.total_length,
+        }
+
+        if self.bucketing is not None:
+            stats['bucketing'] = self.bucketing
+
+        return stats
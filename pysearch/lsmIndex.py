@@ -0,0 +1,452 @@
+import heapq
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from operator import itemgetter
+
+from . import segmentFormat
+
+
+class LSMIndex(object):
+    """
+    A log-structured layout for the postings: instead of rewriting the
+    segment a term hashes to, every flush writes one new, immutable segment
+    holding all of its terms. Lookups union the postings of every live
+    segment & a size-tiered policy merges small segments into bigger ones.
+
+    Every segment gets a number when it's written. A merged segment covers
+    the range of numbers it was merged from, so ranges never overlap. The
+    ``owners`` array records, per doc ordinal, the number of the segment that
+    holds the document's current version. Postings of a document only count
+    in the segment whose range covers its owner, so re-indexing a document
+    (which writes it to a newer segment) hides its older postings & setting
+    its owner to ``0`` (a tombstone) deletes it. Nothing gets rewritten until
+    the segments are merged, which drops the hidden postings for good.
+
+    The live segments are listed in ``manifest.json``, which is replaced
+    atomically on every change, so readers always see a consistent set.
+    Only one process should write to an index at a time.
+    """
+
+    def __init__(self, path, segment_reader, merge_factor=10, min_segment_bytes=64 * 1024) -> None:
+        """
+        Takes the ``path`` of the directory holding the segments & the
+        ``segment_reader`` (see ``SegmentReader``) to read them through.
+
+        Optionally accepts a ``merge_factor`` parameter, which is how many
+        segments of the same tier get merged together. Default is ``10``.
+
+        Optionally accepts a ``min_segment_bytes`` parameter, which is the
+        size of the smallest tier. Every next tier holds segments
+        ``merge_factor`` times bigger. Default is ``64KB``.
+        """
+        self.path = path
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        self.owners_path = os.path.join(path, 'owners')
+        self.segment_reader = segment_reader
+        self.merge_factor = max(2, merge_factor)
+        self.min_segment_bytes = min_segment_bytes
+        self.lock = threading.RLock()
+
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+
+        self.load()
+
+    def load(self):
+        """
+        (Re)reads the manifest & the owners from disk.
+        """
+        with self.lock:
+            manifest = {}
+            self.identity = None
+
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as manifest_file:
+                    stat = os.fstat(manifest_file.fileno())
+                    self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                    manifest = json.load(manifest_file)
+
+            self.segments = manifest.get('segments', [])
+            self.next_number = manifest.get('next_number', 1)
+            self.deleted = manifest.get('deleted', 0)
+            self.owners = array('I')
+
+            if os.path.exists(self.owners_path):
+                with open(self.owners_path, 'rb') as owners_file:
+                    raw = owners_file.read()
+
+                self.owners.frombytes(raw[:len(raw) - len(raw) % self.owners.itemsize])
+
+                if sys.byteorder == 'big':
+                    self.owners.byteswap()
+
+            self.flushed_owners = len(self.owners)
+            self.changed_owners = set()
+            # Replaced on every change, so caches can tell their entries are
+            # stale.
+            self.token = object()
+
+    def refresh(self):
+        """
+        Picks up changes written by another instance. Costs a single ``stat``
+        call when nothing changed.
+
+        Returns ``True`` if anything was reloaded.
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return False
+
+        with self.lock:
+            if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self.identity:
+                return False
+
+            self.load()
+            return True
+
+    def __len__(self):
+        return len(self.segments)
+
+    def owner(self, ordinal):
+        """
+        Returns the number of the segment holding the current version of the
+        document with ``ordinal``, or ``0`` if it was deleted (or never
+        indexed).
+        """
+        if ordinal < len(self.owners):
+            return self.owners[ordinal]
+
+        return 0
+
+    def _set_owner(self, ordinal, number):
+        if ordinal >= len(self.owners):
+            self.owners.extend([0] * (ordinal + 1 - len(self.owners)))
+
+        self.owners[ordinal] = number
+
+        if ordinal < self.flushed_owners:
+            self.changed_owners.add(ordinal)
+
+    def segment_path(self, segment):
+        return os.path.join(self.path, segment['name'])
+
+    def add_segment(self, terms, ordinals):
+        """
+        Writes the ``terms`` dict (term -> ``term_info``) to a new segment.
+
+        ``ordinals`` are the documents the postings belong to. Their postings
+        must be complete, since they replace any older version of those
+        documents.
+
+        Returns the number of the new segment.
+        """
+        records = ((term, segmentFormat.encode_postings(terms[term])) for term in sorted(terms))
+        return self.add_records(records, ordinals)
+
+    def add_records(self, records, ordinals):
+        """
+        Same as ``add_segment``, but takes already encoded ``(term,
+        postings)`` ``records`` in ascending term order.
+        """
+        with self.lock:
+            number = self.next_number
+            segment = self._write(number, number, records)
+
+            for ordinal in ordinals:
+                self._set_owner(ordinal, number)
+
+            self.next_number = number + 1
+
+            if segment is not None:
+                self.segments.append(segment)
+
+            self._commit()
+
+            if segment is not None:
+                self.maybe_merge()
+
+            return number
+
+    def delete(self, ordinals):
+        """
+        Tombstones the documents with ``ordinals``, hiding all of their
+        postings. They're dropped from disk by the next merge.
+
+        Returns the number of documents that were live.
+        """
+        with self.lock:
+            deleted = 0
+
+            for ordinal in ordinals:
+                if self.owner(ordinal):
+                    self._set_owner(ordinal, 0)
+                    deleted += 1
+
+            if deleted:
+                self.deleted += deleted
+                self._commit()
+
+            return deleted
+
+    def _write(self, first, last, records):
+        """
+        Writes ``records`` to a new segment covering ``first`` to ``last``.
+
+        Returns its manifest entry, or ``None`` if there were no records.
+        """
+        fd, temp_name = tempfile.mkstemp(dir=self.path, prefix='.tmp-', suffix='.index')
+
+        try:
+            with os.fdopen(fd, 'wb') as seg_file:
+                term_count = segmentFormat.write_segment(seg_file, records)
+                size = seg_file.tell()
+
+            if not term_count:
+                os.remove(temp_name)
+                return None
+
+            name = '{0:010d}-{1:010d}.index'.format(first, last)
+            os.replace(temp_name, os.path.join(self.path, name))
+        except BaseException:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+
+            raise
+
+        return {'name': name, 'first': first, 'last': last, 'size': size, 'terms': term_count}
+
+    def _commit(self):
+        """
+        Writes the owners & then the manifest out.
+        """
+        self._flush_owners()
+
+        manifest = {
+            'segments': self.segments,
+            'next_number': self.next_number,
+            'deleted': self.deleted,
+        }
+        fd, temp_name = tempfile.mkstemp(dir=self.path, prefix='.manifest-')
+
+        with os.fdopen(fd, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            stat = os.fstat(manifest_file.fileno())
+            self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        os.replace(temp_name, self.manifest_path)
+        self.token = object()
+
+    def _flush_owners(self):
+        if not self.changed_owners and self.flushed_owners == len(self.owners):
+            return
+
+        mode = 'r+b' if os.path.exists(self.owners_path) else 'w+b'
+
+        with open(self.owners_path, mode) as owners_file:
+            for ordinal in sorted(self.changed_owners):
+                owners_file.seek(ordinal * self.owners.itemsize)
+                owners_file.write(self._to_bytes(self.owners[ordinal:ordinal + 1]))
+
+            owners_file.seek(self.flushed_owners * self.owners.itemsize)
+            owners_file.write(self._to_bytes(self.owners[self.flushed_owners:]))
+            owners_file.truncate()
+
+        self.flushed_owners = len(self.owners)
+        self.changed_owners = set()
+
+    @staticmethod
+    def _to_bytes(owners):
+        if sys.byteorder == 'big':
+            owners = array('I', owners)
+            owners.byteswap()
+
+        return owners.tobytes()
+
+    def _open(self, segment):
+        """
+        Returns the ``SegmentFile`` of a manifest entry, or ``None`` if it's
+        gone (merged away by another instance).
+        """
+        return self.segment_reader.get(self.segment_path(segment))
+
+    def find(self, term):
+        """
+        Unions the live postings of ``term`` across every segment.
+
+        Returns the same as ``SegmentHandler.load_postings``: a tuple of the
+        ``term_info`` dict (ordinals in ascending order) & the highest
+        number of positions in any of its docs, or ``None``.
+        """
+        for _ in range(2):
+            with self.lock:
+                segments = list(self.segments)
+
+            found = self._find(term, segments)
+
+            if found is not False:
+                return found
+
+            # A segment was merged away under us, start over with the new
+            # manifest.
+            self.load()
+
+        raise FileNotFoundError('The segments of {0!r} keep changing.'.format(self.path))
+
+    def _find(self, term, segments):
+        term_info = {}
+        max_count = 0
+        sources = 0
+
+        for segment in segments:
+            seg_file = self._open(segment)
+
+            if seg_file is None:
+                return False
+
+            raw = seg_file.find_postings(term)
+
+            if raw is None:
+                continue
+
+            first, last = segment['first'], segment['last']
+            found = False
+
+            for ordinal, positions in segmentFormat.decode_postings(raw).items():
+                if first <= self.owner(ordinal) <= last:
+                    term_info[ordinal] = positions
+                    found = True
+
+            if found:
+                sources += 1
+                max_count = max(max_count, segmentFormat.postings_header(raw)[1])
+
+        if not term_info:
+            return None
+
+        if sources > 1:
+            term_info = dict(sorted(term_info.items()))
+
+        return term_info, max_count
+
+    def tier(self, segment):
+        """
+        Returns the size tier of a manifest entry: ``0`` up to
+        ``min_segment_bytes``, ``1`` up to ``merge_factor`` times that & so
+        on.
+        """
+        tier = 0
+        limit = self.min_segment_bytes
+
+        while segment['size'] > limit:
+            tier += 1
+            limit *= self.merge_factor
+
+        return tier
+
+    def _find_merge(self):
+        """
+        Returns the ``(start, end)`` slice of the oldest run of
+        ``merge_factor`` adjacent segments in the same tier, or ``None``.
+        """
+        start = 0
+
+        for number in range(1, len(self.segments) + 1):
+            if number == len(self.segments) or self.tier(self.segments[number]) != self.tier(self.segments[start]):
+                if number - start >= self.merge_factor:
+                    return start, start + self.merge_factor
+
+                start = number
+
+        return None
+
+    def maybe_merge(self):
+        """
+        Merges segments until no tier has ``merge_factor`` adjacent segments.
+
+        Returns the number of merges done.
+        """
+        with self.lock:
+            merges = 0
+
+            while True:
+                run = self._find_merge()
+
+                if run is None:
+                    return merges
+
+                self._merge(*run)
+                merges += 1
+
+    def optimize(self):
+        """
+        Merges every segment into one, dropping the postings of deleted &
+        re-indexed documents.
+
+        Returns ``True`` if anything was merged.
+        """
+        with self.lock:
+            self.refresh()
+
+            if len(self.segments) > 1 or (self.segments and self.deleted):
+                self._merge(0, len(self.segments))
+                self.deleted = 0
+                self._commit()
+                return True
+
+            return False
+
+    def _merge(self, start, end):
+        """
+        K-way merges the segments in ``[start:end]`` into one, keeping only
+        the live postings.
+        """
+        merging = self.segments[start:end]
+        first, last = merging[0]['first'], merging[-1]['last']
+        seg_files = [self._open(segment) for segment in merging]
+
+        if any(seg_file is None for seg_file in seg_files):
+            raise FileNotFoundError('A segment of {0!r} went missing while merging.'.format(self.path))
+
+        def tagged(seg_file, segment):
+            for term, raw in seg_file.iter_records():
+                yield term, raw, segment['first'], segment['last']
+
+        def merged_records():
+            streams = [tagged(seg_file, segment) for seg_file, segment in zip(seg_files, merging)]
+
+            for term, group in itertools.groupby(heapq.merge(*streams, key=itemgetter(0)), key=itemgetter(0)):
+                term_info = {}
+
+                for _, raw, seg_first, seg_last in group:
+                    for ordinal, positions in segmentFormat.decode_postings(raw).items():
+                        if seg_first <= self.owner(ordinal) <= seg_last:
+                            term_info[ordinal] = positions
+
+                if term_info:
+                    yield term, segmentFormat.encode_postings(term_info)
+
+        merged = self._write(first, last, merged_records())
+        self.segments[start:end] = [merged] if merged is not None else []
+        self._commit()
+
+        # Readers still holding the old manifest retry with the new one.
+        for segment in merging:
+            self.segment_reader.invalidate(self.segment_path(segment))
+
+            if merged is not None and segment['name'] == merged['name']:
+                # A single segment merged by itself, replaced in place.
+                continue
+
+            try:
+                os.remove(self.segment_path(segment))
+            except OSError:
+                pass
+
+        return merged
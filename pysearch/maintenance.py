@@ -0,0 +1,222 @@
+"""
+Offline maintenance tools for an existing index.
+
+Run them against the ``base_directory`` of an index, while nothing else is
+writing to it::
+
+    python -m pysearch.maintenance convert-segments SearchData
+    python -m pysearch.maintenance optimize SearchData
+    python -m pysearch.maintenance rebuild-forward-index SearchData
+    python -m pysearch.maintenance pack-documents SearchData
+    python -m pysearch.maintenance compact-documents SearchData
+    python -m pysearch.maintenance compute-norms SearchData
+    python -m pysearch.maintenance rebucket SearchData --strategy crc32 --buckets 4096
+    python -m pysearch.maintenance bucket-stats SearchData
+"""
+import argparse
+import json
+import os
+import shutil
+
+from . import bucketing
+from . import documentHandler
+from . import documentStore
+from . import segmentHandler
+from . import tokenization
+
+
+def convert_segments(base_directory):
+    """
+    Rewrites every legacy (tab-separated JSON) segment under
+    ``base_directory`` in the binary segment format.
+
+    Returns the number of segments converted.
+    """
+    return segmentHandler.SegmentHandler(base_directory).convert_segments()
+
+
+def optimize(base_directory):
+    """
+    Merges every segment of an index using the log-structured layout into
+    one, dropping deleted & replaced postings, & the term dictionary of an
+    index using whole words as terms, dropping words no document has.
+
+    Returns ``True`` if anything was merged.
+    """
+    return segmentHandler.SegmentHandler(base_directory).optimize()
+
+
+def rebuild_forward_index(base_directory):
+    """
+    Rebuilds the forward index (the terms of every document) of an index
+    created before it existed, so its documents can be deleted & replaced,
+    & recounts the index stats from it.
+
+    Returns the number of documents found.
+    """
+    handler = segmentHandler.SegmentHandler(base_directory)
+    count = handler.rebuild_forward_index()
+    total_length = 0
+
+    for ordinal in range(len(handler.stats.doc_lengths)):
+        if ordinal in handler.forward:
+            total_length += handler.stats.doc_lengths[ordinal]
+
+    handler.stats.update({'total_docs': count, 'total_length': total_length})
+    handler.publish_snapshot()
+    return count
+
+
+def pack_documents(base_directory, codec=None):
+    """
+    Moves the documents of an index from their own JSON files into a packed,
+    block-compressed store (see ``PackedDocumentStore``). Safe to run again
+    if it was interrupted.
+
+    Optionally accepts a ``codec`` parameter, which is ``'none'``,
+    ``'zlib'`` or ``'zstd'``. Default is ``None`` (``'zlib'``).
+
+    Returns the number of documents moved.
+    """
+    handler = documentHandler.DocumentHandler(base_directory)
+    files = documentStore.FileDocumentStore(handler.docs_path)
+    packed = handler.documents
+
+    if packed.kind != 'packed' or codec is not None:
+        packed = documentStore.PackedDocumentStore(handler.docs_path, handler.doc_ids, codec=codec)
+
+    count = 0
+
+    for doc_id, document in files.iter_documents():
+        packed.save(doc_id, document)
+        count += 1
+
+        if count % 1000 == 0:
+            handler.doc_ids.flush()
+            packed.flush()
+
+    handler.doc_ids.flush()
+    packed.flush()
+
+    # Only once every document is in the packed store.
+    for name in os.listdir(handler.docs_path):
+        if os.path.isdir(os.path.join(handler.docs_path, name)):
+            shutil.rmtree(os.path.join(handler.docs_path, name))
+
+    return count
+
+
+def compact_documents(base_directory):
+    """
+    Rewrites the packed store of an index, dropping the records of replaced
+    & deleted documents.
+
+    Returns the number of bytes reclaimed.
+    """
+    handler = documentHandler.DocumentHandler(base_directory)
+
+    if handler.documents.kind != 'packed':
+        return 0
+
+    return handler.documents.compact()
+
+
+def compute_norms(base_directory):
+    """
+    Recounts the length of every stored document & writes out their norms,
+    for indexes built before lengths were recorded (whose documents all
+    score as if they were of average length).
+
+    Returns the number of documents measured.
+    """
+    handler = documentHandler.DocumentHandler(base_directory)
+    lengths = [0] * len(handler.doc_ids)
+    count = 0
+
+    for doc_id, document in handler.documents.iter_documents():
+        ordinal = handler.doc_ids.ordinal(doc_id)
+
+        if ordinal is None:
+            # Nothing in the index refers to it.
+            continue
+
+        lengths[ordinal] = tokenization.make_terms(document.get('text', ''))[1]
+        count += 1
+
+    handler.stats.set_lengths(lengths)
+    handler.stats.commit()
+    return count
+
+
+def rebucket(base_directory, strategy=bucketing.DEFAULT_STRATEGY, buckets=None):
+    """
+    Moves every term of a bucketed index into the buckets of another
+    bucketing ``strategy`` with ``buckets`` buckets (see
+    ``SegmentHandler.rebucket``). Nothing else may use the index meanwhile.
+
+    Returns the number of segments written.
+    """
+    return segmentHandler.SegmentHandler(base_directory).rebucket(strategy, buckets)
+
+
+def bucket_stats(base_directory):
+    """
+    Returns how the terms of an index are spread over its segments (see
+    ``SegmentHandler.bucket_stats``).
+    """
+    return segmentHandler.SegmentHandler(base_directory).bucket_stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline maintenance tools for a pysearch index.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert-segments', help='convert legacy text segments to the binary format')
+    convert.add_argument('base_directory')
+
+    merge = commands.add_parser('optimize', help='merge the segments of an lsm index into one')
+    merge.add_argument('base_directory')
+
+    rebuild = commands.add_parser('rebuild-forward-index', help='rebuild the forward index & recount the stats')
+    rebuild.add_argument('base_directory')
+
+    pack = commands.add_parser('pack-documents', help='move the documents into a packed, compressed store')
+    pack.add_argument('base_directory')
+    pack.add_argument('--codec', choices=sorted(documentStore.CODECS))
+
+    compact = commands.add_parser('compact-documents', help='drop replaced & deleted documents from the packed store')
+    compact.add_argument('base_directory')
+
+    norms = commands.add_parser('compute-norms', help='recount document lengths & write their norms for BM25')
+    norms.add_argument('base_directory')
+
+    move = commands.add_parser('rebucket', help='move every term into the buckets of another bucketing')
+    move.add_argument('base_directory')
+    move.add_argument('--strategy', choices=sorted(bucketing.STRATEGIES), default=bucketing.DEFAULT_STRATEGY)
+    move.add_argument('--buckets', type=int)
+
+    spread = commands.add_parser('bucket-stats', help='show how the terms are spread over the segments')
+    spread.add_argument('base_directory')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert-segments':
+        print('Converted {0} segment(s).'.format(convert_segments(args.base_directory)))
+    elif args.command == 'optimize':
+        print('Optimized.' if optimize(args.base_directory) else 'Nothing to optimize.')
+    elif args.command == 'rebuild-forward-index':
+        print('Found {0} document(s).'.format(rebuild_forward_index(args.base_directory)))
+    elif args.command == 'pack-documents':
+        print('Packed {0} document(s).'.format(pack_documents(args.base_directory, args.codec)))
+    elif args.command == 'compact-documents':
+        print('Reclaimed {0} byte(s).'.format(compact_documents(args.base_directory)))
+    elif args.command == 'compute-norms':
+        print('Measured {0} document(s).'.format(compute_norms(args.base_directory)))
+    elif args.command == 'rebucket':
+        print('Wrote {0} segment(s).'.format(rebucket(args.base_directory, args.strategy, args.buckets)))
+    elif args.command == 'bucket-stats':
+        print(json.dumps(bucket_stats(args.base_directory), indent=2))
+
+
+if __name__ == '__main__':
+    main()
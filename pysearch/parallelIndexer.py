@@ -0,0 +1,319 @@
+import heapq
+import itertools
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from operator import itemgetter
+
+from . import documentHandler
+from . import segmentFormat
+from . import segmentHandler
+from . import tokenization
+
+
+def _index_shard(base_directory, temp_path, shard, save_documents=True, whole_tokens=False):
+    """
+    Runs in a worker process. Analyzes & stores the documents of a ``shard``
+    (a list of ``(ordinal, doc_id, document)`` tuples), then writes their
+    postings to a private segment in ``temp_path``.
+
+    A packed document store only has a single writer, so with
+    ``save_documents=False`` the parent stores the documents instead. With
+    ``whole_tokens=True``, every whole token is a term instead of its
+    n-grams (see ``SegmentHandler.use_token_terms``).
+
+    Returns a tuple of the path to the segment & a list of ``(ordinal,
+    length, terms)`` tuples for the index stats & the ``ForwardIndex``.
+    """
+    documents = documentHandler.DocumentHandler(base_directory) if save_documents else None
+    postings = {}
+    lengths = []
+    analyze = tokenization.make_token_terms if whole_tokens else tokenization.make_terms
+
+    for ordinal, doc_id, document in shard:
+        terms, length = analyze(document.get('text', ''))
+
+        if save_documents:
+            documents.save_document(doc_id, document)
+
+        for term, positions in terms.items():
+            postings.setdefault(term, {})[ordinal] = positions
+
+        lengths.append((ordinal, length, list(terms)))
+
+    fd, shard_path = tempfile.mkstemp(dir=temp_path, prefix='shard-', suffix='.index')
+
+    with os.fdopen(fd, 'wb') as shard_file:
+        segmentFormat.write_segment(
+            shard_file, ((term, segmentFormat.encode_postings(postings[term])) for term in sorted(postings)))
+
+    return shard_path, lengths
+
+
+def _merged_records(shard_paths):
+    """
+    K-way merges the records of the segments at ``shard_paths`` by term.
+
+    Yields ``(term, postings)`` in ascending term order, combining the
+    postings of terms found in more than one segment.
+    """
+    shard_files = [open(shard_path, 'rb') for shard_path in shard_paths]
+
+    try:
+        streams = [segmentFormat.SegmentFile.from_file(shard_file).iter_records() for shard_file in shard_files]
+
+        for term, group in itertools.groupby(heapq.merge(*streams, key=itemgetter(0)), key=itemgetter(0)):
+            group = list(group)
+
+            if len(group) == 1:
+                yield group[0]
+                continue
+
+            term_info = {}
+
+            for _, postings in group:
+                segmentHandler._update_term_info(term_info, segmentFormat.decode_postings(postings))
+
+            yield term, segmentFormat.encode_postings(term_info)
+    finally:
+        for shard_file in shard_files:
+            shard_file.close()
+
+
+def _partition(strategy, term, partitions):
+    """
+    Returns the merge partition of the segment ``term`` goes to with the
+    bucketing ``strategy``, so every segment is only ever written by a
+    single process.
+    """
+    return strategy.bucket(term) % partitions
+
+
+def _merge_partition(base_directory, shard_paths, partition, partitions, removed):
+    """
+    Runs in a worker process. Merges the records of the worker segments at
+    ``shard_paths`` whose segment falls in ``partition`` into the index,
+    dropping the older postings of re-indexed documents listed in
+    ``removed`` (a dict of terms of the partition to ordinals) on the way.
+
+    Segments in an older format may refer to documents that don't have an
+    ordinal yet, & only the parent may hand those out. So they're left
+    alone & returned as a dict of segment names to a tuple of their list of
+    ``(term, postings)`` records & ``removed`` dict for the parent to merge.
+
+    Returns a tuple of that dict & one of the segment names to the files
+    written for them, which the parent publishes when the index keeps
+    snapshots (see ``SnapshotManager.add``).
+    """
+    handler = segmentHandler.SegmentHandler(base_directory)
+    per_segment = {}
+
+    for term, postings in _merged_records(shard_paths):
+        if _partition(handler.bucketing, term, partitions) == partition:
+            per_segment.setdefault(handler.set_name_seg(term), ([], {}))[0].append((term, postings))
+
+    for term, ordinals in removed.items():
+        per_segment.setdefault(handler.set_name_seg(term), ([], {}))[1][term] = ordinals
+
+    skipped = {}
+
+    for seg_name, (records, seg_removed) in per_segment.items():
+        seg_file = handler.segment_file(seg_name)
+
+        if os.path.exists(seg_file) and segmentFormat.segment_version(seg_file) in (None, 1):
+            skipped[seg_name] = (records, seg_removed)
+        else:
+            handler.merge_records(seg_name, records, removed=seg_removed)
+
+    return skipped, {} if handler.snapshots is None else dict(handler.snapshots.pending)
+
+
+class ParallelIndexer(object):
+    """
+    Indexes documents across a pool of worker processes.
+
+    Documents are split into shards of ``shard_size``. The parent hands out
+    the ordinals (see ``DocIdTable``), then each worker analyzes & stores the
+    documents of a shard & writes their postings to a private segment in
+    ``temp_path``. Once every shard is done, the worker segments are k-way
+    merged into the index, again in parallel: each worker takes care of its
+    own share of the segments, so no segment is written by two processes.
+
+    Re-indexed documents replace their older version, but a ``doc_id`` may
+    only appear once per run: its versions would go to different workers,
+    which index them in any order. A repeated one raises a ``ValueError``.
+    Every document is checked before the first shard goes out, so a run
+    that fails on one of them leaves the index & documents as they were.
+
+    Use it through ``PySearch.parallel_index``::
+
+        engine.parallel_index(documents, workers=8)
+    """
+
+    def __init__(self, engine, workers=None, shard_size=1000) -> None:
+        """
+        Takes the ``engine`` (a ``PySearch`` instance) to write through.
+
+        Optionally accepts a ``workers`` parameter, which is the number of
+        worker processes. Default is ``None`` (one per CPU).
+
+        Optionally accepts a ``shard_size`` parameter, which is the number of
+        documents each worker indexes at a time. Default is ``1000``.
+        """
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        # The terms of the older version of re-indexed documents.
+        self.old_terms = {}
+
+    def _validate(self, documents):
+        """
+        Checks that all of the ``documents`` can be indexed, before any of
+        them is stored or gets an ordinal.
+
+        Returns them as a list of ``(doc_id, document)`` tuples, with the
+        ``doc_id`` as a string. Raises a ``ValueError`` for a ``doc_id`` seen
+        before in the run.
+        """
+        validated = []
+        seen = set()
+
+        for doc_id, document in documents:
+            doc_id = self.engine._validate_document(doc_id, document)
+
+            if doc_id in seen:
+                raise ValueError('The document {0!r} appears more than once.'.format(doc_id))
+
+            seen.add(doc_id)
+            validated.append((doc_id, document))
+
+        return validated
+
+    def _shards(self, documents):
+        """
+        Assigns the ordinals of the validated ``documents``, yielding them in
+        lists of ``(ordinal, doc_id, document)`` tuples of ``shard_size``.
+        """
+        shard = []
+
+        for doc_id, document in documents:
+            ordinal = self.engine.doc_ids.assign(doc_id)
+            old_terms = self.engine.forward.terms(ordinal)
+
+            if old_terms is not None:
+                self.old_terms[ordinal] = old_terms
+
+            shard.append((ordinal, doc_id, document))
+
+            if self.engine.documents.kind == 'packed':
+                self.engine.save_document(doc_id, document)
+
+            if len(shard) >= self.shard_size:
+                self.engine.flush_documents()
+                yield shard
+                shard = []
+
+        if shard:
+            yield shard
+
+    def index(self, documents):
+        """
+        Given an iterable of ``(doc_id, document)`` pairs, indexes all of them.
+        It's read in full before anything is indexed, to validate every
+        document first.
+
+        Returns the number of documents indexed.
+        """
+        engine = self.engine
+        documents = self._validate(documents)
+        engine.forward.refresh()
+        self.old_terms = {}
+        shard_paths = []
+        lengths = []
+        pending = set()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for shard in self._shards(documents):
+                    # Keep a bounded number of shards in flight, so huge
+                    # inputs aren't all queued up for the workers at once.
+                    if len(pending) >= 2 * self.workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                        for future in done:
+                            self._collect(future, shard_paths, lengths)
+
+                    pending.add(executor.submit(
+                        _index_shard, engine.base_directory, engine.temp_path, shard,
+                        engine.documents.kind != 'packed', engine.term_dictionary is not None))
+
+                for future in pending:
+                    self._collect(future, shard_paths, lengths)
+
+                pending = set()
+
+                if not shard_paths:
+                    return 0
+
+                # The ordinals have to be on disk before any posting refers to
+                # them.
+                engine.doc_ids.flush()
+                engine.flush_documents()
+
+                if engine.lsm is not None:
+                    # Everything goes to a single new segment.
+                    engine.lsm.add_records(
+                        _merged_records(shard_paths), [ordinal for ordinal, _, _ in lengths])
+                    merges = []
+                else:
+                    removed = [{} for _ in range(self.workers)]
+
+                    for term, ordinals in engine._removed_terms(self.old_terms).items():
+                        removed[_partition(engine.bucketing, term, self.workers)][term] = ordinals
+
+                    merges = [
+                        executor.submit(_merge_partition, engine.base_directory, shard_paths, partition,
+                                        self.workers, removed[partition])
+                        for partition in range(self.workers)
+                    ]
+                skipped = {}
+
+                for future in merges:
+                    partition_skipped, written = future.result()
+                    skipped.update(partition_skipped)
+
+                    for seg_name, seg_file in written.items():
+                        engine.snapshots.add(seg_name, seg_file)
+
+            for seg_name, (records, seg_removed) in skipped.items():
+                engine.merge_records(seg_name, records, removed=seg_removed)
+
+            engine.doc_ids.flush()
+        finally:
+            # Shards still in flight when something failed are done by now.
+            for future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    shard_paths.append(future.result()[0])
+
+            for shard_path in shard_paths:
+                os.remove(shard_path)
+
+        if engine.term_dictionary is not None:
+            engine.term_dictionary.add(term for _, _, terms in lengths for term in terms)
+
+        for ordinal, length, terms in lengths:
+            engine.forward.set(ordinal, terms)
+
+        engine.forward.flush()
+
+        for ordinal, length, _ in lengths:
+            engine.stats.add_document(ordinal, length, replace=ordinal in self.old_terms)
+
+        engine.commit()
+        return len(lengths)
+
+    @staticmethod
+    def _collect(future, shard_paths, lengths):
+        shard_path, shard_lengths = future.result()
+        shard_paths.append(shard_path)
+        lengths.extend(shard_lengths)
@@ -1,7 +1,9 @@
 import os
-import json
 
-__version__ = (1, 0, 0)
+from . import docIdTable
+from . import indexStats
+
+__version__ = (1, 1, 0)
 
 
 class PathSetUp(object):
@@ -14,10 +16,25 @@ class PathSetUp(object):
         """
         self.base_directory = base_directory
         self.index_path = os.path.join(self.base_directory, 'index')
+        self.lsm_path = os.path.join(self.index_path, 'lsm')
+        self.terms_path = os.path.join(self.index_path, 'terms')
+        self.snapshots_path = os.path.join(self.index_path, 'snapshots')
         self.docs_path = os.path.join(self.base_directory, 'documents')
         self.stats_path = os.path.join(self.base_directory, 'stats.json')
         self.temp_path = os.path.join(self.base_directory, 'temp')
+        self.doc_ids_path = os.path.join(self.base_directory, 'docids')
+        self.doc_lengths_path = os.path.join(self.base_directory, 'doclengths')
+        self.doc_norms_path = os.path.join(self.base_directory, 'docnorms')
+        self.forward_path = os.path.join(self.base_directory, 'forward')
+        self.wal_path = os.path.join(self.base_directory, 'wal')
         self.setup()
+        # Kept in memory, see ``IndexStats``.
+        self.stats = indexStats.IndexStats(
+            self.stats_path, self.doc_lengths_path, '.'.join([str(bit) for bit in __version__]),
+            norms_path=self.doc_norms_path)
+        # Postings & packed documents refer to documents by their ordinal in
+        # this table.
+        self.doc_ids = docIdTable.DocIdTable(self.doc_ids_path)
 
     def setup(self) -> bool:
         """Create various data directories.
@@ -34,6 +51,9 @@ class PathSetUp(object):
         if not os.path.exists(self.docs_path):
             os.makedirs(self.docs_path)
 
+        if not os.path.exists(self.temp_path):
+            os.makedirs(self.temp_path)
+
         if os.path.exists(self.base_directory) and os.path.exists(self.index_path) and os.path.exists(self.docs_path):
             return True
 
@@ -43,14 +63,8 @@ class PathSetUp(object):
         """
         Reads the index-wide stats.
         """
-        if not os.path.exists(self.stats_path):
-            return {
-                'version': '.'.join([str(bit) for bit in __version__]),
-                'total_docs': 0,
-            }
-
-        with open(self.stats_path, 'r') as stats_file:
-            return json.load(stats_file)
+        self.stats.refresh()
+        return self.stats.as_dict()
 
     def write_stats(self, new_stats):
         """
@@ -60,32 +74,45 @@ class PathSetUp(object):
         stat data. Example stat data::
 
             {
-                'version': '1.0.0',
+                'version': '1.1.0',
                 'total_docs': 25,
+                'generation': 3,
+                'total_length': 1250,
             }
         """
-        with open(self.stats_path, 'w') as stats_file:
-            json.dump(new_stats, stats_file)
+        self.stats.update(new_stats)
         return True
 
-    def increment_total_docs(self):
+    def increment_total_docs(self, count=1):
         """
         Increments the total number of documents the index is aware of.
 
         This is important for scoring reasons & is typically called as part
         of the indexing process.
+
+        Optionally accepts a ``count`` parameter, which is the number of
+        documents to add. Default is ``1``.
+
+        Since every commit goes through here, this also bumps the index
+        ``generation``, which tells caches their entries are stale.
         """
-        current_stats = self.read_stats()
-        current_stats.setdefault('total_docs', 0)
-        current_stats['total_docs'] += 1
-        self.write_stats(current_stats)
+        with self.stats.lock:
+            self.stats.total_docs += count
+            self.stats.commit()
 
     def get_total_docs(self):
         """
         Returns the total number of documents the index is aware of.
         """
-        current_stats = self.read_stats()
-        return int(current_stats.get('total_docs', 0))
+        self.stats.refresh()
+        return self.stats.total_docs
+
+    def get_generation(self):
+        """
+        Returns the index generation, which goes up on every commit.
+        """
+        self.stats.refresh()
+        return self.stats.generation
 
 
 if __name__ == '__main__':
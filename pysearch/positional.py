@@ -0,0 +1,167 @@
+import heapq
+import re
+from bisect import bisect_left
+
+from . import tokenization
+
+# A phrase is whatever is between double quotes.
+PHRASE = re.compile(r'"([^"]*)"')
+
+
+def token_terms(text, min_gram=3, max_gram=6):
+    """
+    Analyzes ``text`` like a document & returns a list of ``(term,
+    offset)`` pairs: the longest n-gram of each token (the most selective
+    term it was indexed under) & the token's position in ``text``.
+
+    Tokens too short to have any n-gram are left out, but still count for
+    the offsets of the ones after them.
+    """
+    return [(token[:max_gram], offset) for offset, token in enumerate(tokenization.make_tokens(text))
+            if len(token) >= min_gram]
+
+
+def parse_phrases(query, min_gram=3, max_gram=6):
+    """
+    Returns a list of the phrases (double quoted) in ``query``, each a list
+    of ``(term, offset)`` pairs (see ``token_terms``). Phrases without any
+    term are left out.
+    """
+    phrases = []
+
+    for text in PHRASE.findall(query):
+        phrase = token_terms(text, min_gram, max_gram)
+
+        if phrase:
+            phrases.append(phrase)
+
+    return phrases
+
+
+def intersect(lists):
+    """
+    Intersects sorted lists of doc ordinals, walking the shortest one &
+    skipping ahead in the others with a binary search, so it costs time in
+    proportion to the shortest list.
+
+    Returns a sorted list.
+    """
+    if not lists:
+        return []
+
+    lists = sorted(lists, key=len)
+    cursors = [0] * len(lists)
+    found = []
+
+    for ordinal in lists[0]:
+        for number in range(1, len(lists)):
+            other = lists[number]
+            cursor = cursors[number] = bisect_left(other, ordinal, cursors[number])
+
+            if cursor == len(other):
+                return found
+
+            if other[cursor] != ordinal:
+                break
+        else:
+            found.append(int(ordinal))
+
+    return found
+
+
+def restrict(ordinals, counts, allowed):
+    """
+    Keeps only the docs of the aligned ``ordinals`` & ``counts`` that are
+    in ``allowed`` (a sorted list), skipping ahead with a binary search.
+
+    Returns a tuple of two lists.
+    """
+    kept_ordinals = []
+    kept_counts = []
+    cursor = 0
+
+    for ordinal in allowed:
+        cursor = bisect_left(ordinals, ordinal, cursor)
+
+        if cursor == len(ordinals):
+            break
+
+        if ordinals[cursor] == ordinal:
+            kept_ordinals.append(ordinal)
+            kept_counts.append(counts[cursor])
+
+    return kept_ordinals, kept_counts
+
+
+def phrase_match(positions, offsets):
+    """
+    Checks whether a document has the tokens of a phrase next to each other:
+    some position ``start`` for which ``start + offsets[number]`` is in
+    ``positions[number]`` (a sorted list) for every token.
+
+    Merges the sorted positions, never going back, instead of building sets.
+    """
+    cursors = [0] * len(positions)
+    start = positions[0][0] - offsets[0]
+    number = 0
+    agreed = 0
+
+    while agreed < len(positions):
+        token_positions = positions[number]
+        target = start + offsets[number]
+        cursor = cursors[number]
+
+        while cursor < len(token_positions) and token_positions[cursor] < target:
+            cursor += 1
+
+        if cursor == len(token_positions):
+            return False
+
+        cursors[number] = cursor
+
+        if token_positions[cursor] == target:
+            agreed += 1
+        else:
+            # Too far, every token has to agree on the new start.
+            start = token_positions[cursor] - offsets[number]
+            agreed = 1
+
+        number = (number + 1) % len(positions)
+
+    return True
+
+
+def min_span(positions):
+    """
+    Returns the size of the smallest window of positions that holds at
+    least one position of each token (``0`` when they all coincide), by
+    merging the sorted ``positions`` lists with a heap.
+    """
+    heap = [(token_positions[0], number, 0) for number, token_positions in enumerate(positions)]
+    heapq.heapify(heap)
+    highest = max(position for position, _, _ in heap)
+    best = highest - heap[0][0]
+
+    while True:
+        lowest, number, cursor = heapq.heappop(heap)
+        best = min(best, highest - lowest)
+
+        if cursor + 1 == len(positions[number]) or not best:
+            return best
+
+        following = positions[number][cursor + 1]
+        highest = max(highest, following)
+        heapq.heappush(heap, (following, number, cursor + 1))
+
+
+def proximity_boost(positions, weight):
+    """
+    Returns the boost of a document holding every token of the query at
+    ``positions`` (a sorted list per token): the full ``weight`` when they're
+    next to each other, less the further they're apart.
+    """
+    if len(positions) < 2:
+        return 0.0
+
+    # Grams of the same token share its position, hence the floor.
+    return weight / max(1, 1 + min_span(positions) - (len(positions) - 1))
@@ -0,0 +1,354 @@
+import bisect
+import heapq
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _norm_lengths():
+    # Exact below 40 tokens, then growing by about 9% a step up to well
+    # past the longest length stored (2 ** 32 - 1).
+    lengths = list(range(40))
+
+    while len(lengths) < 256:
+        lengths.append(max(lengths[-1] + 1, int(lengths[-1] * 1.09)))
+
+    return lengths
+
+
+# The document length each of the 256 norms stands for.
+NORM_LENGTHS = _norm_lengths()
+
+
+def encode_norm(length):
+    """
+    Quantizes a document ``length`` (in tokens) into a norm that fits in a
+    byte: the largest of ``NORM_LENGTHS`` it reaches.
+    """
+    return bisect.bisect_right(NORM_LENGTHS, length) - 1
+
+
+class LengthNorms(object):
+    """
+    What BM25 normalizes term counts by, for every document: ``k * (1 - b +
+    b * length / average_length)``, where ``k`` & ``b`` are the usual BM25
+    parameters.
+
+    Only keeps the 256 possible values, looked up by the norm (see
+    ``encode_norm``) of each document, so the cost per scored document is
+    a lookup into the norms. Documents without a norm count as average.
+    """
+
+    def __init__(self, doc_norms, average_length, k=1.2, b=0.75) -> None:
+        """
+        Takes the ``doc_norms`` (a byte per document, by ordinal) & the
+        ``average_length`` of the documents.
+
+        Optionally accepts ``k`` & ``b`` parameters, which are floats. ``b``
+        goes from ``0`` (no normalization) to ``1`` (fully proportional to
+        the length). Defaults are ``1.2`` & ``0.75``.
+        """
+        self.k = k
+        self.table = [k * (1 - b + b * length / average_length) if average_length else k
+                      for length in NORM_LENGTHS]
+        # The smallest value any document can get, for upper bounds.
+        self.minimum = min(self.table)
+        # A copy, so the stats can keep growing theirs.
+        self.doc_norms = bytes(doc_norms)
+
+        if numpy is not None:
+            self.table_array = numpy.array(self.table + [k])
+            self.norms_array = numpy.frombuffer(self.doc_norms, dtype=numpy.uint8)
+
+    def __getitem__(self, ordinal):
+        if ordinal < len(self.doc_norms):
+            return self.table[self.doc_norms[ordinal]]
+
+        return self.k
+
+    def take(self, ordinals):
+        """
+        Returns an array of the values for ``ordinals`` (an ascending array).
+        """
+        if len(ordinals) and ordinals[-1] >= len(self.norms_array):
+            # Indexed since the norms were read, the last entry is ``k``.
+            norms = numpy.full(len(ordinals), 256)
+            known = ordinals < len(self.norms_array)
+            norms[known] = self.norms_array[ordinals[known]]
+            return self.table_array[norms]
+
+        return self.table_array[self.norms_array[ordinals]]
+
+
+def idf(term_docs, total_docs):
+    """
+    The inverse document frequency used by ``bm25_relevance``, for a term
+    found in ``term_docs`` of the ``total_docs`` documents.
+    """
+    return math.log((total_docs - term_docs + 1.0) / term_docs) / math.log(1.0 + total_docs)
+
+
+def bm25_scores(terms, per_term_docs, per_term_counts, total_docs, b=0, k=1.2, norms=None):
+    """
+    Scores every matching document at once, giving the same scores as calling
+    ``bm25_relevance`` per document.
+
+    ``terms`` should be a list of terms.
+
+    ``per_term_docs`` should be a dict of terms to the count of documents
+    containing them.
+
+    ``per_term_counts`` should be a dict of terms to a tuple of two aligned
+    sequences: the ordinals of the documents containing the term (ascending)
+    & the number of positions within each of them.
+
+    ``total_docs``, ``b`` & ``k`` are the same as for ``bm25_relevance``.
+
+    Optionally accepts a ``norms`` parameter, a ``LengthNorms`` whose value
+    for each document replaces ``k``, normalizing the scores by document
+    length. Default is ``None`` (no normalization).
+
+    The ``idf`` of each term is only computed once. Uses NumPy when it's
+    installed & falls back to plain Python otherwise.
+
+    Returns a tuple of the scored document ordinals (ascending) & their
+    scores.
+    """
+    if numpy is not None:
+        return _numpy_bm25_scores(terms, per_term_docs, per_term_counts, total_docs, b, k, norms)
+
+    return _python_bm25_scores(terms, per_term_docs, per_term_counts, total_docs, b, k, norms)
+
+
+def _scored_terms(terms, per_term_docs, per_term_counts, total_docs):
+    """
+    Yields ``(idf, ordinals, counts)`` for every term that matched anything.
+    """
+    for term in terms:
+        if not per_term_docs.get(term) or term not in per_term_counts:
+            # No document has the term, so it can't contribute.
+            continue
+
+        ordinals, counts = per_term_counts[term]
+        yield idf(per_term_docs[term], total_docs), ordinals, counts
+
+
+def _python_bm25_scores(terms, per_term_docs, per_term_counts, total_docs, b, k, norms):
+    scores = {}
+
+    for term_idf, ordinals, counts in _scored_terms(terms, per_term_docs, per_term_counts, total_docs):
+        if norms is None:
+            for ordinal, count in zip(ordinals, counts):
+                scores[ordinal] = scores.get(ordinal, b) + count * term_idf / (count + k)
+        else:
+            for ordinal, count in zip(ordinals, counts):
+                scores[ordinal] = scores.get(ordinal, b) + count * term_idf / (count + norms[ordinal])
+
+    ordinals = sorted(scores)
+    scale = 2 * len(terms)
+    return ordinals, [0.5 + scores[ordinal] / scale for ordinal in ordinals]
+
+
+def as_arrays(ordinals, counts):
+    """
+    Converts aligned ``ordinals`` & ``counts`` lists to the arrays
+    ``bm25_scores`` works on, so postings shared by many queries are only
+    converted once. Returns them as they are without NumPy.
+    """
+    if numpy is None:
+        return ordinals, counts
+
+    return numpy.asarray(ordinals, dtype=numpy.int64), numpy.asarray(counts, dtype=numpy.float64)
+
+
+def _numpy_bm25_scores(terms, per_term_docs, per_term_counts, total_docs, b, k, norms):
+    scored_terms = [
+        (term_idf, numpy.asarray(ordinals, dtype=numpy.int64), numpy.asarray(counts, dtype=numpy.float64))
+        for term_idf, ordinals, counts in _scored_terms(terms, per_term_docs, per_term_counts, total_docs)
+        if len(ordinals)
+    ]
+
+    if not scored_terms:
+        return numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.float64)
+
+    # Ordinals are dense, so the scores can live in an array indexed by the
+    # ordinal directly.
+    size = max(int(term_ordinals[-1]) for _, term_ordinals, _ in scored_terms) + 1
+    scores = numpy.full(size, float(b))
+    matched = numpy.zeros(size, dtype=bool)
+
+    # Terms are added one at a time, in the same order as ``bm25_relevance``,
+    # so the floating point results match exactly.
+    for term_idf, term_ordinals, counts in scored_terms:
+        term_k = k if norms is None else norms.take(term_ordinals)
+        scores[term_ordinals] += counts * term_idf / (counts + term_k)
+        matched[term_ordinals] = True
+
+    ordinals = numpy.flatnonzero(matched)
+    return ordinals, 0.5 + scores[ordinals] / (2 * len(terms))
+
+
+def add_boosts(ordinals, scores, boosts):
+    """
+    Adds ``boosts`` (a dict of ordinals to an extra score) to the aligned
+    ``ordinals`` & ``scores`` from ``bm25_scores``. Every boosted ordinal
+    has to be in ``ordinals``.
+
+    Returns the ``ordinals`` & the updated ``scores``.
+    """
+    if not boosts:
+        return ordinals, scores
+
+    boosted = sorted(boosts)
+
+    if numpy is not None and isinstance(scores, numpy.ndarray):
+        scores = scores.copy()
+        scores[numpy.searchsorted(ordinals, boosted)] += [boosts[ordinal] for ordinal in boosted]
+        return ordinals, scores
+
+    scores = list(scores)
+    cursor = 0
+
+    for ordinal in boosted:
+        cursor = bisect.bisect_left(ordinals, ordinal, cursor)
+        scores[cursor] += boosts[ordinal]
+
+    return ordinals, scores
+
+
+def top_k(ordinals, scores, count):
+    """
+    Picks the ``count`` best scored documents out of the aligned ``ordinals``
+    & ``scores`` from ``bm25_scores``, without sorting all of them.
+
+    Returns a list of ``(ordinal, score)`` tuples in descending ``score``
+    order. Ties go to the lowest ordinal (the earliest indexed document).
+    """
+    if count <= 0:
+        return []
+
+    if numpy is not None and isinstance(scores, numpy.ndarray):
+        if count < len(scores):
+            # Everything above the k-th best score is in, ties on the k-th
+            # best score are settled by ordinal.
+            kth = numpy.partition(scores, len(scores) - count)[len(scores) - count]
+            above = numpy.flatnonzero(scores > kth)
+            tied = numpy.flatnonzero(scores == kth)[:count - len(above)]
+            chosen = numpy.concatenate([above, tied])
+        else:
+            chosen = numpy.arange(len(scores))
+
+        order = chosen[numpy.lexsort((ordinals[chosen], -scores[chosen]))]
+        return [(int(ordinals[index]), float(scores[index])) for index in order]
+
+    # A bounded heap of ``count`` entries.
+    best = heapq.nlargest(count, zip(scores, [-ordinal for ordinal in ordinals]))
+    return [(-negated, score) for score, negated in best]
+
+
+def wand_top_k(terms, per_term_docs, per_term_counts, per_term_max_counts, total_docs, count, b=0, k=1.2,
+               norms=None):
+    """
+    Picks the ``count`` best scored documents using WAND dynamic pruning, so
+    documents that can't make it into the top ``count`` are skipped instead
+    of scored.
+
+    The arguments are the same as ``bm25_scores``, plus
+    ``per_term_max_counts``, a dict of terms to the highest number of
+    positions of the term in any document. Those give an upper bound on what
+    each term can add to a score (with ``norms``, using the smallest value a
+    document can get).
+
+    Returns a tuple of the list of ``(ordinal, score)`` tuples (same as
+    ``top_k``), the number of matching documents & whether that number is
+    exact. When documents were skipped it's only a lower bound.
+    """
+    scored = [term for term in terms if per_term_docs.get(term) and term in per_term_counts]
+
+    if count <= 0:
+        return [], max([per_term_docs[term] for term in scored], default=0), not scored
+
+    cursors = []
+
+    for term_number, term in enumerate(scored):
+        ordinals, counts = per_term_counts[term]
+        term_idf = idf(per_term_docs[term], total_docs)
+        max_count = per_term_max_counts.get(term) or max(counts)
+        # The contribution grows with the count when the idf is positive.
+        # Negative contributions can only lower a score, so they're capped
+        # at zero.
+        upper_bound = max(0.0, max_count * term_idf / (max_count + (k if norms is None else norms.minimum)))
+        # ``[ordinals, counts, index, idf, upper bound, term number]``
+        cursors.append([ordinals, counts, 0, term_idf, upper_bound, term_number])
+
+    heap = []
+    evaluated = 0
+    exact = True
+
+    while True:
+        live = [cursor for cursor in cursors if cursor[2] < len(cursor[0])]
+
+        if not live:
+            break
+
+        live.sort(key=lambda cursor: cursor[0][cursor[2]])
+        pivot = 0
+
+        if len(heap) >= count:
+            # Find the first document whose upper bound could beat the
+            # worst score kept so far. Float error gets a little slack.
+            threshold = heap[0][0] - 1e-9
+            bound = b
+            pivot = None
+
+            for number, cursor in enumerate(live):
+                bound += cursor[4]
+
+                if bound > threshold:
+                    pivot = number
+                    break
+
+            if pivot is None:
+                # Nothing left can make it in.
+                exact = False
+                break
+
+        pivot_doc = live[pivot][0][live[pivot][2]]
+
+        if live[0][0][live[0][2]] == pivot_doc:
+            # Score it, adding the terms in query order like
+            # ``bm25_scores`` does so the results are identical.
+            score = b
+
+            for cursor in sorted(live, key=lambda cursor: cursor[5]):
+                if cursor[0][cursor[2]] == pivot_doc:
+                    doc_count = cursor[1][cursor[2]]
+                    doc_k = k if norms is None else norms[pivot_doc]
+                    score = score + doc_count * cursor[3] / (doc_count + doc_k)
+                    cursor[2] += 1
+
+            evaluated += 1
+            entry = (score, -pivot_doc)
+
+            if len(heap) < count:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        else:
+            # Skip every cursor before the pivot ahead to the pivot document.
+            for cursor in live[:pivot]:
+                cursor[2] = bisect.bisect_left(cursor[0], pivot_doc, cursor[2])
+
+            exact = False
+
+    scale = 2 * len(terms)
+    best = sorted(heap, reverse=True)
+    total_hits = evaluated
+
+    if not exact:
+        total_hits = max([evaluated] + [per_term_docs[term] for term in scored])
+
+    return [(-negated, 0.5 + score / scale) for score, negated in best], total_hits, exact
@@ -0,0 +1,81 @@
+from collections.abc import Mapping
+
+
+class SearchResult(Mapping):
+    """
+    A search result that only loads the stored fields of its document when
+    they're first accessed, for ``search(lazy=True)``::
+
+        for result in engine.search('tps report', lazy=True)['results']:
+            print(result.id, result.score)
+
+            if result.score > 0.5:
+                print(result['text'])
+
+    Reads like the dict ``search`` returns otherwise: ``id`` & ``score``
+    are always there, iterating (or comparing) loads every field.
+    """
+
+    __slots__ = ('handler', 'id', 'score', 'fields', 'loaded', 'complete')
+
+    def __init__(self, handler, doc_id, score, fields=None) -> None:
+        """
+        Takes the ``handler`` (a ``DocumentHandler``) to load the document
+        through, its ``doc_id`` & its ``score``.
+
+        Optionally accepts a ``fields`` parameter, which limits the stored
+        fields to those listed. Default is ``None`` (all of them).
+        """
+        self.handler = handler
+        self.id = doc_id
+        self.score = score
+        self.fields = None if fields is None else list(fields)
+        # Fields loaded so far, ``complete`` once they all are.
+        self.loaded = {}
+        self.complete = False
+
+    def _load(self, fields=None):
+        if fields is None:
+            self.loaded = self.handler.load_document(self.id, self.fields)
+            self.complete = True
+        else:
+            self.loaded.update(self.handler.load_document(self.id, fields))
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+
+        if key == 'score':
+            return self.score
+
+        if self.fields is not None and key not in self.fields:
+            raise KeyError(key)
+
+        if key not in self.loaded and not self.complete:
+            self._load([key])
+
+        return self.loaded[key]
+
+    def __iter__(self):
+        if not self.complete:
+            self._load()
+
+        yield from self.loaded
+        yield 'id'
+        yield 'score'
+
+    def __len__(self):
+        if not self.complete:
+            self._load()
+
+        return len(self.loaded) + 2
+
+    def __repr__(self):
+        return '<SearchResult id={0!r} score={1!r}>'.format(self.id, self.score)
+
+    def to_dict(self):
+        """
+        Loads every field & returns the same dict a non-lazy ``search``
+        would.
+        """
+        return dict(self)
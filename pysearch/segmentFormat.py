@@ -0,0 +1,521 @@
+import os
+import struct
+
+# Every binary segment starts (& ends) with the magic bytes followed by the
+# format version, so they can be told apart from the legacy tab-separated
+# JSON segments.
+#
+# Version 1 stored the doc ids as strings, version 2 switched to the integer
+# ordinals from the ``DocIdTable`` & version 3 added the highest position
+# count of each term to its postings, for score upper bounds.
+MAGIC = b'PYSEG'
+FORMAT_VERSION = 3
+HEADER = MAGIC + bytes([FORMAT_VERSION])
+
+# Number of terms per dictionary block. Only the first term of each block is
+# kept in the block index, so lookups binary-search the block index & then
+# scan at most ``BLOCK_SIZE`` terms.
+BLOCK_SIZE = 64
+
+# ``(block index offsets start, block count, term count)`` + ``HEADER``.
+TRAILER = struct.Struct('<QQQ6s')
+OFFSET = struct.Struct('<Q')
+
+
+def encode_varint(value, out):
+    """
+    Appends ``value`` (a non-negative integer) to the ``out`` bytearray as an
+    unsigned LEB128 varint.
+    """
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+
+    out.append(value)
+
+
+def decode_varint(buf, pos):
+    """
+    Decodes an unsigned LEB128 varint from ``buf`` starting at ``pos``.
+
+    Returns a tuple of the value & the position just after it.
+    """
+    result = 0
+    shift = 0
+
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+
+        if byte < 0x80:
+            return result, pos
+
+        shift += 7
+
+
+def encode_postings(term_info):
+    """
+    Encodes a ``term_info`` dict (doc ordinal -> positions) into bytes.
+
+    Layout: the number of docs, the highest number of positions in any of
+    them, then per doc (sorted by ordinal) the delta-encoded ordinal, the
+    number of positions & the delta-encoded positions.
+    """
+    out = bytearray()
+    encode_varint(len(term_info), out)
+    encode_varint(max([len(positions) for positions in term_info.values()], default=0), out)
+    last_doc = 0
+
+    for doc_id in sorted(term_info):
+        encode_varint(doc_id - last_doc, out)
+        last_doc = doc_id
+
+        positions = sorted(term_info[doc_id])
+        encode_varint(len(positions), out)
+        last = 0
+
+        for position in positions:
+            encode_varint(position - last, out)
+            last = position
+
+    return bytes(out)
+
+
+def postings_header(buf):
+    """
+    Returns the number of docs & the highest number of positions in any of
+    them from encoded postings, without decoding the rest.
+    """
+    doc_count, pos = decode_varint(buf, 0)
+    max_count, _ = decode_varint(buf, pos)
+    return doc_count, max_count
+
+
+def decode_postings(buf, version=FORMAT_VERSION):
+    """
+    Decodes bytes made by ``encode_postings`` back into a ``term_info`` dict.
+
+    Optionally accepts a ``version`` parameter, to decode the postings of an
+    older (version 2) segment.
+    """
+    term_info = {}
+    doc_count, pos = decode_varint(buf, 0)
+
+    if version >= 3:
+        # Skip the highest position count.
+        _, pos = decode_varint(buf, pos)
+
+    doc_id = 0
+
+    for _ in range(doc_count):
+        delta, pos = decode_varint(buf, pos)
+        doc_id += delta
+
+        position_count, pos = decode_varint(buf, pos)
+        positions = []
+        last = 0
+
+        for _ in range(position_count):
+            delta, pos = decode_varint(buf, pos)
+            last += delta
+            positions.append(last)
+
+        term_info[doc_id] = positions
+
+    return term_info
+
+
+def decode_counts(buf):
+    """
+    Decodes only the doc ordinals & their number of positions from bytes
+    made by ``encode_postings``, which is all scoring needs.
+
+    Returns a tuple of two aligned lists: the ordinals (in ascending order)
+    & the position counts.
+    """
+    # Indexing bytes beats indexing a view of a mapping.
+    buf = bytes(buf)
+    doc_count, pos = decode_varint(buf, 0)
+    _, pos = decode_varint(buf, pos)
+    ordinals = []
+    counts = []
+    doc_id = 0
+
+    for _ in range(doc_count):
+        # Most deltas & counts fit in a single byte.
+        delta = buf[pos]
+
+        if delta < 0x80:
+            pos += 1
+        else:
+            delta, pos = decode_varint(buf, pos)
+
+        count = buf[pos]
+
+        if count < 0x80:
+            pos += 1
+        else:
+            count, pos = decode_varint(buf, pos)
+
+        doc_id += delta
+        ordinals.append(doc_id)
+        counts.append(count)
+        end = pos + count
+
+        # So do position deltas, in which case the next ``count`` bytes are
+        # exactly the positions.
+        if count == 1 and buf[pos] < 0x80 or not count or max(buf[pos:end]) < 0x80:
+            pos = end
+            continue
+
+        for _ in range(count):
+            while buf[pos] >= 0x80:
+                pos += 1
+
+            pos += 1
+
+    return ordinals, counts
+
+
+def decode_positions(buf, ordinals):
+    """
+    Decodes the positions of only the docs with ``ordinals`` (ascending)
+    from bytes made by ``encode_postings``, skipping over the others like
+    ``decode_counts`` does.
+
+    Returns a dict of the ordinals found to their positions.
+    """
+    buf = bytes(buf)
+    doc_count, pos = decode_varint(buf, 0)
+    _, pos = decode_varint(buf, pos)
+    wanted = iter(ordinals)
+    next_wanted = next(wanted, None)
+    found = {}
+    doc_id = 0
+
+    for _ in range(doc_count):
+        if next_wanted is None:
+            break
+
+        delta, pos = decode_varint(buf, pos)
+        count, pos = decode_varint(buf, pos)
+        doc_id += delta
+
+        while next_wanted is not None and next_wanted < doc_id:
+            next_wanted = next(wanted, None)
+
+        if doc_id == next_wanted:
+            positions = []
+            last = 0
+
+            for _ in range(count):
+                delta, pos = decode_varint(buf, pos)
+                last += delta
+                positions.append(last)
+
+            found[doc_id] = positions
+            continue
+
+        end = pos + count
+
+        if not count or max(buf[pos:end]) < 0x80:
+            pos = end
+            continue
+
+        for _ in range(count):
+            while buf[pos] >= 0x80:
+                pos += 1
+
+            pos += 1
+
+    return found
+
+
+def decode_string_postings(buf):
+    """
+    Decodes the postings of a version 1 segment, where the doc ids were
+    stored as length-prefixed UTF-8 strings.
+
+    Only needed to convert old segments.
+    """
+    term_info = {}
+    doc_count, pos = decode_varint(buf, 0)
+
+    for _ in range(doc_count):
+        id_length, pos = decode_varint(buf, pos)
+        doc_id = bytes(buf[pos:pos + id_length]).decode('utf-8')
+        pos += id_length
+
+        position_count, pos = decode_varint(buf, pos)
+        positions = []
+        last = 0
+
+        for _ in range(position_count):
+            delta, pos = decode_varint(buf, pos)
+            last += delta
+            positions.append(last)
+
+        term_info[doc_id] = positions
+
+    return term_info
+
+
+def _shared_prefix(left, right):
+    """
+    Returns the length of the common prefix of two byte strings.
+    """
+    limit = min(len(left), len(right))
+    size = 0
+
+    while size < limit and left[size] == right[size]:
+        size += 1
+
+    return size
+
+
+def write_segment(seg_file, records):
+    """
+    Writes a binary segment to the (binary mode) ``seg_file``.
+
+    ``records`` must be an iterable of ``(term, postings)`` tuples in
+    ascending term order, where ``postings`` are bytes from
+    ``encode_postings``.
+
+    Layout::
+
+        HEADER
+        postings of every term, back to back
+        dictionary blocks (front-coded terms, postings offset & length)
+        block index (first term, offset & length of each block)
+        fixed-width offsets of the block index entries
+        TRAILER
+
+    Returns the number of terms written.
+    """
+    seg_file.write(HEADER)
+    offset = len(HEADER)
+    entries = []
+    last_term = None
+
+    for term, postings in records:
+        raw_term = term.encode('utf-8')
+
+        if last_term is not None and raw_term <= last_term:
+            raise ValueError('Segment records must be unique & sorted, got {0!r} after {1!r}.'.format(
+                term, last_term.decode('utf-8')))
+
+        seg_file.write(postings)
+        entries.append((raw_term, offset, len(postings)))
+        offset += len(postings)
+        last_term = raw_term
+
+    blocks = []
+
+    for start in range(0, len(entries), BLOCK_SIZE):
+        block = bytearray()
+        previous = b''
+
+        for raw_term, postings_offset, postings_length in entries[start:start + BLOCK_SIZE]:
+            shared = _shared_prefix(previous, raw_term)
+            encode_varint(shared, block)
+            encode_varint(len(raw_term) - shared, block)
+            block += raw_term[shared:]
+            encode_varint(postings_offset, block)
+            encode_varint(postings_length, block)
+            previous = raw_term
+
+        seg_file.write(block)
+        blocks.append((entries[start][0], offset, len(block)))
+        offset += len(block)
+
+    index_offsets = []
+
+    for first_term, block_offset, block_length in blocks:
+        entry = bytearray()
+        encode_varint(len(first_term), entry)
+        entry += first_term
+        encode_varint(block_offset, entry)
+        encode_varint(block_length, entry)
+        seg_file.write(entry)
+        index_offsets.append(offset)
+        offset += len(entry)
+
+    for index_offset in index_offsets:
+        seg_file.write(OFFSET.pack(index_offset))
+
+    seg_file.write(TRAILER.pack(offset, len(blocks), len(entries), HEADER))
+    return len(entries)
+
+
+def segment_version(seg_name):
+    """
+    Returns the binary format version of the segment at ``seg_name``, or
+    ``None`` for a legacy tab-separated JSON segment.
+    """
+    with open(seg_name, 'rb') as seg_file:
+        header = seg_file.read(len(HEADER))
+
+    if len(header) == len(HEADER) and header.startswith(MAGIC):
+        return header[-1]
+
+    return None
+
+
+def is_binary_segment(seg_name):
+    """
+    Checks whether the file at ``seg_name`` is a binary segment in the
+    current format version.
+    """
+    return segment_version(seg_name) == FORMAT_VERSION
+
+
+class SegmentFile(object):
+    """
+    Reads terms out of a binary segment.
+
+    Takes a ``read`` callable, which accepts an ``offset`` & a ``length`` &
+    returns that slice of the segment as a bytes-like object, plus the total
+    ``size`` of the segment. This keeps the lookups independent of how the
+    bytes are fetched.
+    """
+
+    def __init__(self, read, size) -> None:
+        self.read = read
+
+        if size < len(HEADER) + TRAILER.size:
+            raise ValueError('Not a binary segment (too short).')
+
+        self.offsets_start, self.block_count, self.term_count, magic = TRAILER.unpack(
+            bytes(read(size - TRAILER.size, TRAILER.size)))
+
+        if not magic.startswith(MAGIC):
+            raise ValueError('Not a binary segment (bad trailer).')
+
+        self.version = magic[-1]
+
+    @classmethod
+    def from_file(cls, seg_file):
+        """
+        Builds a ``SegmentFile`` reading through the open (binary mode)
+        ``seg_file`` with seeks.
+        """
+        def read(offset, length):
+            seg_file.seek(offset)
+            return seg_file.read(length)
+
+        return cls(read, os.fstat(seg_file.fileno()).st_size)
+
+    def _block_entry(self, number):
+        """
+        Returns the ``(first term, offset, length)`` of block ``number``.
+        """
+        index_offset, = OFFSET.unpack(bytes(self.read(self.offsets_start + number * OFFSET.size, OFFSET.size)))
+        # An entry is at most a few varints plus the term, so read generously
+        # & decode from there.
+        buf = self.read(index_offset, 64)
+        term_length, pos = decode_varint(buf, 0)
+
+        if pos + term_length + 20 > len(buf):
+            buf = self.read(index_offset, pos + term_length + 20)
+
+        first_term = bytes(buf[pos:pos + term_length])
+        pos += term_length
+        block_offset, pos = decode_varint(buf, pos)
+        block_length, pos = decode_varint(buf, pos)
+        return first_term, block_offset, block_length
+
+    def _iter_block(self, block_offset, block_length):
+        """
+        Yields ``(raw term, postings offset, postings length)`` for every term
+        in a dictionary block.
+        """
+        buf = self.read(block_offset, block_length)
+        pos = 0
+        previous = b''
+
+        while pos < block_length:
+            shared, pos = decode_varint(buf, pos)
+            suffix_length, pos = decode_varint(buf, pos)
+            raw_term = previous[:shared] + bytes(buf[pos:pos + suffix_length])
+            pos += suffix_length
+            postings_offset, pos = decode_varint(buf, pos)
+            postings_length, pos = decode_varint(buf, pos)
+            yield raw_term, postings_offset, postings_length
+            previous = raw_term
+
+    def _find_block(self, raw_term):
+        """
+        Binary-searches the block index for the last block whose first term
+        is <= ``raw_term``. Returns its number, or ``-1`` if there's none.
+        """
+        low, high = 0, self.block_count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self._block_entry(middle)[0] <= raw_term:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low - 1
+
+    def find_postings(self, term):
+        """
+        Binary-searches the block index for ``term`` & returns its encoded
+        postings (a bytes-like object), or ``None`` if it isn't there.
+        """
+        raw_term = term.encode('utf-8')
+        number = self._find_block(raw_term)
+
+        if number < 0:
+            return None
+
+        _, block_offset, block_length = self._block_entry(number)
+
+        for seg_term, postings_offset, postings_length in self._iter_block(block_offset, block_length):
+            if seg_term == raw_term:
+                return self.read(postings_offset, postings_length)
+
+            if seg_term > raw_term:
+                break
+
+        return None
+
+    def find(self, term):
+        """
+        Returns the decoded ``term_info`` dict for ``term``, or ``None``.
+        """
+        postings = self.find_postings(term)
+
+        if postings is None:
+            return None
+
+        return decode_postings(postings)
+
+    def iter_terms(self, start=''):
+        """
+        Yields every term in the segment from ``start`` on (the first one
+        that's >= ``start``), in term order, seeking to it through the block
+        index instead of scanning from the beginning.
+        """
+        raw_start = start.encode('utf-8')
+
+        for number in range(max(0, self._find_block(raw_start)), self.block_count):
+            _, block_offset, block_length = self._block_entry(number)
+
+            for raw_term, _, _ in self._iter_block(block_offset, block_length):
+                if raw_term >= raw_start:
+                    yield raw_term.decode('utf-8')
+
+    def iter_records(self):
+        """
+        Yields every ``(term, postings)`` in the segment, in term order, with
+        the postings still encoded.
+        """
+        for number in range(self.block_count):
+            _, block_offset, block_length = self._block_entry(number)
+
+            for raw_term, postings_offset, postings_length in self._iter_block(block_offset, block_length):
+                yield raw_term.decode('utf-8'), bytes(self.read(postings_offset, postings_length))
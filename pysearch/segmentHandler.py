@@ -1,10 +1,19 @@
+import contextlib
 import os
 import json
-import tempfile
 import shutil
+import tempfile
+import threading
 
-
+from . import bucketing
+from . import caching
+from . import forwardIndex
+from . import lsmIndex
 from . import pathsSetUp
+from . import segmentFormat
+from . import segmentReader
+from . import snapshots
+from . import termDictionary
 from . import tokenization
 
 
@@ -50,99 +59,1051 @@ def _update_term_info(orig_info, new_info):
     return orig_info
 
 
+def _counts(postings):
+    """
+    Turns what ``load_postings`` returns into what ``load_counts`` returns.
+    """
+    if postings is None:
+        return None
+
+    term_info, max_count = postings
+    return list(term_info), [len(positions) for positions in term_info.values()], max_count
+
+
 class SegmentHandler(pathsSetUp.PathSetUp):
 
+    # The number of terms a query pattern expands into at most, see
+    # ``expand_word``.
+    max_expansions = 50
+
     def __init__(self, base_directory) -> None:
         super().__init__(base_directory)
+        # Held by every write, so writes from different threads take turns.
+        # Reentrant, since writes are made of other writes.
+        self.write_lock = threading.RLock()
+        # Binary segments are read through the process-wide, memory-mapped
+        # reader.
+        self.segment_reader = segmentReader.shared_reader()
+        # The terms of every document, see ``replace_postings``.
+        self.forward = forwardIndex.ForwardIndex(self.forward_path)
+        # Decoded postings of hot terms, see ``load_postings``.
+        self.postings_cache = caching.PostingsCache()
+        # Set when the index uses the log-structured layout, see ``use_lsm``.
+        self.lsm = None
+
+        if os.path.exists(os.path.join(self.lsm_path, 'manifest.json')):
+            self.lsm = lsmIndex.LSMIndex(self.lsm_path, self.segment_reader)
+
+        # Set when whole tokens are the terms, see ``use_token_terms``.
+        self.term_dictionary = None
+
+        if os.path.exists(os.path.join(self.terms_path, 'dictionary.json')):
+            self.term_dictionary = termDictionary.TermDictionary(self.terms_path, self.segment_reader)
+
+        # Which segment each term goes to, see ``use_bucketing``.
+        self.bucketing = self._load_bucketing()
+        # Set when commits publish snapshots, see ``use_snapshots``.
+        self.snapshots = None
+
+        if os.path.exists(os.path.join(self.snapshots_path, snapshots.MANIFEST_NAME)):
+            self.snapshots = self._open_snapshots()
+
+    def _has_buckets(self):
+        with os.scandir(self.index_path) as entries:
+            return any(entry.name.endswith('.index') for entry in entries)
+
+    def _load_bucketing(self):
+        """
+        Returns the bucketing strategy recorded in ``stats.json``. Indexes
+        without one are recorded as using ``bucketing.MD5Buckets`` when they
+        already have segments (they were built before it was recorded) &
+        the default strategy otherwise.
+        """
+        if self.stats.bucketing is None:
+            self.stats.refresh()
+
+        if self.stats.bucketing is None:
+            strategy = bucketing.MD5Buckets() if self._has_buckets() else bucketing.make_strategy()
+            # Written right away, so every process agrees from the start.
+            self.stats.update({'bucketing': strategy.config()})
+            return strategy
+
+        return bucketing.from_config(self.stats.bucketing)
+
+    def use_bucketing(self, strategy=bucketing.DEFAULT_STRATEGY, buckets=None):
+        """
+        Switches the index to the bucketing ``strategy`` (see
+        ``bucketing.STRATEGIES``) with ``buckets`` buckets (``None`` for its
+        default), which is recorded in ``stats.json``.
+
+        Only possible while the index has no (bucketed) segments yet, use
+        ``rebucket`` for the ones that do.
+        """
+        new_strategy = bucketing.make_strategy(strategy, buckets)
+
+        if new_strategy.config() != self.bucketing.config():
+            if self._has_buckets():
+                raise ValueError('The index at {0!r} already has segments in {1!r} buckets, rebucket it.'.format(
+                    self.index_path, self.bucketing.config()))
+
+            self.stats.update({'bucketing': new_strategy.config()})
+            self.bucketing = new_strategy
+
+        return self.bucketing
+
+    def use_lsm(self, **options):
+        """
+        Switches the index to the log-structured layout (see ``LSMIndex``),
+        where every flush appends a new segment instead of rewriting the
+        segments its terms hash to.
+
+        Only possible while the index has no (bucketed) segments yet. The
+        layout is kept on disk, so later instances pick it up by themselves.
+
+        Accepts the same ``merge_factor`` & ``min_segment_bytes`` options as
+        ``LSMIndex``.
+        """
+        if self.lsm is None:
+            if self._has_buckets() or self.snapshots is not None:
+                raise ValueError('The index at {0!r} already has bucketed segments.'.format(self.index_path))
+
+            self.lsm = lsmIndex.LSMIndex(self.lsm_path, self.segment_reader)
+
+            if self.lsm.identity is None:
+                # Write the (empty) manifest, which marks the layout.
+                self.lsm._commit()
+
+        for name, value in options.items():
+            setattr(self.lsm, name, value)
+
+        return self.lsm
+
+    def use_token_terms(self, **options):
+        """
+        Switches the index to index every whole token as a term, instead of
+        its n-grams, & to keep every term in a ``TermDictionary`` so queries
+        can expand ``word*`` (prefix) & ``word~`` (fuzzy) patterns into the
+        terms they match (see ``expand_word``).
+
+        Only possible while the index has no documents yet. The mode is kept
+        on disk, so later instances pick it up by themselves.
+
+        Accepts the same ``merge_factor`` option as ``TermDictionary``.
+        """
+        if self.term_dictionary is None:
+            if len(self.doc_ids) or self.stats.total_docs:
+                raise ValueError('The index at {0!r} already has n-gram terms.'.format(self.index_path))
+
+            self.term_dictionary = termDictionary.TermDictionary(self.terms_path, self.segment_reader)
+
+            if self.term_dictionary.identity is None:
+                # Write the (empty) manifest, which marks the mode.
+                self.term_dictionary._commit()
+
+        for name, value in options.items():
+            setattr(self.term_dictionary, name, value)
+
+        return self.term_dictionary
+
+    def use_snapshots(self, **options):
+        """
+        Makes every commit publish a snapshot of the bucketed segments & the
+        document counts (see ``SnapshotManager``), which searches pin, so
+        they're isolated from the writes going on meanwhile. Segment files
+        are then never rewritten in place.
+
+        Not needed with the log-structured layout, whose segments are
+        published through its own manifest. The mode is kept on disk, so
+        later instances pick it up by themselves.
+
+        Accepts the same ``grace`` option as ``SnapshotManager``.
+        """
+        if self.lsm is not None:
+            raise ValueError('The index at {0!r} uses the lsm layout, which has no buckets.'.format(
+                self.index_path))
+
+        if self.snapshots is None:
+            seg_names = self._bucket_files()
+            self.snapshots = self._open_snapshots()
+
+            if self.snapshots.identity is None:
+                # The segments written so far make up the first snapshot,
+                # which marks the mode.
+                for seg_name in seg_names:
+                    self.snapshots.add(seg_name, seg_name)
+
+                self.publish_snapshot()
+
+        for name, value in options.items():
+            setattr(self.snapshots, name, value)
+
+        return self.snapshots
+
+    def _open_snapshots(self):
+        manager = snapshots.SnapshotManager(self.snapshots_path, self.index_path)
+
+        if hasattr(self, 'delete_document'):
+            manager.delete_document = self._delete_retired_document
+
+        return manager
+
+    def _delete_retired_document(self, doc_id):
+        """
+        Deletes the stored document of a document deleted while snapshots
+        were pinned, unless it was indexed again since.
+        """
+        ordinal = self.doc_ids.ordinal(doc_id)
+        self.forward.refresh()
+
+        if ordinal is not None and ordinal in self.forward:
+            return False
+
+        return self.delete_document(doc_id)
+
+    def publish_snapshot(self):
+        """
+        With snapshots on, publishes the segments written since the last
+        commit along with the current stats. Does nothing otherwise.
+        """
+        if self.snapshots is not None:
+            self.snapshots.publish(self.stats.total_docs, self.stats.total_length)
+
+    def commit(self):
+        """
+        Commits what was written to the segments & the stats: bumps the
+        ``generation`` (see ``IndexStats.commit``) & publishes a snapshot.
+        """
+        self.stats.commit()
+        self.publish_snapshot()
+
+    def segment_file(self, seg_name, latest=False):
+        """
+        Returns the path of the file holding the segment at ``seg_name``:
+        itself, or with snapshots on, its version in the snapshot pinned by
+        this thread (or the latest one, see ``SnapshotManager.resolve``).
+
+        Optionally accepts a ``latest`` parameter, which is a boolean &
+        ignores the pinned snapshot, for writes. Default is ``False``.
+        """
+        if self.snapshots is None:
+            return seg_name
+
+        return self.snapshots.resolve(seg_name, latest)
+
+    def snapshot(self, pinned=None):
+        """
+        Returns a context manager pinning the latest snapshot on this thread
+        (see ``SnapshotManager.pin``), which it yields, so every read in the
+        block sees the index as of that commit. Yields ``None`` without
+        snapshots.
+
+        Optionally accepts a ``pinned`` parameter, which is a snapshot (e.g.
+        pinned by another thread) to pin instead. Default is ``None``.
+        """
+        if self.snapshots is None:
+            return contextlib.nullcontext()
+
+        return self.snapshots.pin(pinned)
+
+    def pinned_snapshot(self):
+        """
+        Returns the snapshot pinned by this thread, or ``None``.
+        """
+        return None if self.snapshots is None else self.snapshots.pinned()
+
+    @property
+    def gram_range(self):
+        """
+        The ``(min_gram, max_gram)`` the terms of a token are made of: its
+        n-grams, or the whole token (``(1, None)``) with ``use_token_terms``.
+        """
+        return (3, 6) if self.term_dictionary is None else (1, None)
+
+    def analyze(self, text):
+        """
+        Analyzes the ``text`` of a document into the terms this index uses.
+
+        Returns a tuple of the dict of terms to positions & the number of
+        tokens (see ``tokenization.make_terms``).
+        """
+        if self.term_dictionary is None:
+            return tokenization.make_terms(text)
+
+        return tokenization.make_token_terms(text)
+
+    def expand_word(self, word):
+        """
+        Expands a ``word`` of a query into the list of terms it matches, when
+        it's a pattern of an index using whole tokens as terms:
+
+        * ``word*`` matches the terms starting with ``word``.
+        * ``word~`` matches the terms within two edits (insertions, deletions
+          or substitutions) of ``word``, closest first, & ``word~1`` within
+          one.
+
+        At most ``max_expansions`` terms are returned, the first ones in term
+        order for a prefix.
+
+        Returns ``None`` when the ``word`` isn't a pattern.
+        """
+        if self.term_dictionary is None:
+            return None
+
+        pattern = termDictionary.parse_pattern(word)
+
+        if pattern is None:
+            return None
+
+        kind, text, max_edits = pattern
+        self.term_dictionary.refresh()
+
+        if kind == 'prefix':
+            return self.term_dictionary.prefix(text, limit=self.max_expansions)
+
+        return self.term_dictionary.fuzzy(text, max_edits, limit=self.max_expansions)
 
     def set_name_seg(self, term):
         """
-        creates a segment filename based on the hash of the term.
+        creates a segment filename based on the bucket of the term (see
+        ``use_bucketing``).
 
         Returns the full path to the segment.
         """
-        return os.path.join(self.index_path, f"{tokenization.hash_name(term)}.index")
+        return os.path.join(self.index_path, self.bucketing.file_name(self.bucketing.bucket(term)))
 
 
     def save_segment(self, term, term_info, update=False):
         """
         Writes out new index data to disk.
 
-        Takes a ``term`` string & ``term_info`` dict. It will
-        rewrite the segment in alphabetical order, adding in the data
-        where appropriate.
+        Takes a ``term`` string & ``term_info`` dict, which maps doc ordinals
+        (see ``DocIdTable``) to positions. It will rewrite the segment in
+        alphabetical order, adding in the data where appropriate.
 
         Optionally takes an ``update`` parameter, which is a boolean &
         determines whether the provided ``term_info`` should overwrite or
         update the data in the segment. Default is ``False`` (overwrite).
+
+        With the log-structured layout, the postings go to a new segment &
+        replace every older posting of their documents (see
+        ``save_segments``).
         """
-        seg_name = self.set_name_seg(term)
-        new_seg_file = tempfile.NamedTemporaryFile(delete=False)
-        written = False
-        
-        if not os.path.exists(seg_name):
-            # If it doesn't exist, touch it.
-            with open(seg_name, 'w') as seg_file:
-                seg_file.write('')
+        if self.lsm is not None:
+            return self.save_segments({term: term_info}, update=update)
 
-        with open(seg_name, 'r') as seg_file:
-            for line in seg_file:
-                seg_term, seg_term_info = _parse_record(line)
+        return self._rewrite_segment(self.set_name_seg(term), {term: term_info}, update=update)
+
+    def save_segments(self, terms, update=True, ordinals=None):
+        """
+        Writes out new index data for many terms at once.
+
+        Takes a ``terms`` dict, mapping each term to its ``term_info`` dict.
+        The terms are grouped by the segment they hash to, so every touched
+        segment is rewritten exactly once no matter how many of its terms
+        changed.
+
+        Optionally takes an ``update`` parameter (see ``save_segment``).
+        Default is ``True`` (update), since batches usually hold postings for
+        documents that are not in the segment yet.
+
+        With the log-structured layout, all the terms go to a single new
+        segment instead & their postings must be complete: they replace any
+        older version of their documents. Optionally takes an ``ordinals``
+        parameter, listing those documents (including ones without any
+        terms). Default is ``None`` (every document in ``terms``).
+
+        Returns the number of segments (re)written.
+        """
+        if self.lsm is not None:
+            if ordinals is None:
+                ordinals = set()
+
+                for term_info in terms.values():
+                    ordinals.update(term_info)
+
+            # The ordinals have to be on disk before any posting refers to
+            # them.
+            self.doc_ids.flush()
+            self.lsm.add_segment(terms, ordinals)
+            return 1
+
+        per_segment = {}
+
+        for term, term_info in terms.items():
+            per_segment.setdefault(self.set_name_seg(term), {})[term] = term_info
+
+        for seg_name, seg_terms in per_segment.items():
+            self._rewrite_segment(seg_name, seg_terms, update=update)
+
+        return len(per_segment)
+
+    def _rewrite_segment(self, seg_name, terms, update=False):
+        """
+        Merges the ``terms`` dict (term -> ``term_info``) into the segment at
+        ``seg_name`` in a single pass, keeping the records in alphabetical
+        order, then atomically moves the new file into place.
+
+        Records that aren't touched are copied over without being decoded.
+        Segments in older formats are upgraded as a side effect.
+        """
+        records = ((term, segmentFormat.encode_postings(terms[term])) for term in sorted(terms))
+        self.merge_records(seg_name, records, update=update)
+        self.doc_ids.flush()
+        return True
+
+    def merge_records(self, seg_name, records, update=True, removed=None):
+        """
+        Merges already encoded ``(term, postings)`` ``records``, in ascending
+        term order (e.g. read from another segment), into the segment at
+        ``seg_name`` in a single pass.
+
+        Optionally takes an ``update`` parameter (see ``save_segment``).
+        Default is ``True`` (update).
+
+        Optionally takes a ``removed`` parameter, a dict of terms to the
+        ordinals whose existing postings for the term are dropped before
+        merging. Records left without any postings are dropped entirely.
+        Default is ``None`` (nothing removed).
+        """
+        removed = removed or {}
 
-                if not written and seg_term > term:
+        def merged_records():
+            new_records = iter(records)
+            pending = next(new_records, None)
+
+            for seg_term, postings in self._iter_segment(seg_name, latest=True):
+                while pending is not None and pending[0] < seg_term:
                     # We're at the alphabetical location & need to insert.
-                    new_line = _make_record(term, term_info)
-                    new_seg_file.write(new_line.encode('utf-8'))
-                    written = True
-                elif seg_term == term:
-                    if not update:
-                        # Overwrite the line for the update.
-                        line = _make_record(term, term_info)
+                    yield pending
+                    pending = next(new_records, None)
+
+                if seg_term in removed:
+                    term_info = segmentFormat.decode_postings(postings)
+
+                    for ordinal in removed[seg_term]:
+                        term_info.pop(ordinal, None)
+
+                    postings = segmentFormat.encode_postings(term_info) if term_info else None
+
+                if pending is not None and pending[0] == seg_term:
+                    if not update or postings is None:
+                        # Overwrite the record for the update.
+                        postings = pending[1]
                     else:
                         # Update the existing record.
                         new_info = _update_term_info(
-                            json.loads(seg_term_info), term_info)
-                        line = _make_record(term, new_info)
+                            segmentFormat.decode_postings(postings), segmentFormat.decode_postings(pending[1]))
+                        postings = segmentFormat.encode_postings(new_info)
 
-                    written = True
+                    pending = next(new_records, None)
 
                 # Either we haven't reached it alphabetically or we're well-past.
-                # Write the line.
-                new_seg_file.write(line.encode('utf-8'))
+                # Write the record, unless nothing is left of it.
+                if postings is not None:
+                    yield seg_term, postings
+
+            while pending is not None:
+                yield pending
+                pending = next(new_records, None)
+
+        self._write_segment_file(seg_name, merged_records())
+
+    def replace_postings(self, terms, ordinals, old_terms):
+        """
+        Writes the complete postings of the (new or re-indexed) documents with
+        ``ordinals``, replacing every older posting of theirs.
+
+        Takes a ``terms`` dict, mapping each term to its ``term_info`` dict,
+        & an ``old_terms`` dict, mapping the ordinals of re-indexed documents
+        to the terms their older version had (see ``ForwardIndex``), so only
+        the segments of those terms get touched.
+
+        Returns the number of segments (re)written.
+        """
+        if self.term_dictionary is not None:
+            self.term_dictionary.add(terms)
+
+        if self.lsm is not None:
+            # Newer segments hide the older postings by themselves.
+            return self.save_segments(terms, ordinals=ordinals)
+
+        return self._rewrite_segments(terms, self._removed_terms(old_terms))
+
+    def delete_postings(self, old_terms):
+        """
+        Drops every posting of the documents in ``old_terms``, a dict mapping
+        their ordinals to their terms (see ``ForwardIndex``).
+
+        With the log-structured layout the documents are tombstoned instead.
+
+        Returns the number of segments (re)written.
+        """
+        if self.lsm is not None:
+            self.lsm.delete(old_terms)
+            self.postings_cache.invalidate_segment(self.lsm_path)
+            return 0
+
+        return self._rewrite_segments({}, self._removed_terms(old_terms))
+
+    @staticmethod
+    def _removed_terms(old_terms):
+        """
+        Turns a dict of ordinals to their terms into one of terms to the set
+        of ordinals having them.
+        """
+        removed = {}
+
+        for ordinal, doc_terms in old_terms.items():
+            for term in doc_terms:
+                removed.setdefault(term, set()).add(ordinal)
+
+        return removed
+
+    def _rewrite_segments(self, terms, removed):
+        """
+        Rewrites every segment touched by the ``terms`` dict (term ->
+        ``term_info``) or the ``removed`` dict (term -> ordinals) once.
+        """
+        per_segment = {}
+
+        for term in set(terms) | set(removed):
+            per_segment.setdefault(self.set_name_seg(term), []).append(term)
+
+        for seg_name, seg_terms in per_segment.items():
+            records = ((term, segmentFormat.encode_postings(terms[term]))
+                       for term in sorted(seg_terms) if term in terms)
+            seg_removed = {term: removed[term] for term in seg_terms if term in removed}
+            self.merge_records(seg_name, records, removed=seg_removed)
+
+        self.doc_ids.flush()
+        return len(per_segment)
+
+    def _write_segment_file(self, seg_name, records):
+        """
+        Writes the sorted ``(term, postings)`` ``records`` to a temporary file
+        & atomically moves it into place at ``seg_name``.
+        """
+        # The temporary file lives in ``temp_path``, on the same file system
+        # as the index, so moving it into place is a plain (atomic) rename.
+        new_seg_file = tempfile.NamedTemporaryFile(dir=self.temp_path, suffix='.index', delete=False)
+
+        try:
+            segmentFormat.write_segment(new_seg_file, records)
+        finally:
+            new_seg_file.close()
 
-            if not written:
-                line = _make_record(term, term_info)
-                new_seg_file.write(line.encode('utf-8'))
+        # With snapshots, the published version is left alone.
+        target = seg_name if self.snapshots is None else self.snapshots.new_version(seg_name)
 
-        # Atomically move it into place.
-        new_seg_file.close()
         try:
-            shutil.move(new_seg_file.name, seg_name)
+            os.replace(new_seg_file.name, target)
         except OSError:
-            os.remove(seg_name)
-            shutil.move(new_seg_file.name, seg_name)
-        return True
+            os.remove(new_seg_file.name)
+            raise
 
-    
-    def load_segment(self, term:str):
+        if self.snapshots is not None:
+            self.snapshots.add(seg_name, target)
+
+        # Don't wait for the next lookup to notice the file changed.
+        self.segment_reader.invalidate(target)
+        self.postings_cache.invalidate_segment(seg_name)
+
+    def _iter_segment(self, seg_name, latest=False):
         """
-        Return term information associated with the term
+        Yields every ``(term, postings)`` record of the segment at
+        ``seg_name`` in alphabetical order, with the postings encoded in the
+        current binary format.
+
+        Handles both binary & legacy (text) segments. Doc ids found in older
+        segments are assigned ordinals on the way. Missing segments have no
+        records.
+
+        Optionally accepts a ``latest`` parameter (see ``segment_file``).
+        Default is ``False``.
         """
-        seg_name = self.set_name_seg(term)
+        seg_name = self.segment_file(seg_name, latest)
 
         if not os.path.exists(seg_name):
-            return 'segment not exist'
+            return
+
+        version = segmentFormat.segment_version(seg_name)
+
+        if version is not None:
+            with open(seg_name, 'rb') as seg_file:
+                segment = segmentFormat.SegmentFile.from_file(seg_file)
+
+                for seg_term, postings in segment.iter_records():
+                    if version == 1:
+                        postings = segmentFormat.encode_postings(self._assign_ordinals(
+                            segmentFormat.decode_string_postings(postings)))
+                    elif version != segmentFormat.FORMAT_VERSION:
+                        postings = segmentFormat.encode_postings(
+                            segmentFormat.decode_postings(postings, version))
+
+                    yield seg_term, postings
+            return
+
+        records = []
 
         with open(seg_name, 'r') as seg_file:
             for line in seg_file:
+                if not line.strip():
+                    continue
+
                 seg_term, term_info = _parse_record(line)
+                records.append((seg_term, json.loads(term_info)))
+
+        records.sort()
+
+        for seg_term, term_info in records:
+            yield seg_term, segmentFormat.encode_postings(self._assign_ordinals(term_info))
+
+    def _assign_ordinals(self, term_info):
+        """
+        Converts a ``term_info`` dict keyed by (string) doc ids, as stored in
+        older segments, into one keyed by doc ordinals.
+        """
+        return {self.doc_ids.assign(doc_id): positions for doc_id, positions in term_info.items()}
+
+    def load_segment(self, term:str):
+        """
+        Return term information associated with the term
+        """
+        if self.lsm is not None:
+            self.lsm.refresh()
+
+            if not len(self.lsm):
+                return 'segment not exist'
+
+            postings = self.lsm.find(term)
+            return 'Not Found' if postings is None else postings[0]
+
+        seg_name = self.set_name_seg(term)
+
+        if not os.path.exists(self.segment_file(seg_name)):
+            return 'segment not exist'
+
+        postings = self._read_postings(seg_name, term)
+
+        if postings is None:
+            return 'Not Found'
+
+        return postings[0]
+
+    def load_postings(self, term):
+        """
+        Returns a tuple of the ``term_info`` dict for ``term`` & the highest
+        number of positions in any of its docs (useful for score upper
+        bounds), or ``None`` if the term isn't in the index.
+
+        Decoded postings are kept in the ``postings_cache``, so the returned
+        ``term_info`` is shared & must not be modified.
+        """
+        if self.lsm is not None:
+            self.lsm.refresh()
+            # The token changes with every change to the segments.
+            token = self.lsm.token
+            postings = self.postings_cache.get(term, token)
+
+            if postings is None:
+                postings = self.lsm.find(term)
+
+                if postings is None:
+                    return None
+
+                self.postings_cache.put(
+                    term, self.lsm_path, token, postings, caching.approximate_postings_size(postings[0]))
+
+            return postings
+
+        seg_name = self.set_name_seg(term)
+        segment = self.segment_reader.get(self.segment_file(seg_name))
+
+        if segment is None:
+            # A missing segment or one in an older format.
+            return self._read_postings(seg_name, term)
+
+        postings = self.postings_cache.get(term, segment)
+
+        if postings is None:
+            raw = segment.find_postings(term)
+
+            if raw is None:
+                return None
+
+            term_info = segmentFormat.decode_postings(raw)
+            postings = (term_info, segmentFormat.postings_header(raw)[1])
+            self.postings_cache.put(term, seg_name, segment, postings, caching.approximate_postings_size(term_info))
+
+        return postings
+
+    def load_counts(self, term):
+        """
+        Same as ``load_postings``, but only decodes the doc ordinals & their
+        number of positions, which is all scoring needs.
+
+        Returns a tuple of two aligned lists (the ordinals, in ascending
+        order, & the position counts) & the highest count, or ``None`` if
+        the term isn't in the index. Shared with the ``postings_cache``, so
+        they must not be modified.
+        """
+        if self.lsm is not None:
+            return _counts(self.load_postings(term))
+
+        seg_name = self.set_name_seg(term)
+        segment = self.segment_reader.get(self.segment_file(seg_name))
+
+        if segment is None:
+            # A missing segment or one in an older format.
+            return _counts(self._read_postings(seg_name, term))
+
+        key = ('counts', term)
+        counts = self.postings_cache.get(key, segment)
+
+        if counts is None:
+            raw = segment.find_postings(term)
+
+            if raw is None:
+                return None
+
+            ordinals, doc_counts = segmentFormat.decode_counts(raw)
+            counts = (ordinals, doc_counts, segmentFormat.postings_header(raw)[1])
+            self.postings_cache.put(key, seg_name, segment, counts, 64 + 80 * len(ordinals))
+
+        return counts
+
+    def load_positions(self, term, ordinals):
+        """
+        Returns a dict of the docs with ``ordinals`` (ascending) that have
+        ``term`` to their positions, only decoding the positions of those.
+        """
+        if self.lsm is None:
+            seg_name = self.set_name_seg(term)
+            segment = self.segment_reader.get(self.segment_file(seg_name))
+
+            if segment is not None:
+                postings = self.postings_cache.get(term, segment)
+
+                if postings is None:
+                    raw = segment.find_postings(term)
+                    return {} if raw is None else segmentFormat.decode_positions(raw, ordinals)
+            else:
+                postings = self._read_postings(seg_name, term)
+        else:
+            postings = self.load_postings(term)
+
+        if postings is None:
+            return {}
+
+        term_info = postings[0]
+        return {ordinal: term_info[ordinal] for ordinal in ordinals if ordinal in term_info}
+
+    def load_positions_many(self, wanted):
+        """
+        Same as ``load_positions`` for several terms at once. Takes a dict of
+        terms to the (ascending) ordinals of the docs wanted for each.
+
+        Returns a dict of the terms to what ``load_positions`` returns.
+        """
+        return {term: self.load_positions(term, ordinals) for term, ordinals in wanted.items()}
+
+    def group_terms(self, terms):
+        """
+        Groups ``terms`` by the segment they're looked up in, so each segment
+        is only read once.
+
+        Returns a list of lists of terms. With the log-structured layout,
+        every term is looked up across all segments & gets its own group.
+        """
+        if self.lsm is not None:
+            return [[term] for term in dict.fromkeys(terms)]
+
+        groups = {}
+
+        for term in dict.fromkeys(terms):
+            groups.setdefault(self.set_name_seg(term), []).append(term)
+
+        return list(groups.values())
 
-                if seg_term == term:
-                    # Found it.
-                    return json.loads(term_info)
+    def load_postings_many(self, terms, counts=False):
+        """
+        Same as ``load_postings`` for several ``terms`` at once, but scans a
+        segment in an older format only once for all of its terms.
+
+        Optionally accepts a ``counts`` parameter, which is a boolean & gets
+        what ``load_counts`` returns instead. Default is ``False``.
+
+        Returns a dict of the terms found to their postings.
+        """
+        found = {}
+        load = self.load_counts if counts else self.load_postings
+
+        for group in self.group_terms(terms):
+            seg_name = self.set_name_seg(group[0])
+
+            if (self.lsm is None and len(group) > 1
+                    and self.segment_reader.get(self.segment_file(seg_name)) is None):
+                wanted = set(group)
+
+                for seg_term, raw in self._iter_segment(seg_name):
+                    if seg_term in wanted:
+                        postings = (segmentFormat.decode_postings(raw), segmentFormat.postings_header(raw)[1])
+                        found[seg_term] = _counts(postings) if counts else postings
+
+                if found:
+                    # The scan may have handed out ordinals.
+                    self.doc_ids.flush()
+
+                continue
+
+            for term in group:
+                postings = load(term)
+
+                if postings is not None:
+                    found[term] = postings
+
+        return found
+
+    def _read_postings(self, seg_name, term):
+        """
+        Reads & decodes the postings of ``term`` from the segment at
+        ``seg_name``, bypassing the ``postings_cache``.
+
+        Returns the same as ``load_postings``.
+        """
+        segment = self.segment_reader.get(self.segment_file(seg_name))
+
+        if segment is not None:
+            raw = segment.find_postings(term)
+
+            if raw is None:
+                return None
+
+            return segmentFormat.decode_postings(raw), segmentFormat.postings_header(raw)[1]
+
+        # A missing segment or one in an older format.
+        for seg_term, raw in self._iter_segment(seg_name):
+            if seg_term == term:
+                # Found it.
+                self.doc_ids.flush()
+                return segmentFormat.decode_postings(raw), segmentFormat.postings_header(raw)[1]
+
+        return None
+
+    def optimize(self):
+        """
+        Merges every segment of the log-structured layout into one, dropping
+        the postings of deleted & re-indexed documents. Bucketed segments are
+        already rewritten on every update, so there's nothing to do for them.
+
+        The ``TermDictionary`` (see ``use_token_terms``) is merged into a
+        single file too, without the terms no document has anymore.
+
+        With snapshots, the segment files no snapshot refers to (e.g. left
+        behind by a crash) are deleted.
+
+        Returns ``True`` if anything was merged.
+        """
+        with self.write_lock:
+            merged = False
+
+            if self.snapshots is not None:
+                self.snapshots.collect()
+
+                for name in self.snapshots.orphans():
+                    os.remove(os.path.join(self.index_path, name))
+
+            if self.term_dictionary is not None:
+                self.forward.refresh()
+                self.term_dictionary.compact(
+                    term for ordinal in range(len(self.doc_ids)) for term in self.forward.terms(ordinal) or ())
+                merged = True
+
+            if self.lsm is None:
+                return merged
+
+            if self.lsm.optimize():
+                self.postings_cache.invalidate_segment(self.lsm_path)
+                return True
+
+            return merged
+
+    def rebuild_forward_index(self):
+        """
+        Rebuilds the ``ForwardIndex`` from the postings of every segment, for
+        indexes built before it existed.
+
+        Returns the number of documents found.
+        """
+        with self.write_lock:
+            doc_terms = {}
+
+            if self.lsm is not None:
+                self.lsm.refresh()
+
+                for segment in self.lsm.segments:
+                    first, last = segment['first'], segment['last']
+
+                    for term, raw in self.lsm._open(segment).iter_records():
+                        for ordinal in segmentFormat.decode_postings(raw):
+                            if first <= self.lsm.owner(ordinal) <= last:
+                                doc_terms.setdefault(ordinal, []).append(term)
+            else:
+                for seg_name in self._bucket_files():
+                    for term, raw in self._iter_segment(seg_name, latest=True):
+                        for ordinal in segmentFormat.decode_postings(raw):
+                            doc_terms.setdefault(ordinal, []).append(term)
+
+                self.doc_ids.flush()
+
+            for suffix in ('.dat', '.off'):
+                if os.path.exists(self.forward_path + suffix):
+                    os.remove(self.forward_path + suffix)
+
+            self.forward = forwardIndex.ForwardIndex(self.forward_path)
+
+            for ordinal, terms in doc_terms.items():
+                self.forward.set(ordinal, terms)
+
+            self.forward.flush()
+            return len(doc_terms)
+
+    def convert_segment(self, seg_name):
+        """
+        Rewrites the legacy (tab-separated JSON) or older binary segment at
+        ``seg_name`` in the current binary format, assigning ordinals to the
+        doc ids it refers to.
+
+        Returns ``True`` if the segment was converted, ``False`` if it was
+        already binary.
+        """
+        if segmentFormat.is_binary_segment(self.segment_file(seg_name, latest=True)):
+            return False
+
+        self._write_segment_file(seg_name, self._iter_segment(seg_name, latest=True))
+        self.doc_ids.flush()
+        return True
+
+    def convert_segments(self):
+        """
+        Converts every segment in an older format to the current binary
+        format.
+
+        Returns the number of segments converted.
+        """
+        with self.write_lock:
+            converted = 0
+
+            for seg_name in self._bucket_files():
+                if self.convert_segment(seg_name):
+                    converted += 1
+
+            if converted:
+                self.publish_snapshot()
+
+            return converted
+
+    def _bucket_files(self):
+        """
+        Returns the path of every bucket file with a segment (see
+        ``segment_file`` for the file actually holding it).
+        """
+        if self.snapshots is not None:
+            return [os.path.join(self.index_path, name) for name in self.snapshots.files()]
+
+        return sorted(os.path.join(self.index_path, filename) for filename in os.listdir(self.index_path)
+                      if filename.endswith('.index'))
+
+    def rebucket(self, strategy=bucketing.DEFAULT_STRATEGY, buckets=None, max_bytes=256 * 1024 * 1024):
+        """
+        Moves every term of a bucketed index into the segments of another
+        bucketing ``strategy`` with ``buckets`` buckets (see
+        ``use_bucketing``), upgrading older segment formats on the way.
+
+        The new segments are built next to the old ones, in ``temp_path``,
+        then moved into place. Nothing else may use the index meanwhile.
+
+        Optionally accepts a ``max_bytes`` parameter, which is roughly how
+        much of the old segments is held in memory at once: bigger indexes
+        are read once per that many bytes, each pass building only its share
+        of the new buckets. Default is ``256MB``.
+
+        Returns the number of segments written.
+        """
+        with self.write_lock:
+            if self.lsm is not None:
+                raise ValueError('The index at {0!r} uses the lsm layout, which has no buckets.'.format(
+                    self.index_path))
+
+            if self.snapshots is not None:
+                # Pinned snapshots would look their terms up in the new buckets.
+                raise ValueError("The index at {0!r} publishes snapshots, which can't be rebucketed.".format(
+                    self.index_path))
+
+            new_strategy = bucketing.make_strategy(strategy, buckets)
+            old_files = self._bucket_files()
+            passes = max(1, -(-sum(os.path.getsize(seg_name) for seg_name in old_files) // max_bytes))
+            staging = tempfile.mkdtemp(dir=self.temp_path, prefix='rebucket-')
+            written = 0
+
+            try:
+                for current_pass in range(passes):
+                    per_bucket = {}
+
+                    for seg_name in old_files:
+                        for term, postings in self._iter_segment(seg_name):
+                            bucket = new_strategy.bucket(term)
+
+                            if bucket % passes == current_pass:
+                                per_bucket.setdefault(bucket, []).append((term, bytes(postings)))
+
+                    for bucket, records in per_bucket.items():
+                        with open(os.path.join(staging, new_strategy.file_name(bucket)), 'wb') as seg_file:
+                            segmentFormat.write_segment(seg_file, sorted(records))
+
+                    written += len(per_bucket)
+
+                # Older segments may have assigned ordinals.
+                self.doc_ids.flush()
+
+                for seg_name in old_files:
+                    os.remove(seg_name)
+                    self.segment_reader.invalidate(seg_name)
+
+                for filename in os.listdir(staging):
+                    os.replace(os.path.join(staging, filename), os.path.join(self.index_path, filename))
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+            self.stats.update({'bucketing': new_strategy.config()})
+            self.bucketing = new_strategy
+            self.postings_cache.clear()
+            return written
+
+    def bucket_stats(self):
+        """
+        Returns a dict describing how the terms are spread over the segments:
+        the ``bucketing`` (see ``use_bucketing``), the number of ``buckets``
+        with a segment, the size stats (see ``bucketing.size_stats``) of
+        their ``bytes`` & ``terms`` (of binary segments) & the ``largest``
+        ones, a list of ``(file name, bytes, terms)``.
+        """
+        sizes = []
 
-        return 'Not Found'
+        for seg_name in self._bucket_files():
+            seg_file = self.segment_file(seg_name)
+            segment = self.segment_reader.get(seg_file)
+            sizes.append((os.path.basename(seg_name), os.path.getsize(seg_file),
+                          None if segment is None else segment.term_count))
 
+        largest = sorted(sizes, key=lambda size: size[1], reverse=True)[:10]
+        return {
+            'bucketing': self.bucketing.config(),
+            'buckets': len(sizes),
+            'bytes': bucketing.size_stats([size for _, size, _ in sizes]),
+            'terms': bucketing.size_stats([terms for _, _, terms in sizes if terms is not None]),
+            'largest': largest,
+        }
 
 
 if __name__ == '__main__':
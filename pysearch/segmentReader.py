@@ -0,0 +1,128 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from . import segmentFormat
+
+
+class _MappedSegment(object):
+    """
+    One memory-mapped binary segment, plus the ``os.stat`` identity of the
+    file that was mapped so replacements can be spotted.
+    """
+
+    def __init__(self, seg_name) -> None:
+        with open(seg_name, 'rb') as seg_file:
+            stat = os.fstat(seg_file.fileno())
+            self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            self.mapping = mmap.mmap(seg_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Slices of the view share the mapping, nothing gets copied until a
+        # term's postings are decoded.
+        view = memoryview(self.mapping)
+        self.segment = segmentFormat.SegmentFile(
+            lambda offset, length: view[offset:offset + length], len(self.mapping))
+
+
+class SegmentReader(object):
+    """
+    Keeps binary segments memory-mapped between lookups, so hot segments cost
+    a ``stat`` call instead of an ``open``, ``read`` & ``close``.
+
+    At most ``max_open`` segments stay mapped (enough for every bucket of
+    the default ``bucketing``, twice over); the least recently used one is
+    dropped when another is needed. Segments replaced on disk (``save_segment``
+    moves a new file into place) are remapped on their next lookup.
+
+    Dropped mappings are never closed explicitly, since another thread may
+    still be reading from them. They are unmapped once the last reference to
+    them goes away.
+    """
+
+    def __init__(self, max_open=2048) -> None:
+        self.max_open = max_open
+        self.segments = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, seg_name):
+        """
+        Returns the ``segmentFormat.SegmentFile`` for the segment at
+        ``seg_name``, reading straight out of the mapping.
+
+        Returns ``None`` if the segment doesn't exist or isn't a binary
+        segment.
+        """
+        try:
+            stat = os.stat(seg_name)
+        except FileNotFoundError:
+            self.invalidate(seg_name)
+            return None
+
+        identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        with self.lock:
+            mapped = self.segments.get(seg_name)
+
+            if mapped is not None and mapped.identity == identity:
+                self.segments.move_to_end(seg_name)
+                return mapped.segment
+
+        if stat.st_size < len(segmentFormat.HEADER) or not segmentFormat.is_binary_segment(seg_name):
+            return None
+
+        try:
+            mapped = _MappedSegment(seg_name)
+        except FileNotFoundError:
+            return None
+
+        with self.lock:
+            self.segments.pop(seg_name, None)
+            self.segments[seg_name] = mapped
+
+            while len(self.segments) > self.max_open:
+                self.segments.popitem(last=False)
+
+        return mapped.segment
+
+    def find(self, seg_name, term):
+        """
+        Returns the decoded ``term_info`` dict for ``term`` from the segment
+        at ``seg_name``, or ``None`` if either is missing.
+        """
+        segment = self.get(seg_name)
+
+        if segment is None:
+            return None
+
+        return segment.find(term)
+
+    def invalidate(self, seg_name):
+        """
+        Drops the mapping of the segment at ``seg_name``, if it's mapped.
+        """
+        with self.lock:
+            self.segments.pop(seg_name, None)
+
+    def close(self):
+        """
+        Drops every mapping.
+        """
+        with self.lock:
+            self.segments = OrderedDict()
+
+
+_shared_reader = None
+
+
+def shared_reader():
+    """
+    Returns the process-wide ``SegmentReader``, so every engine in the process
+    shares the same mappings.
+    """
+    global _shared_reader
+
+    if _shared_reader is None:
+        _shared_reader = SegmentReader()
+
+    return _shared_reader
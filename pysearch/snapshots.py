@@ -0,0 +1,357 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+MANIFEST_NAME = 'manifest.json'
+# How many seconds a retired segment file is kept around after the commit
+# that replaced it, for readers in other processes, which can't tell the
+# writer what they pinned.
+RETIRE_GRACE = 5.0
+
+
+class Snapshot(object):
+    """
+    A point-in-time view of a bucketed index, as published by a commit: its
+    ``generation``, the file (``segments``) holding each bucket's segment
+    then & the ``total_docs`` & ``total_length`` scoring needs.
+    """
+
+    def __init__(self, generation=0, segments=None, total_docs=0, total_length=0) -> None:
+        self.generation = generation
+        self.segments = segments or {}
+        self.total_docs = total_docs
+        self.total_length = total_length
+
+    def average_length(self):
+        """
+        Returns the average document length, in tokens.
+        """
+        if not self.total_docs:
+            return 0.0
+
+        return self.total_length / self.total_docs
+
+
+class SnapshotManager(object):
+    """
+    Publishes snapshots of a bucketed index & pins them for readers.
+
+    Segment files are never replaced in place: every new version of a
+    bucket's segment is written to a new file, named after the bucket & the
+    generation it's published with (e.g. ``286.0000000012.index``). A commit
+    then publishes all of them at once, along with the document counts, by
+    replacing ``manifest.json``. A search pins the latest snapshot for its
+    whole duration, so it never sees half a commit, however many segments
+    it touched, & doesn't take any lock on the way.
+
+    The files replaced by a commit are retired & deleted by the writer once
+    no snapshot pinned in its process needs them & ``grace`` seconds have
+    passed (for readers in other processes). So are the stored documents of
+    deleted documents, through the ``delete_document`` callback. Only a
+    single process may write to an index at a time.
+    """
+
+    def __init__(self, path, index_path, grace=RETIRE_GRACE) -> None:
+        """
+        Takes the ``path`` of the directory holding the manifest & the
+        ``index_path`` holding the segments.
+
+        Optionally accepts a ``grace`` parameter, which is the number of
+        seconds retired files are kept at least. Default is ``5.0``.
+        """
+        self.path = path
+        self.index_path = index_path
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+        self.grace = grace
+        self.lock = threading.RLock()
+        # The snapshot pinned by the current thread, see ``pin``.
+        self.local = threading.local()
+        # The number of pins of every pinned generation.
+        self.refs = Counter()
+        # Bucket file names to the files written for them since the last
+        # publish.
+        self.pending = {}
+        # Set once this instance published, i.e. it's the writer.
+        self.writing = False
+        # Called with the id of every retired document once it's deleted,
+        # see ``retire_document``. Without it, they're left for an instance
+        # that has it.
+        self.delete_document = None
+
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+
+        self.load()
+
+    def load(self):
+        """
+        (Re)reads the manifest from disk.
+        """
+        with self.lock:
+            manifest = {}
+            self.identity = None
+
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as manifest_file:
+                    stat = os.fstat(manifest_file.fileno())
+                    self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                    manifest = json.load(manifest_file)
+
+            self.current = Snapshot(manifest.get('generation', 0), manifest.get('segments', {}),
+                                    manifest.get('total_docs', 0), manifest.get('total_length', 0))
+            # Files of older snapshots as ``[name, generation retired at,
+            # time retired at]``, see ``collect``.
+            self.retired = manifest.get('retired', [])
+            # The same for the ids of deleted documents.
+            self.retired_documents = manifest.get('retired_documents', [])
+
+    def refresh(self):
+        """
+        Picks up snapshots published by another instance. Costs a single
+        ``stat`` call when nothing changed. Left alone while this instance
+        has unpublished writes.
+
+        Returns ``True`` if anything was reloaded.
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return False
+
+        with self.lock:
+            if self.pending or (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self.identity:
+                return False
+
+            self.load()
+            return True
+
+    def resolve(self, seg_name, latest=False):
+        """
+        Returns the path of the file holding the segment at ``seg_name`` (a
+        bucket file, see ``SegmentHandler.set_name_seg``): in the snapshot
+        pinned by this thread, else the latest version, published or not.
+
+        Optionally accepts a ``latest`` parameter, which is a boolean &
+        always gets the latest version, as writes need. Default is
+        ``False``.
+        """
+        name = os.path.basename(seg_name)
+        snapshot = None if latest else self.pinned()
+
+        if snapshot is None:
+            with self.lock:
+                if name in self.pending:
+                    return os.path.join(self.index_path, self.pending[name])
+
+            self.refresh()
+            snapshot = self.current
+
+        # Buckets without a segment have no file of any version either.
+        return os.path.join(self.index_path, snapshot.segments.get(name, name))
+
+    def new_version(self, seg_name):
+        """
+        Returns the path to write the next version of the segment at
+        ``seg_name`` to (see ``add``).
+        """
+        name = os.path.basename(seg_name)
+        stem = name[:-len('.index')] if name.endswith('.index') else name
+        return os.path.join(self.index_path, '{0}.{1:010d}.index'.format(stem, self.current.generation + 1))
+
+    def add(self, seg_name, path):
+        """
+        Records that the segment at ``seg_name`` was written to ``path``, to
+        be published by the next ``publish``.
+        """
+        with self.lock:
+            self.pending[os.path.basename(seg_name)] = os.path.basename(path)
+
+    def retire_document(self, doc_id):
+        """
+        Records that the document with ``doc_id`` is deleted by the next
+        ``publish``, so its stored document is only deleted once no pinned
+        snapshot can return it.
+        """
+        with self.lock:
+            self.retired_documents.append([doc_id, self.current.generation + 1, time.time()])
+
+    def files(self):
+        """
+        Returns the names of every bucket file with a segment, published or
+        not.
+        """
+        with self.lock:
+            return sorted(set(self.current.segments) | set(self.pending))
+
+    def publish(self, total_docs, total_length):
+        """
+        Publishes a snapshot of the segments written since the last one &
+        the ``total_docs`` & ``total_length`` of the index, retiring the
+        files they replace.
+
+        Returns the new ``Snapshot``.
+        """
+        with self.lock:
+            generation = self.current.generation + 1
+            segments = dict(self.current.segments)
+            now = time.time()
+
+            for name, physical in self.pending.items():
+                old = segments.get(name)
+
+                if old is not None and old != physical:
+                    self.retired.append([old, generation, now])
+
+                segments[name] = physical
+
+            snapshot = Snapshot(generation, segments, total_docs, total_length)
+            self._write_manifest({
+                'generation': generation,
+                'segments': segments,
+                'total_docs': total_docs,
+                'total_length': total_length,
+                'retired': self.retired,
+                'retired_documents': self.retired_documents,
+            })
+            self.current = snapshot
+            self.pending = {}
+            self.writing = True
+
+        self.collect()
+        return snapshot
+
+    def _write_manifest(self, manifest):
+        fd, temp_name = tempfile.mkstemp(dir=self.path, prefix='.manifest-')
+
+        with os.fdopen(fd, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            stat = os.fstat(manifest_file.fileno())
+            self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        os.replace(temp_name, self.manifest_path)
+
+    def _expired(self, entries):
+        """
+        Splits retired ``entries`` into a list of the names no pinned
+        snapshot needs anymore, once their ``grace`` is over, & a list of
+        the entries to keep.
+        """
+        oldest = min(self.refs, default=None)
+        now = time.time()
+        expired = []
+        kept = []
+
+        for entry in entries:
+            name, generation, retired_at = entry
+
+            # A retired file is part of every snapshot before the one that
+            # replaced it.
+            if (oldest is not None and oldest < generation) or now - retired_at < self.grace:
+                kept.append(entry)
+            else:
+                expired.append(name)
+
+        return expired, kept
+
+    def collect(self):
+        """
+        Deletes the retired files & documents no pinned snapshot needs
+        anymore.
+
+        Returns the number of files deleted.
+        """
+        with self.lock:
+            expired, self.retired = self._expired(self.retired)
+
+            for name in expired:
+                try:
+                    os.remove(os.path.join(self.index_path, name))
+                except FileNotFoundError:
+                    pass
+
+            if self.delete_document is not None:
+                doc_ids, self.retired_documents = self._expired(self.retired_documents)
+
+                for doc_id in doc_ids:
+                    self.delete_document(doc_id)
+
+            return len(expired)
+
+    def acquire(self, snapshot=None):
+        """
+        Pins the ``snapshot``, keeping its files around until it's released
+        (see ``release``).
+
+        Optionally accepts a ``snapshot`` parameter. Default is ``None``
+        (the latest published one).
+
+        Returns the pinned ``Snapshot``.
+        """
+        with self.lock:
+            if snapshot is None:
+                self.refresh()
+                snapshot = self.current
+
+            self.refs[snapshot.generation] += 1
+            return snapshot
+
+    def release(self, snapshot):
+        """
+        Unpins a ``snapshot`` pinned by ``acquire``.
+        """
+        with self.lock:
+            self.refs[snapshot.generation] -= 1
+
+            if self.refs[snapshot.generation] <= 0:
+                del self.refs[snapshot.generation]
+
+            if self.writing and (self.retired or self.retired_documents):
+                self.collect()
+
+    def pinned(self):
+        """
+        Returns the snapshot pinned by this thread, or ``None``.
+        """
+        return getattr(self.local, 'snapshot', None)
+
+    @contextlib.contextmanager
+    def pin(self, snapshot=None):
+        """
+        Pins a snapshot (see ``acquire``) for this thread: ``resolve`` reads
+        from it until the block exits. Nested pins keep the outer snapshot.
+
+        Optionally accepts a ``snapshot`` parameter, e.g. pinned by another
+        thread. Default is ``None`` (the latest published one).
+        """
+        previous = self.pinned()
+
+        if previous is not None and snapshot is None:
+            yield previous
+            return
+
+        snapshot = self.acquire(snapshot)
+        self.local.snapshot = snapshot
+
+        try:
+            yield snapshot
+        finally:
+            self.local.snapshot = previous
+            self.release(snapshot)
+
+    def orphans(self):
+        """
+        Returns the names of the versioned segment files neither a snapshot
+        nor a pending write refers to, e.g. left behind by a crash before
+        their commit.
+        """
+        with self.lock:
+            known = set(self.current.segments.values()) | set(self.pending.values())
+            known.update(name for name, _, _ in self.retired)
+
+        return sorted(name for name in os.listdir(self.index_path)
+                      if name.endswith('.index') and name.count('.') == 2 and name not in known)
@@ -0,0 +1,340 @@
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+
+from . import segmentFormat
+from . import tokenization
+
+# ``word*`` & ``word~`` (or ``word~1``) in a query.
+PATTERN = re.compile(r'^(.+?)(?:(\*)|~(\d)?)$')
+# How many edits ``word~`` allows.
+DEFAULT_EDITS = 2
+# How many terms a fuzzy expansion steps over before seeking instead: about
+# a block, which a seek would decode anyway.
+SCAN_LIMIT = segmentFormat.BLOCK_SIZE
+
+
+def parse_pattern(word):
+    """
+    Parses a ``word`` of a query into a tuple of the kind of pattern
+    (``'prefix'`` or ``'fuzzy'``), the text it's made of (analyzed like a
+    token, but keeping stop words) & the number of edits a fuzzy pattern
+    allows.
+
+    Returns ``None`` if the ``word`` isn't a pattern (or the text isn't a
+    single token).
+    """
+    match = PATTERN.match(word)
+
+    if match is None:
+        return None
+
+    text, star, edits = match.groups()
+    tokens = tokenization.make_tokens(text, STOP_WORDS=())
+
+    if len(tokens) != 1:
+        return None
+
+    if star:
+        return 'prefix', tokens[0], 0
+
+    return 'fuzzy', tokens[0], DEFAULT_EDITS if edits is None else int(edits)
+
+
+class LevenshteinAutomaton(object):
+    """
+    Accepts the strings within ``max_edits`` insertions, deletions or
+    substitutions of ``word``.
+
+    A state is the row of edit distances between the input read so far &
+    every prefix of ``word``, so it can be fed one character at a time &
+    tell early that no string with the current prefix can match.
+    """
+
+    def __init__(self, word, max_edits) -> None:
+        self.word = word
+        self.max_edits = max_edits
+
+    def start(self):
+        return list(range(len(self.word) + 1))
+
+    def step(self, state, char):
+        new_state = [state[0] + 1]
+
+        for number, word_char in enumerate(self.word):
+            cost = 0 if word_char == char else 1
+            new_state.append(min(new_state[number] + 1, state[number] + cost, state[number + 1] + 1))
+
+        return new_state
+
+    def is_match(self, state):
+        return state[-1] <= self.max_edits
+
+    def can_match(self, state):
+        return min(state) <= self.max_edits
+
+
+class TermDictionary(object):
+    """
+    Every distinct term of an index using whole tokens as terms (see
+    ``SegmentHandler.use_token_terms``), so prefix & fuzzy queries can be
+    expanded into the terms they match.
+
+    The terms are kept in sorted, front-coded files in the binary segment
+    format (with empty postings), read through the memory-mapped
+    ``segment_reader``, so finding a term or the first term after some
+    string is a binary search of the block index. Every flush writes the
+    new terms to a small file of its own; once there are ``merge_factor``
+    of them, they're merged into one.
+
+    The files are listed in ``dictionary.json``, which is replaced
+    atomically on every change. Terms are never removed (the postings of a
+    term that's gone are simply missing), until ``compact`` is given the
+    live terms.
+    """
+
+    def __init__(self, path, segment_reader, merge_factor=8) -> None:
+        """
+        Takes the ``path`` of the directory holding the files & the
+        ``segment_reader`` (see ``SegmentReader``) to read them through.
+
+        Optionally accepts a ``merge_factor`` parameter, which is how many
+        files pile up before they're merged. Default is ``8``.
+        """
+        self.path = path
+        self.manifest_path = os.path.join(path, 'dictionary.json')
+        self.segment_reader = segment_reader
+        self.merge_factor = max(2, merge_factor)
+        self.lock = threading.RLock()
+
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+
+        self.load()
+
+    def load(self):
+        """
+        (Re)reads the list of files from disk.
+        """
+        with self.lock:
+            manifest = {}
+            self.identity = None
+
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as manifest_file:
+                    stat = os.fstat(manifest_file.fileno())
+                    self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                    manifest = json.load(manifest_file)
+
+            self.files = manifest.get('files', [])
+            self.next_number = manifest.get('next_number', 1)
+
+    def refresh(self):
+        """
+        Picks up changes written by another instance. Costs a single ``stat``
+        call when nothing changed.
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return False
+
+        with self.lock:
+            if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self.identity:
+                return False
+
+            self.load()
+            return True
+
+    def _segments(self):
+        segments = []
+
+        for name in self.files:
+            segment = self.segment_reader.get(os.path.join(self.path, name))
+
+            if segment is not None:
+                segments.append(segment)
+
+        return segments
+
+    def add(self, terms):
+        """
+        Records ``terms`` (an iterable), writing them out right away.
+        """
+        terms = sorted(set(terms))
+
+        if not terms:
+            return
+
+        with self.lock:
+            self.refresh()
+            name = self._write(terms)
+            self.files.append(name)
+
+            if len(self.files) >= self.merge_factor:
+                self._merge(self.iter_terms())
+            else:
+                self._commit()
+
+    def compact(self, terms=None):
+        """
+        Merges every file into one.
+
+        Optionally accepts a ``terms`` parameter, an iterable of the terms to
+        keep, in which case only those are. Default is ``None`` (keep every
+        term).
+        """
+        with self.lock:
+            self.refresh()
+            self._merge(self.iter_terms() if terms is None else sorted(set(terms)))
+
+    def _merge(self, terms):
+        old_files = self.files
+        self.files = [self._write(terms)]
+        self._commit()
+
+        for name in old_files:
+            os.remove(os.path.join(self.path, name))
+            self.segment_reader.invalidate(os.path.join(self.path, name))
+
+    def _write(self, terms):
+        fd, temp_name = tempfile.mkstemp(dir=self.path, prefix='.tmp-', suffix='.dict')
+
+        try:
+            with os.fdopen(fd, 'wb') as dict_file:
+                segmentFormat.write_segment(dict_file, ((term, b'') for term in terms))
+
+            name = 'terms-{0:010d}.dict'.format(self.next_number)
+            os.replace(temp_name, os.path.join(self.path, name))
+        except BaseException:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+
+            raise
+
+        self.next_number += 1
+        return name
+
+    def _commit(self):
+        manifest = {
+            'files': self.files,
+            'next_number': self.next_number,
+        }
+        fd, temp_name = tempfile.mkstemp(dir=self.path, prefix='.manifest-')
+
+        with os.fdopen(fd, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            stat = os.fstat(manifest_file.fileno())
+            self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        os.replace(temp_name, self.manifest_path)
+
+    def iter_terms(self, start=''):
+        """
+        Yields every (distinct) term from ``start`` on, in order.
+        """
+        last = None
+
+        for term in heapq.merge(*[segment.iter_terms(start) for segment in self._segments()]):
+            if term != last:
+                yield term
+                last = term
+
+    def __contains__(self, term):
+        return any(segment.find_postings(term) is not None for segment in self._segments())
+
+    def prefix(self, prefix, limit=None):
+        """
+        Returns the sorted list of the terms starting with ``prefix``, found
+        by a range scan from the first of them.
+
+        Optionally accepts a ``limit`` parameter, which is the number of
+        terms to return at most. Default is ``None`` (all of them).
+        """
+        found = []
+
+        for term in self.iter_terms(prefix):
+            if not term.startswith(prefix) or limit is not None and len(found) >= limit:
+                break
+
+            found.append(term)
+
+        return found
+
+    def fuzzy(self, word, max_edits=2, limit=None):
+        """
+        Returns the list of the terms within ``max_edits`` edits of
+        ``word``, closest first (then in term order), by intersecting a
+        ``LevenshteinAutomaton`` with the sorted terms.
+
+        Terms sharing a prefix share the automaton states of that prefix,
+        & once a prefix can't match, every term starting with it is skipped
+        (seeking past them in the block index when there are many).
+
+        Optionally accepts a ``limit`` parameter, which is the number of
+        terms to return at most. Default is ``None`` (all of them).
+        """
+        automaton = LevenshteinAutomaton(word, max_edits)
+        found = []
+
+        for segment in self._segments():
+            found.extend(self._intersect(segment, automaton))
+
+        found = sorted(set(found))
+        return [term for _, term in found[:limit]]
+
+    @staticmethod
+    def _intersect(segment, automaton):
+        # ``states[depth]`` is the state after reading ``previous[:depth]``.
+        states = [automaton.start()]
+        previous = ''
+        terms = segment.iter_terms()
+        term = next(terms, None)
+
+        while term is not None:
+            shared = 0
+
+            while shared < min(len(previous), len(term), len(states) - 1) and previous[shared] == term[shared]:
+                shared += 1
+
+            del states[shared + 1:]
+            previous = term
+            dead = False
+
+            for char in term[shared:]:
+                state = automaton.step(states[-1], char)
+
+                if not automaton.can_match(state):
+                    dead = True
+                    break
+
+                states.append(state)
+
+            if not dead:
+                if automaton.is_match(states[-1]):
+                    yield states[-1][-1], term
+
+                term = next(terms, None)
+                continue
+
+            # Nothing starting with the prefix that was just read can match,
+            # so move on to the first term after all of them. Stepping over
+            # a few terms is cheaper than seeking through the block index.
+            dead_prefix = term[:len(states)]
+            target = dead_prefix[:-1] + chr(ord(dead_prefix[-1]) + 1)
+            term = next(terms, None)
+            skipped = 0
+
+            while term is not None and term < target:
+                skipped += 1
+
+                if skipped == SCAN_LIMIT:
+                    terms = segment.iter_terms(target)
+                    term = next(terms, None)
+                    break
+
+                term = next(terms, None)
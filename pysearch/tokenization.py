@@ -1,3 +1,4 @@
+import codecs
 import re
 import hashlib
 
@@ -10,6 +11,9 @@ STOP_WORDS = set([
    ])
 PUNCTUATION = re.compile('[~`!@#$%^&*()+={\[}\]|\\:;"\',<.>/?]')
 
+# Number of characters the streaming analyzer reads (or slices) at a time.
+CHUNK_SIZE = 64 * 1024
+
 def make_tokens(blob: str, STOP_WORDS=STOP_WORDS, PUNCTUATION=PUNCTUATION) -> list:
     """
     Given a string of text, return a list of tokens
@@ -33,19 +37,158 @@ def make_ngrams(tokens: list, min_gram=3, max_gram=6):
         min_gram (int, optional): the minimum gram length. Defaults to 3.
         max_gram (int, optional): the maximum gram length. Defaults to 6.
     """
-    terms = {}
+    return collect_terms(iter_ngrams(tokens, min_gram, max_gram))
+
+
+def _iter_chunks(source, chunk_size):
+    """
+    Yields ``source`` (a string or a file-like object) ``chunk_size``
+    characters at a time. Binary files are decoded as UTF-8.
+    """
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+
+        return
+
+    decoder = None
+
+    while True:
+        chunk = source.read(chunk_size)
+
+        if not chunk:
+            break
+
+        if isinstance(chunk, bytes):
+            decoder = decoder or codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+
+        yield chunk
+
+    if decoder is not None:
+        yield decoder.decode(b'', final=True)
+
+
+def iter_tokens(source, STOP_WORDS=STOP_WORDS, PUNCTUATION=PUNCTUATION, chunk_size=CHUNK_SIZE):
+    """
+    Lazily yields the same tokens as ``make_tokens``, reading ``source`` (a
+    string or a file-like object) in chunks of ``chunk_size`` characters.
+
+    Only a chunk & the token straddling its end are held in memory at once.
+    ``PUNCTUATION`` is applied per chunk, so it should only match single
+    characters.
+    """
+    pending = ''
+
+    for chunk in _iter_chunks(source, chunk_size):
+        text = pending + PUNCTUATION.sub(' ', chunk)
+        pieces = text.split()
+        pending = ''
+
+        if pieces and not text[-1].isspace():
+            # The last token may carry on in the next chunk.
+            pending = pieces.pop()
+
+        for token in pieces:
+            token = token.lower()
+
+            if token not in STOP_WORDS:
+                yield token
+
+    if pending:
+        token = pending.lower()
 
+        if token not in STOP_WORDS:
+            yield token
+
+
+def iter_ngrams(tokens, min_gram=3, max_gram=6):
+    """
+    Lazily yields ``(term, position)`` pairs for the n-grams of an iterable
+    of ``tokens``, in position order.
+    """
     for position, token in enumerate(tokens):
         for window_length in range(min_gram, min(max_gram + 1, len(token) + 1)):
-            gram = token[:window_length]
-            terms.setdefault(gram, [])
+            yield token[:window_length], position
+
 
-            if position not in terms[gram]:
-                terms[gram].append(position)
+def analyze(source, min_gram=3, max_gram=6, chunk_size=CHUNK_SIZE):
+    """
+    Streams ``source`` (a string or a file-like object) through the whole
+    pipeline, lazily yielding ``(term, position)`` pairs.
+    """
+    return iter_ngrams(iter_tokens(source, chunk_size=chunk_size), min_gram, max_gram)
+
+
+def collect_terms(pairs):
+    """
+    Collects ``(term, position)`` pairs (in position order, as yielded by
+    ``analyze``) into a dict of terms to positions, like ``make_ngrams``.
+
+    Since positions only ever grow, a repeated position can only be the last
+    one recorded for the term, so duplicates are dropped in constant time.
+    """
+    terms = {}
+
+    for term, position in pairs:
+        positions = terms.get(term)
+
+        if positions is None:
+            terms[term] = [position]
+        elif positions[-1] != position:
+            positions.append(position)
 
     return terms
 
 
+def make_terms(source, min_gram=3, max_gram=6, chunk_size=CHUNK_SIZE):
+    """
+    Analyzes ``source`` (a string or a file-like object) in a single
+    streaming pass, without building the list of tokens.
+
+    Returns a tuple of the dict of terms to positions (same as
+    ``make_ngrams(make_tokens(...))``) & the number of tokens.
+    """
+    terms = {}
+    length = 0
+
+    # The same as ``collect_terms(analyze(...))``, inlined since it's the
+    # hot path when indexing.
+    for position, token in enumerate(iter_tokens(source, chunk_size=chunk_size)):
+        length += 1
+
+        for window_length in range(min_gram, min(max_gram + 1, len(token) + 1)):
+            gram = token[:window_length]
+            positions = terms.get(gram)
+
+            if positions is None:
+                terms[gram] = [position]
+            elif positions[-1] != position:
+                positions.append(position)
+
+    return terms, length
+
+
+def make_token_terms(source, chunk_size=CHUNK_SIZE):
+    """
+    Same as ``make_terms``, but every whole token is a term instead of its
+    n-grams, for indexes that expand words through a ``TermDictionary``.
+    """
+    terms = {}
+    length = 0
+
+    for position, token in enumerate(iter_tokens(source, chunk_size=chunk_size)):
+        length += 1
+        positions = terms.get(token)
+
+        if positions is None:
+            terms[token] = [position]
+        elif positions[-1] != position:
+            positions.append(position)
+
+    return terms, length
+
+
 def hash_name(term, length=6):
     """
         Hash the term and returns a string of the first N letters
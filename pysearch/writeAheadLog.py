@@ -0,0 +1,387 @@
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+# Every record is its header (payload length, CRC-32 of the sequence number
+# & payload, sequence number), then its JSON payload.
+RECORD_HEADER = struct.Struct('<IIQ')
+LOG_SUFFIX = '.log'
+
+
+class WriteAheadLog(object):
+    """
+    Makes writes durable with a single sequential append each, so they can
+    be applied to the index later (& in batches).
+
+    Every record gets the next sequence number & is appended to the current
+    log file. A group commit thread ``fsync``s the log at most every
+    ``sync_interval`` seconds, so a whole batch of appends, from however
+    many threads, costs a single ``fsync``. Once durable, records are handed
+    to the ``apply`` callback in batches by an applier thread, after which
+    the ``checkpoint.json`` records the last one applied & log files holding
+    only applied records are deleted.
+
+    Records that were logged but not applied (e.g. after a crash) are
+    handed to ``apply`` again by ``replay``, so applying a record twice must
+    do no harm. A record torn by a crash at the end of the log is dropped.
+
+    Only a single process may write to a log at a time.
+    """
+
+    def __init__(self, path, apply, sync_interval=0.005, batch_size=1000, max_file_bytes=16 * 1024 * 1024,
+                 max_pending=10000) -> None:
+        """
+        Takes the ``path`` of the directory holding the log & the ``apply``
+        callback, which is called with a list of records (in order) & makes
+        them part of the index.
+
+        Optionally accepts a ``sync_interval`` parameter, which is the number
+        of seconds appends are gathered for before they're ``fsync``ed
+        together. Default is ``0.005``.
+
+        Optionally accepts a ``batch_size`` parameter, which is the number of
+        records applied at once at most. Default is ``1000``.
+
+        Optionally accepts a ``max_file_bytes`` parameter, which is the size
+        a log file grows to before the next one is started. Default is
+        ``16MB``.
+
+        Optionally accepts a ``max_pending`` parameter, which is the number
+        of records that may wait to be applied before ``append`` blocks.
+        Default is ``10000``.
+        """
+        self.path = path
+        self.apply = apply
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self.max_file_bytes = max_file_bytes
+        self.max_pending = max_pending
+        self.checkpoint_path = os.path.join(path, 'checkpoint.json')
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        # Records appended but not applied yet, in order.
+        self.pending = []
+        self.threads = []
+        self.closing = False
+        self.error = None
+        self.syncs = 0
+
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+
+        self.applied_seq = self._read_checkpoint()
+        self.files = self._list_files()
+        last_seq = self.applied_seq
+
+        for number, (first_seq, name) in enumerate(self.files):
+            for seq, _ in self._iter_file(name, truncate=number == len(self.files) - 1):
+                last_seq = max(last_seq, seq)
+
+        self.written_seq = self.durable_seq = last_seq
+        self.file = None
+
+    def _read_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+
+        with open(self.checkpoint_path, 'r') as checkpoint_file:
+            return int(json.load(checkpoint_file).get('applied', 0))
+
+    def _write_checkpoint(self, seq):
+        fd, temp_name = tempfile.mkstemp(dir=self.path, prefix='.checkpoint-')
+
+        with os.fdopen(fd, 'w') as checkpoint_file:
+            json.dump({'applied': seq}, checkpoint_file)
+
+        os.replace(temp_name, self.checkpoint_path)
+
+    def _list_files(self):
+        return sorted((int(name[:-len(LOG_SUFFIX)]), name) for name in os.listdir(self.path)
+                      if name.endswith(LOG_SUFFIX))
+
+    def _iter_file(self, name, truncate=False):
+        """
+        Yields every ``(seq, record)`` of the log file ``name``. A torn or
+        corrupt record ends the file: it's cut off there when ``truncate``
+        is set (the last file, where a crash can leave one), else it raises
+        a ``ValueError``.
+        """
+        file_path = os.path.join(self.path, name)
+
+        with open(file_path, 'rb') as log_file:
+            raw = log_file.read()
+
+        pos = 0
+
+        while pos < len(raw):
+            end = pos + RECORD_HEADER.size
+
+            if end <= len(raw):
+                length, checksum, seq = RECORD_HEADER.unpack_from(raw, pos)
+                payload = raw[end:end + length]
+
+                if len(payload) == length and zlib.crc32(payload, seq & 0xffffffff) == checksum:
+                    yield seq, json.loads(payload.decode('utf-8'))
+                    pos = end + length
+                    continue
+
+            if not truncate:
+                raise ValueError('Corrupt record at offset {0} of {1!r}.'.format(pos, file_path))
+
+            with open(file_path, 'r+b') as log_file:
+                log_file.truncate(pos)
+
+            return
+
+    def replay(self):
+        """
+        Applies every logged record the checkpoint says wasn't applied yet,
+        in batches. Call it before ``start``.
+
+        Returns the number of records applied.
+        """
+        count = 0
+        batch = []
+
+        for _, name in self.files:
+            for seq, record in self._iter_file(name):
+                if seq <= self.applied_seq:
+                    continue
+
+                batch.append((seq, record))
+
+                if len(batch) >= self.batch_size:
+                    count += self._apply_batch(batch)
+                    batch = []
+
+        if batch:
+            count += self._apply_batch(batch)
+
+        return count
+
+    def start(self):
+        """
+        Starts the group commit & applier threads.
+        """
+        for target in (self._sync_loop, self._apply_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def append(self, record):
+        """
+        Appends a ``record`` (a JSON-serializable dict) to the log & returns
+        its sequence number. It's only durable once ``wait_durable`` returns.
+        """
+        payload = json.dumps(record).encode('utf-8')
+
+        with self.changed:
+            self._raise_error()
+
+            while len(self.pending) >= self.max_pending and self.error is None:
+                # The applier is behind, so don't pile up more.
+                self.changed.wait()
+
+            seq = self.written_seq + 1
+
+            if self.file is None or self.file.tell() >= self.max_file_bytes:
+                self._roll(seq)
+
+            self.file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload, seq & 0xffffffff), seq))
+            self.file.write(payload)
+            self.written_seq = seq
+            self.pending.append((seq, record))
+            self.changed.notify_all()
+            return seq
+
+    def _roll(self, seq):
+        # The new file is named after its first record.
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.durable_seq = self.written_seq
+
+        name = '{0:020d}{1}'.format(seq, LOG_SUFFIX)
+        self.file = open(os.path.join(self.path, name), 'ab')
+        self.files.append((seq, name))
+
+    def wait_durable(self, seq):
+        """
+        Blocks until the record with ``seq`` (& every one before it) is
+        ``fsync``ed.
+        """
+        with self.changed:
+            while self.durable_seq < seq:
+                self._raise_error()
+                self.changed.wait()
+
+    def wait_applied(self, seq=None):
+        """
+        Blocks until the record with ``seq`` (& every one before it) is
+        applied.
+
+        Optionally accepts a ``seq`` parameter. Default is ``None`` (every
+        record appended so far).
+        """
+        with self.changed:
+            seq = self.written_seq if seq is None else seq
+
+            while self.applied_seq < seq:
+                self._raise_error()
+                self.changed.wait()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError('The write-ahead log stopped applying records.') from self.error
+
+    def _sync_loop(self):
+        while True:
+            with self.changed:
+                while self.durable_seq == self.written_seq and not self.closing:
+                    self.changed.wait()
+
+                if self.durable_seq == self.written_seq:
+                    return
+
+            if self.sync_interval:
+                # Gives other appends the chance to join the same fsync.
+                time.sleep(self.sync_interval)
+
+            with self.changed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.durable_seq = self.written_seq
+                self.syncs += 1
+                self.changed.notify_all()
+
+    def _apply_loop(self):
+        while True:
+            with self.changed:
+                while (not self.pending or self.pending[0][0] > self.durable_seq) and not self.closing:
+                    self.changed.wait()
+
+                if not self.pending or self.error is not None:
+                    return
+
+                if self.pending[0][0] > self.durable_seq:
+                    # Closing, the last records get synced first.
+                    self.changed.wait(0.01)
+                    continue
+
+                batch = [entry for entry in self.pending[:self.batch_size] if entry[0] <= self.durable_seq]
+
+            try:
+                self._apply_batch(batch)
+            except Exception as error:
+                with self.changed:
+                    self.error = error
+                    self.changed.notify_all()
+
+                return
+
+            with self.changed:
+                del self.pending[:len(batch)]
+                self.changed.notify_all()
+
+    def _apply_batch(self, batch):
+        self.apply([record for _, record in batch])
+
+        if hasattr(os, 'sync'):
+            # Whatever was applied has to be on disk before the checkpoint
+            # says so.
+            os.sync()
+
+        last_seq = batch[-1][0]
+        self._write_checkpoint(last_seq)
+
+        with self.changed:
+            self.applied_seq = last_seq
+            # A file only holds applied records when the next one starts
+            # at or before the first unapplied one.
+            while len(self.files) > 1 and self.files[1][0] <= last_seq + 1:
+                os.remove(os.path.join(self.path, self.files.pop(0)[1]))
+
+        return len(batch)
+
+    def close(self):
+        """
+        Waits for every record to be applied, then stops the threads.
+        """
+        with self.changed:
+            self.closing = True
+            self.changed.notify_all()
+
+        for thread in self.threads:
+            thread.join()
+
+        self.threads = []
+
+        with self.changed:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class LogWriter(object):
+    """
+    The ``BulkWriter`` of an engine with the ``wal`` on: logs every document
+    without waiting & only waits for them to be durable once per batch (of
+    ``max_docs`` documents or about ``max_bytes`` of text), or on ``flush``.
+
+    Can be used as a context manager, which flushes on exit.
+    """
+
+    def __init__(self, engine, max_docs=1000, max_bytes=64 * 1024 * 1024) -> None:
+        self.engine = engine
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.last_seq = None
+        self.buffered_docs = 0
+        self.buffered_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, doc_id, document):
+        """
+        Logs the ``document``, waiting for the batch once it's full.
+        """
+        doc_id = self.engine._validate_document(doc_id, document)
+        self.last_seq = self.engine.wal.append({'op': 'index', 'id': doc_id, 'document': document})
+        self.buffered_docs += 1
+        self.buffered_bytes += len(document.get('text', ''))
+
+        if self.buffered_docs >= self.max_docs or self.buffered_bytes >= self.max_bytes:
+            self.flush()
+
+        return True
+
+    def flush(self):
+        """
+        Waits for every logged document to be durable.
+
+        Returns the number of documents waited for.
+        """
+        flushed = self.buffered_docs
+
+        if self.last_seq is not None:
+            self.engine.wal.wait_durable(self.last_seq)
+
+        self.buffered_docs = 0
+        self.buffered_bytes = 0
+        return flushed
+
+    def close(self):
+        """
+        Same as ``flush``.
+        """
+        return self.flush()
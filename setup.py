@@ -2,7 +2,7 @@ from setuptools import setup
 
 setup(
     name="pysearch",
-    version="1.0.0",
+    version="1.1.0",
     description="A simple python search library.",
     packages=['pysearch']
 )
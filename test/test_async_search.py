@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+import os
+import shutil
+
+from pysearch import asyncSearch
+from pysearch import PySearch
+
+from .test_pysearch import EMAILS
+
+
+class AsyncPySearchTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(AsyncPySearchTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "async_search_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(AsyncPySearchTests, self).tearDown()
+
+    def test_search(self):
+        async def scenario():
+            async with asyncSearch.AsyncPySearch(self.base, max_workers=4) as engine:
+                await asyncio.gather(*[engine.index(doc_id, document) for doc_id, document in EMAILS[:3]])
+                await engine.bulk_index(EMAILS[3:])
+                self.assertTrue(await engine.delete('email_2'))
+
+                queries = ['peter', 'tps report', 'stapler', 'management bobs', '']
+                return await asyncio.gather(*[engine.search(query, limit=2) for query in queries])
+
+        results = asyncio.run(scenario())
+        engine = PySearch.PySearch(self.base)
+        self.assertEqual(engine.get_total_docs(), 3)
+        self.assertEqual(results, [engine.search(query, limit=2)
+                                   for query in ['peter', 'tps report', 'stapler', 'management bobs', '']])
+        self.assertEqual(results[0]['total_hits'], 2)
+
+    def test_load_postings_many(self):
+        engine = PySearch.PySearch(self.base)
+        engine.bulk_index(EMAILS)
+        terms = ['tps', 'pet', 'peter', 'stapl', 'xylophone']
+        groups = engine.group_terms(terms + ['tps'])
+        self.assertEqual(sorted(term for group in groups for term in group), sorted(terms))
+
+        for group in groups:
+            self.assertEqual(len(set(engine.set_name_seg(term) for term in group)), 1)
+
+        found = engine.load_postings_many(terms)
+        self.assertEqual(sorted(found), ['pet', 'peter', 'stapl', 'tps'])
+        self.assertEqual(found['peter'], engine.load_postings('peter'))
@@ -0,0 +1,52 @@
+import unittest
+import random
+
+from pysearch import booleanQuery
+
+
+class BooleanQueryTests(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(booleanQuery.parse('peter'), ('term', 'peter'))
+        self.assertEqual(booleanQuery.parse('peter reports OR stapler'),
+                         ('or', [('and', [('term', 'peter'), ('term', 'report')]), ('term', 'staple')]))
+        self.assertEqual(booleanQuery.parse('peter AND (tps OR stapler) NOT milton'),
+                         ('and', [('term', 'peter'), ('or', [('term', 'tps'), ('term', 'staple')]),
+                                  ('not', ('term', 'milton'))]))
+        self.assertEqual(booleanQuery.parse('"TPS reports" NOT NOT desk'),
+                         ('and', [('phrase', [('tps', 0), ('report', 1)]), ('term', 'desk')]))
+        # Stop words & short words are left out.
+        self.assertEqual(booleanQuery.parse('the peter OR my'), ('term', 'peter'))
+        self.assertEqual(booleanQuery.parse('the'), None)
+
+        for query in ('(peter', 'peter)', 'peter AND', 'OR peter', '"peter', 'NOT peter',
+                      'peter OR NOT milton', '(NOT peter) OR desk'):
+            self.assertRaises(ValueError, booleanQuery.parse, query)
+
+    def test_query_terms(self):
+        tree = booleanQuery.parse('peter ("tps reports" OR stapler) NOT (milton OR peter)')
+        self.assertEqual(booleanQuery.query_terms(tree), (['peter', 'tps', 'report', 'staple'], ['milton']))
+        self.assertEqual(booleanQuery.query_phrases(tree), [[('tps', 0), ('report', 1)]])
+
+    def test_cursors(self):
+        rng = random.Random(0)
+
+        for _ in range(50):
+            lists = {term: sorted(rng.sample(range(500), rng.randint(0, 300))) for term in ('aaa', 'bbb', 'ccc')}
+            sets = {term: set(ordinals) for term, ordinals in lists.items()}
+            tree = booleanQuery.parse('(aaa OR bbb) NOT ccc aaa')
+            self.assertEqual(booleanQuery.evaluate(tree, lists, []),
+                             sorted((sets['aaa'] | sets['bbb']) - sets['ccc'] & sets['aaa']))
+
+            tree = booleanQuery.parse('aaa bbb "ccc ddd"')
+            phrase = sorted(rng.sample(range(500), 50))
+            self.assertEqual(booleanQuery.evaluate(tree, lists, [phrase]),
+                             sorted(sets['aaa'] & sets['bbb'] & set(phrase)))
+
+    def test_skip_pointers(self):
+        cursor = booleanQuery.PostingsCursor(list(range(0, 1000, 2)), skip_interval=10)
+        self.assertEqual(cursor.advance(501), 502)
+        self.assertEqual(cursor.index, 251)
+        self.assertEqual(cursor.advance(100), 502)
+        self.assertEqual(cursor.advance(999), booleanQuery.END)
+        self.assertEqual(booleanQuery.PostingsCursor([]).doc, booleanQuery.END)
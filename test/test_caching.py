@@ -0,0 +1,125 @@
+import unittest
+
+from pysearch import caching
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = caching.LRUCache(2)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+
+        # ``b`` is the least recently used.
+        cache.put('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+        self.assertEqual(cache.stats(), {
+            'entries': 2,
+            'hits': 3,
+            'misses': 3,
+            'evictions': 1,
+            'expirations': 0,
+            'invalidations': 0,
+        })
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = caching.LRUCache(10, ttl=5, clock=clock)
+        cache.put('a', 1)
+
+        clock.now += 4
+        self.assertEqual(cache.get('a'), 1)
+
+        clock.now += 1
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_clear(self):
+        cache = caching.LRUCache(10)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.clear()
+
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+    def test_disabled(self):
+        cache = caching.LRUCache(0)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), None)
+
+
+class PostingsCacheTests(unittest.TestCase):
+
+    def test_approximate_postings_size(self):
+        self.assertEqual(caching.approximate_postings_size({}), 64)
+        self.assertEqual(caching.approximate_postings_size({0: [1, 2], 5: [3]}), 64 + 2 * 104 + 3 * 8)
+
+    def test_get_put(self):
+        cache = caching.PostingsCache(100)
+        segment, other_segment = object(), object()
+
+        cache.put('hello', 'a.index', segment, 'postings', 40)
+        self.assertEqual(cache.get('hello', segment), 'postings')
+
+        # Read from another version of the segment.
+        self.assertEqual(cache.get('hello', other_segment), None)
+
+        # Evicts by size, least recently used first.
+        cache.put('world', 'b.index', segment, 'postings', 40)
+        cache.get('hello', segment)
+        cache.put('truly', 'b.index', segment, 'postings', 40)
+        self.assertEqual(cache.get('world', segment), None)
+        self.assertEqual(cache.size, 80)
+
+        # Too big to cache at all.
+        cache.put('huge', 'c.index', segment, 'postings', 101)
+        self.assertEqual(len(cache), 2)
+
+        self.assertEqual(cache.stats(), {
+            'entries': 2,
+            'bytes': 80,
+            'hits': 2,
+            'misses': 2,
+            'evictions': 1,
+            'invalidations': 0,
+        })
+
+    def test_invalidate_segment(self):
+        cache = caching.PostingsCache(1000)
+        segment = object()
+        cache.put('hello', 'a.index', segment, 1, 10)
+        cache.put('world', 'b.index', segment, 2, 10)
+        cache.put('truly', 'b.index', segment, 3, 10)
+
+        cache.invalidate_segment('b.index')
+        self.assertEqual(cache.get('hello', segment), 1)
+        self.assertEqual(cache.get('world', segment), None)
+        self.assertEqual(cache.size, 10)
+        self.assertEqual(cache.per_segment, {'a.index': {'hello'}})
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+        self.assertEqual(cache.stats()['invalidations'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
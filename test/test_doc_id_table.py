@@ -0,0 +1,98 @@
+import unittest
+import os
+import shutil
+
+from pysearch import docIdTable
+
+
+class DocIdTableTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(DocIdTableTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "doc_id_table_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        os.makedirs(self.base)
+        self.path = os.path.join(self.base, 'docids')
+        self.table = docIdTable.DocIdTable(self.path)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(DocIdTableTests, self).tearDown()
+
+    def test_assign(self):
+        self.assertEqual(len(self.table), 0)
+        self.assertEqual(self.table.ordinal('email_1'), None)
+
+        self.assertEqual(self.table.assign('email_1'), 0)
+        self.assertEqual(self.table.assign('émail_2'), 1)
+        self.assertEqual(self.table.assign('email_1'), 0)
+
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(self.table.ordinal('émail_2'), 1)
+        self.assertEqual(self.table.external(0), 'email_1')
+        self.assertEqual(self.table.external(1), 'émail_2')
+
+    def test_flush(self):
+        self.table.assign('email_1')
+        self.table.assign('émail_2')
+
+        # Nothing hits the disk until the flush.
+        self.assertEqual(len(docIdTable.DocIdTable(self.path)), 0)
+        self.assertEqual(self.table.flush(), 2)
+        self.assertEqual(self.table.flush(), 0)
+
+        with open(self.path + '.dat', 'rb') as data_file:
+            self.assertEqual(data_file.read(), 'email_1émail_2'.encode('utf-8'))
+
+        self.assertEqual(os.path.getsize(self.path + '.off'), 16)
+
+        self.table.assign('email_3')
+        self.table.flush()
+
+        reopened = docIdTable.DocIdTable(self.path)
+        self.assertEqual(reopened.ids, ['email_1', 'émail_2', 'email_3'])
+        self.assertEqual(reopened.ordinal('email_3'), 2)
+
+    def test_refresh(self):
+        other = docIdTable.DocIdTable(self.path)
+        other.assign('email_1')
+        other.flush()
+
+        # Picked up before handing out the next ordinal.
+        self.assertEqual(self.table.assign('email_2'), 1)
+        self.assertEqual(self.table.ordinal('email_1'), 0)
+
+        # Not while something is waiting to be flushed.
+        other.assign('email_3')
+        self.assertEqual(other.refresh(), 0)
+        self.table.flush()
+
+        reader = docIdTable.DocIdTable(self.path)
+        self.table.assign('email_4')
+        self.table.flush()
+        self.assertEqual(reader.external(2), 'email_4')
+        self.assertEqual(reader.refresh(), 0)
+
+    def test_torn_write(self):
+        self.table.assign('email_1')
+        self.table.flush()
+
+        # Data without a matching offset & half an offset.
+        with open(self.path + '.dat', 'ab') as data_file:
+            data_file.write(b'email_')
+
+        with open(self.path + '.off', 'ab') as offsets_file:
+            offsets_file.write(b'\x01\x02')
+
+        reopened = docIdTable.DocIdTable(self.path)
+        self.assertEqual(reopened.ids, ['email_1'])
+        self.assertEqual(reopened.assign('email_2'), 1)
+        reopened.flush()
+
+        self.assertEqual(docIdTable.DocIdTable(self.path).ids, ['email_1', 'email_2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
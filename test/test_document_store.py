@@ -0,0 +1,185 @@
+import unittest
+import os
+import shutil
+
+from pysearch import docIdTable
+from pysearch import documentStore
+from pysearch import maintenance
+from pysearch import PySearch
+
+
+class PackedDocumentStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(PackedDocumentStoreTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "document_store_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        os.makedirs(self.base)
+        self.doc_ids = docIdTable.DocIdTable(os.path.join(self.base, 'docids'))
+        self.store = documentStore.PackedDocumentStore(self.base, self.doc_ids, block_size=64)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(PackedDocumentStoreTests, self).tearDown()
+
+    def reopen(self):
+        self.doc_ids.flush()
+        self.doc_ids = docIdTable.DocIdTable(os.path.join(self.base, 'docids'))
+        return documentStore.PackedDocumentStore(self.base, self.doc_ids)
+
+    def test_save(self):
+        for number in range(10):
+            self.store.save('doc_{0}'.format(number), {'text': 'déjà vu {0}'.format(number), 'number': number})
+
+        # Buffered documents can be read before they're flushed.
+        self.assertEqual(self.store.read('doc_3'), {'text': 'déjà vu 3', 'number': 3})
+        self.assertEqual(self.store.flush(), 10)
+        self.assertEqual(self.store.flush(), 0)
+
+        store = self.reopen()
+        self.assertEqual(store.codec, 'zlib')
+        self.assertEqual(store.block_size, 16 * 1024)
+        self.assertEqual(store.read('doc_7'), {'text': 'déjà vu 7', 'number': 7})
+        self.assertEqual([document['number'] for document in store.read_many(['doc_9', 'doc_0', 'doc_5', 'doc_0'])],
+                         [9, 0, 5, 0])
+        self.assertEqual([doc_id for doc_id, _ in store.iter_documents()],
+                         ['doc_{0}'.format(number) for number in range(10)])
+        # Small blocks, so the documents are spread over several of them.
+        self.assertGreater(len(set(store.table[0::3])), 1)
+
+        with self.assertRaises(KeyError):
+            store.read('missing')
+
+    def test_replace_and_delete(self):
+        self.store.save('a', {'text': 'one'})
+        self.store.save('b', {'text': 'two'})
+        self.store.flush()
+        self.store.save('a', {'text': 'three'})
+        self.store.flush()
+
+        self.assertTrue(self.store.delete('b'))
+        self.assertFalse(self.store.delete('b'))
+        self.assertFalse(self.store.delete('missing'))
+
+        store = self.reopen()
+        self.assertEqual(store.read('a'), {'text': 'three'})
+
+        with self.assertRaises(KeyError):
+            store.read('b')
+
+        size = os.path.getsize(store.pack_path)
+        old_pack = store.pack_path
+        self.assertGreater(store.compact(), 0)
+        self.assertFalse(os.path.exists(old_pack))
+        self.assertLess(os.path.getsize(store.pack_path), size)
+        self.assertEqual(store.read('a'), {'text': 'three'})
+
+        # Other instances follow the swap.
+        self.assertEqual(self.store.read('a'), {'text': 'three'})
+        self.assertEqual(list(self.reopen().iter_documents()), [('a', {'text': 'three'})])
+
+    def test_compact_batches(self):
+        # Enough documents for several batches of the copy.
+        for number in range(2500):
+            self.store.save('doc_{0}'.format(number), {'text': 'Memo number {0}.'.format(number)})
+
+        self.store.flush()
+
+        for number in range(0, 2500, 3):
+            self.store.delete('doc_{0}'.format(number))
+
+        self.assertGreater(self.store.compact(), 0)
+        store = self.reopen()
+        documents = dict(store.iter_documents())
+        self.assertEqual(len(documents), 2500 - 834)
+        self.assertEqual(documents['doc_2498'], {'text': 'Memo number 2498.'})
+        self.assertEqual(documents['doc_1024'], {'text': 'Memo number 1024.'})
+        self.assertFalse(any(int(doc_id[len('doc_'):]) % 3 == 0 for doc_id in documents))
+
+        with self.assertRaises(KeyError):
+            store.read('doc_0')
+
+    def test_codecs(self):
+        with self.assertRaises(ValueError):
+            documentStore.PackedDocumentStore(self.base, self.doc_ids, codec='lz4')
+
+        store = documentStore.PackedDocumentStore(self.base, self.doc_ids, codec='none')
+        store.save('a', {'text': 'plain'})
+        store.flush()
+        self.assertEqual(self.reopen().codec, 'none')
+
+        with open(store.pack_path, 'rb') as pack_file:
+            self.assertEqual(pack_file.read(), b'\x00\x01\x01\x04text\x07"plain"')
+
+        # Blocks written with an older codec stay readable.
+        store = documentStore.PackedDocumentStore(self.base, self.doc_ids, codec='zlib')
+        store.save('b', {'text': 'squeezed'})
+        store.flush()
+        self.assertEqual(self.reopen().read_many(['a', 'b']), [{'text': 'plain'}, {'text': 'squeezed'}])
+
+    def test_fields(self):
+        document = {'text': 'déjà vu', 'from': 'Milton', 'tags': ['red', 'stapler'], 1: None}
+        raw = documentStore.encode_record(document)
+        self.assertEqual(documentStore.decode_record(raw),
+                         {'text': 'déjà vu', 'from': 'Milton', 'tags': ['red', 'stapler'], '1': None})
+        self.assertEqual(documentStore.decode_record(raw, ['tags', 'missing', 'from']),
+                         {'tags': ['red', 'stapler'], 'from': 'Milton'})
+        # Records written before the field index are plain JSON.
+        self.assertEqual(documentStore.decode_record(b'{"text": "old", "from": "Bob"}', ['from']), {'from': 'Bob'})
+
+        self.store.save('a', document)
+        self.assertEqual(self.store.read('a', ['from']), {'from': 'Milton'})
+        self.store.flush()
+        self.assertEqual(self.reopen().read_many(['a', 'a'], fields=['text']), [{'text': 'déjà vu'}] * 2)
+
+
+class PackedEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(PackedEngineTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "packed_engine_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(PackedEngineTests, self).tearDown()
+
+    def test_search(self):
+        engine = PySearch.PySearch(self.base, document_store='packed')
+        engine.index('email_1', {'text': 'Peter, I need those TPS reports.', 'from': 'Lumbergh'})
+        engine.bulk_index([
+            ('email_2', {'text': 'My red stapler has gone missing.'}),
+            ('email_3', {'text': 'Peter, come in on Saturday.'}),
+        ])
+        engine.delete('email_3')
+
+        # Picked up from disk.
+        engine = PySearch.PySearch(self.base)
+        self.assertEqual(engine.documents.kind, 'packed')
+        self.assertEqual(os.listdir(engine.docs_path).count('store.json'), 1)
+        results = engine.search('peter')
+        self.assertEqual([(result['id'], result['from']) for result in results['results']],
+                         [('email_1', 'Lumbergh')])
+
+        with self.assertRaises(ValueError):
+            engine.use_document_store('files')
+
+    def test_pack_documents(self):
+        engine = PySearch.PySearch(self.base)
+        engine.index('email_1', {'text': 'Peter, I need those TPS reports.'})
+        engine.index('email_2', {'text': 'My red stapler has gone missing.'})
+
+        with self.assertRaises(ValueError):
+            engine.use_document_store('packed')
+
+        self.assertEqual(maintenance.pack_documents(self.base), 2)
+        self.assertEqual(sorted(os.listdir(engine.docs_path)), ['docs-0.off', 'docs-0.pack', 'store.json'])
+
+        engine = PySearch.PySearch(self.base)
+        self.assertEqual(engine.documents.kind, 'packed')
+        self.assertEqual(engine.search('stapler')['results'][0]['id'], 'email_2')
+        self.assertEqual(maintenance.compact_documents(self.base), 0)
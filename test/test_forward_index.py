@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+
+from pysearch import forwardIndex
+
+
+class ForwardIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(ForwardIndexTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "forward_index_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        os.makedirs(self.base)
+        self.path = os.path.join(self.base, 'forward')
+        self.forward = forwardIndex.ForwardIndex(self.path)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(ForwardIndexTests, self).tearDown()
+
+    def test_set(self):
+        self.assertEqual(self.forward.terms(0), None)
+        self.assertFalse(0 in self.forward)
+
+        self.forward.set(0, ['pet', 'peter', 'déjà'])
+        self.forward.set(2, [])
+        self.assertEqual(self.forward.terms(0), ['déjà', 'pet', 'peter'])
+        self.assertEqual(self.forward.flush(), 2)
+        self.assertEqual(self.forward.flush(), 0)
+
+        self.assertEqual(len(self.forward), 2)
+        self.assertEqual(self.forward.terms(0), ['déjà', 'pet', 'peter'])
+        self.assertEqual(self.forward.terms(1), None)
+        self.assertEqual(self.forward.terms(2), [])
+        self.assertTrue(2 in self.forward)
+
+        # Replaced versions get appended & their offsets patched in place.
+        self.forward.set(0, ['memo'])
+        self.forward.remove(2)
+        self.forward.flush()
+        self.assertEqual(os.path.getsize(self.path + '.off'), 3 * 16)
+
+        reloaded = forwardIndex.ForwardIndex(self.path)
+        self.assertEqual(len(reloaded), 1)
+        self.assertEqual(reloaded.terms(0), ['memo'])
+        self.assertEqual(reloaded.terms(2), None)
+
+    def test_refresh(self):
+        other = forwardIndex.ForwardIndex(self.path)
+        other.set(3, ['tps'])
+        other.flush()
+
+        self.assertEqual(self.forward.terms(3), None)
+        self.assertTrue(self.forward.refresh())
+        self.assertEqual(self.forward.terms(3), ['tps'])
+        self.assertFalse(self.forward.refresh())
+
+        # Pending changes win.
+        self.forward.set(4, ['memo'])
+        other.remove(3)
+        other.flush()
+        self.assertFalse(self.forward.refresh())
+        self.assertEqual(self.forward.terms(3), ['tps'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import json
+import os
+import shutil
+import time
+
+from pysearch import indexStats
+from pysearch import scoring
+
+
+class IndexStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(IndexStatsTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "index_stats_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        os.makedirs(self.base)
+        self.stats_path = os.path.join(self.base, 'stats.json')
+        self.lengths_path = os.path.join(self.base, 'doclengths')
+        self.stats = self.make_stats()
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(IndexStatsTests, self).tearDown()
+
+    def make_stats(self, **options):
+        return indexStats.IndexStats(self.stats_path, self.lengths_path, '1.1.0', **options)
+
+    def read_json(self):
+        with open(self.stats_path, 'r') as stats_file:
+            return json.load(stats_file)
+
+    def test_commit(self):
+        self.assertEqual(self.stats.as_dict(),
+                         {'version': '1.1.0', 'total_docs': 0, 'generation': 0, 'total_length': 0})
+        self.assertEqual(self.stats.average_length(), 0.0)
+
+        self.stats.add_document(0, 10)
+        self.stats.add_document(1, 20)
+        self.assertFalse(os.path.exists(self.stats_path))
+
+        self.stats.commit()
+        self.assertEqual(self.read_json(), {'version': '1.1.0', 'total_docs': 2, 'generation': 1, 'total_length': 30})
+        self.assertEqual(os.path.getsize(self.lengths_path), 8)
+        self.assertEqual(self.stats.average_length(), 15.0)
+        self.assertEqual(self.stats.doc_length(1), 20)
+        self.assertEqual(self.stats.doc_length(5), 0)
+
+        # Re-indexed documents get patched in place.
+        self.stats.add_document(0, 4)
+        self.stats.add_document(3, 6)
+        self.stats.commit()
+
+        reloaded = self.make_stats()
+        self.assertEqual(list(reloaded.doc_lengths), [4, 20, 0, 6])
+        self.assertEqual(reloaded.total_length, 30)
+        self.assertEqual(reloaded.generation, 2)
+
+    def test_norms(self):
+        self.stats.add_document(0, 10)
+        self.stats.add_document(1, 200)
+        self.stats.commit()
+        self.assertEqual(list(self.stats.doc_norms), [10, scoring.encode_norm(200)])
+        self.assertEqual(os.path.getsize(self.lengths_path + '.norms'), 2)
+
+        # Written before norms were, they come from the lengths.
+        os.remove(self.lengths_path + '.norms')
+        reloaded = self.make_stats()
+        self.assertEqual(list(reloaded.doc_norms), [10, scoring.encode_norm(200)])
+
+        reloaded.add_document(0, 5, replace=True)
+        reloaded.commit()
+        self.assertEqual(list(self.make_stats().doc_norms), [5, scoring.encode_norm(200)])
+
+        reloaded.set_lengths([3, 4, 5])
+        reloaded.commit()
+        self.assertEqual(list(self.make_stats().doc_norms), [3, 4, 5])
+        self.assertEqual(self.make_stats().total_length, 12)
+
+    def test_refresh(self):
+        other = self.make_stats()
+        self.assertFalse(self.stats.refresh())
+
+        other.add_document(0, 10)
+        other.commit()
+
+        self.assertTrue(self.stats.refresh())
+        self.assertEqual(self.stats.total_docs, 1)
+        self.assertEqual(list(self.stats.doc_lengths), [10])
+        self.assertFalse(self.stats.refresh())
+
+        # Unflushed changes win.
+        self.stats.add_document(1, 5)
+        other.add_document(1, 7)
+        other.commit()
+        self.assertFalse(self.stats.refresh())
+        self.assertEqual(self.stats.doc_length(1), 5)
+
+    def test_flush_interval(self):
+        stats = self.make_stats(flush_interval=60)
+        stats.last_flush = time.monotonic()
+        stats.add_document(0, 10)
+        stats.commit()
+        stats.commit()
+
+        # Held in memory until the timer fires or it's flushed.
+        self.assertFalse(os.path.exists(self.stats_path))
+        self.assertTrue(stats.timer is not None)
+        self.assertTrue(stats.flush())
+        self.assertEqual(stats.timer, None)
+        self.assertEqual(self.read_json()['generation'], 2)
+        self.assertFalse(stats.flush())
+
+        stats = self.make_stats(flush_interval=0.01)
+        stats.last_flush = time.monotonic()
+        stats.add_document(1, 10)
+        stats.commit()
+        stats.timer.join()
+        self.assertEqual(self.read_json()['total_docs'], 2)
+
+    def test_update(self):
+        with open(self.stats_path, 'w') as stats_file:
+            stats_file.write('{"version": "1.0.0", "total_docs": 25}')
+
+        stats = self.make_stats()
+        self.assertEqual(stats.file_version, '1.0.0')
+        self.assertEqual(stats.total_docs, 25)
+
+        stats.update({'total_docs': 3})
+        self.assertEqual(self.read_json(), {'version': '1.1.0', 'total_docs': 3, 'generation': 0, 'total_length': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
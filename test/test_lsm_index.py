@@ -0,0 +1,163 @@
+import unittest
+import os
+import shutil
+
+from pysearch import PySearch
+
+from .test_pysearch import EMAILS
+
+
+class LSMIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(LSMIndexTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "lsm_index_tests")
+        self.buckets_base = os.path.join(os.getcwd(), "lsm_index_tests_buckets")
+        shutil.rmtree(self.base, ignore_errors=True)
+        shutil.rmtree(self.buckets_base, ignore_errors=True)
+        self.engine = PySearch.PySearch(self.base, layout='lsm')
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        shutil.rmtree(self.buckets_base, ignore_errors=True)
+        super(LSMIndexTests, self).tearDown()
+
+    def segment_files(self):
+        return sorted(name for name in os.listdir(self.engine.lsm_path) if name.endswith('.index'))
+
+    def test_index(self):
+        self.assertEqual(self.engine.load_segment('peter'), 'segment not exist')
+
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        buckets = PySearch.PySearch(self.buckets_base)
+        buckets.bulk_index(EMAILS)
+
+        # One segment per commit, nothing in the buckets.
+        self.assertEqual(self.segment_files(), [
+            '0000000001-0000000001.index', '0000000002-0000000002.index',
+            '0000000003-0000000003.index', '0000000004-0000000004.index',
+        ])
+        self.assertEqual([name for name in os.listdir(self.engine.index_path) if name.endswith('.index')], [])
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0]})
+        self.assertEqual(self.engine.load_segment('nope'), 'Not Found')
+
+        for query in ('Peter', 'tps report', 'management', 'stapler missing'):
+            self.assertEqual(self.engine.search(query), buckets.search(query))
+
+        # The layout sticks.
+        reopened = PySearch.PySearch(self.base)
+        self.assertTrue(reopened.lsm is not None)
+        self.assertEqual(reopened.search('Peter'), self.engine.search('Peter'))
+        self.assertRaises(ValueError, PySearch.PySearch, self.base, layout='buckets')
+        self.assertRaises(ValueError, buckets.use_lsm)
+
+    def test_updates_and_deletes(self):
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        # Re-indexing hides the older postings of the document.
+        self.engine.index('email_1', {'text': 'Peter, the printer is jammed.'})
+        self.assertEqual(self.engine.load_segment('tps'), 'Not Found')
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0]})
+        self.assertEqual(self.engine.search('printer')['results'][0]['id'], 'email_1')
+
+        # As do tombstones.
+        self.assertEqual(self.engine.lsm.delete([2, 2]), 1)
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0]})
+        self.assertEqual(self.engine.search('saturday')['total_hits'], 0)
+
+        # Optimizing drops them from disk.
+        self.assertTrue(self.engine.optimize())
+        self.assertEqual(self.segment_files(), ['0000000001-0000000005.index'])
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0]})
+        self.assertEqual(self.engine.load_segment('saturd'), 'Not Found')
+        self.assertEqual(self.engine.load_segment('stapl'), {1: [3]})
+        self.assertFalse(self.engine.optimize())
+
+    def test_delete(self):
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        self.assertTrue(self.engine.delete('email_3'))
+        self.assertFalse(self.engine.delete('email_3'))
+        self.assertEqual(self.engine.get_total_docs(), 3)
+        self.assertEqual(self.engine.lsm.owner(2), 0)
+        self.assertEqual(self.engine.search('Peter')['total_hits'], 1)
+
+        # Re-indexing a document with the same text doesn't count it twice.
+        self.engine.index(*EMAILS[0])
+        self.assertEqual(self.engine.get_total_docs(), 3)
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0]})
+
+    def test_delete_and_optimize(self):
+        for doc_id, document in EMAILS[:2]:
+            self.engine.index(doc_id, document)
+
+        self.assertTrue(self.engine.optimize())
+        self.assertEqual(len(self.segment_files()), 1)
+
+        # The single segment is merged into a file of the same name.
+        self.engine.delete('email_1')
+        self.assertTrue(self.engine.optimize())
+        self.assertEqual(self.segment_files(), [segment['name'] for segment in self.engine.lsm.segments])
+        self.assertEqual(self.engine.search('peter')['total_hits'], 0)
+        self.assertEqual(self.engine.search('stapler')['total_hits'], 1)
+
+        self.engine.index(*EMAILS[2])
+        self.assertTrue(self.engine.optimize())
+        self.assertEqual(self.engine.search('peter')['total_hits'], 1)
+
+    def test_tiered_merges(self):
+        # A single doc makes a 114 byte segment, three of them merged 150
+        # bytes (still tier 0) & five 186 bytes (tier 1).
+        self.engine.use_lsm(merge_factor=3, min_segment_bytes=150)
+
+        for number in range(10):
+            self.engine.index('email_{0}'.format(number), {'text': 'Memo number {0}'.format(number)})
+
+        self.assertEqual(self.segment_files(), ['0000000001-0000000005.index', '0000000006-0000000010.index'])
+        self.assertEqual([self.engine.lsm.tier(segment) for segment in self.engine.lsm.segments], [1, 1])
+        self.assertEqual(sorted(self.engine.load_segment('memo')), list(range(10)))
+
+        for number in range(10, 14):
+            self.engine.index('email_{0}'.format(number), {'text': 'Memo number {0}'.format(number)})
+
+        # Tier 1 isn't full yet.
+        self.assertEqual(self.segment_files(), [
+            '0000000001-0000000005.index', '0000000006-0000000010.index',
+            '0000000011-0000000013.index', '0000000014-0000000014.index',
+        ])
+
+        self.engine.index('email_14', {'text': 'Memo number 14'})
+        self.assertEqual(self.segment_files(), ['0000000001-0000000015.index'])
+        self.assertEqual(sorted(self.engine.load_segment('memo')), list(range(15)))
+
+    def test_other_instances(self):
+        reader = PySearch.PySearch(self.base)
+        self.assertEqual(reader.search('Peter')['total_hits'], 0)
+
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        self.assertEqual(reader.search('Peter')['total_hits'], 2)
+
+        # Merging segments away under a reader.
+        self.engine.optimize()
+        self.assertEqual(reader.load_segment('peter'), {0: [0], 2: [0]})
+
+    def test_bulk_and_parallel(self):
+        self.engine.bulk_index(EMAILS[:2])
+        self.engine.parallel_index(EMAILS[2:], workers=2, shard_size=1)
+
+        self.assertEqual(len(self.segment_files()), 2)
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0]})
+        self.assertEqual(self.engine.search('Peter')['total_hits'], 2)
+        self.assertEqual(os.listdir(self.engine.temp_path), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
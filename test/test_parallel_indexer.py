@@ -0,0 +1,135 @@
+import unittest
+import os
+import shutil
+
+from pysearch import PySearch
+from pysearch import segmentFormat
+
+from .test_pysearch import EMAILS
+
+
+class ParallelIndexerTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(ParallelIndexerTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "parallel_indexer_tests")
+        self.serial_base = os.path.join(os.getcwd(), "parallel_indexer_tests_serial")
+        shutil.rmtree(self.base, ignore_errors=True)
+        shutil.rmtree(self.serial_base, ignore_errors=True)
+        self.engine = PySearch.PySearch(self.base)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        shutil.rmtree(self.serial_base, ignore_errors=True)
+        super(ParallelIndexerTests, self).tearDown()
+
+    def test_parallel_index(self):
+        self.assertEqual(self.engine.parallel_index(EMAILS, workers=2, shard_size=1), 4)
+
+        serial = PySearch.PySearch(self.serial_base)
+        serial.bulk_index(EMAILS)
+
+        self.assertEqual(self.engine.get_total_docs(), 4)
+        self.assertEqual(self.engine.get_generation(), 1)
+        self.assertEqual(list(self.engine.stats.doc_lengths), list(serial.stats.doc_lengths))
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0]})
+        self.assertEqual(self.engine.load_document('email_2'), EMAILS[1][1])
+
+        for query in ('Peter', 'tps report', 'management', 'stapler missing'):
+            self.assertEqual(self.engine.search(query), serial.search(query))
+
+        # The same segments, byte for byte.
+        self.assertEqual(sorted(os.listdir(self.engine.index_path)), sorted(os.listdir(serial.index_path)))
+
+        for filename in os.listdir(serial.index_path):
+            with open(os.path.join(self.engine.index_path, filename), 'rb') as parallel_file:
+                with open(os.path.join(serial.index_path, filename), 'rb') as serial_file:
+                    self.assertEqual(parallel_file.read(), serial_file.read())
+
+        # The worker segments are cleaned up.
+        self.assertEqual(os.listdir(self.engine.temp_path), [])
+
+    def test_merge_into_existing(self):
+        self.engine.index(*EMAILS[0])
+        self.engine.parallel_index(EMAILS[1:] + [('email_5', {'text': 'Peter, the reports.'})], workers=3, shard_size=2)
+
+        self.assertEqual(self.engine.get_total_docs(), 5)
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0], 4: [0]})
+        self.assertEqual(self.engine.search('Peter')['total_hits'], 3)
+
+        self.assertEqual(self.engine.parallel_index([], workers=2), 0)
+
+        with self.assertRaises(KeyError):
+            self.engine.parallel_index([('bad', {'title': 'no text'})], workers=2)
+
+    def test_reindex(self):
+        self.engine.bulk_index(EMAILS)
+        self.engine.parallel_index([('email_1', {'text': 'Peter, the printer is jammed.'})], workers=2)
+
+        self.assertEqual(self.engine.get_total_docs(), 4)
+        self.assertEqual(self.engine.stats.total_length, 36)
+        self.assertEqual(self.engine.load_segment('tps'), 'Not Found')
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0]})
+        self.assertEqual(self.engine.forward.terms(0), ['jam', 'jamm', 'jamme', 'jammed', 'pet', 'pete', 'peter',
+                                                        'pri', 'prin', 'print', 'printe'])
+
+        self.assertTrue(self.engine.delete('email_1'))
+        self.assertEqual(self.engine.search('printer')['total_hits'], 0)
+
+    def test_repeated_doc_id(self):
+        documents = EMAILS + [('email_1', {'text': 'Peter, the printer is jammed.'})]
+
+        with self.assertRaises(ValueError):
+            self.engine.parallel_index(documents, workers=2, shard_size=2)
+
+        # Nothing got in, so the run can be retried without the repeat.
+        self.assertEqual(self.engine.get_total_docs(), 0)
+        self.assertEqual(self.engine.search('peter')['total_hits'], 0)
+        self.assertEqual(self.engine.parallel_index(EMAILS, workers=2, shard_size=2), 4)
+        self.assertEqual(self.engine.get_total_docs(), 4)
+        self.assertTrue(self.engine.delete('email_1'))
+        self.assertEqual(self.engine.search('peter')['total_hits'], 1)
+
+    def test_failed_run_writes_nothing(self):
+        for document_store in ('files', 'packed'):
+            base = os.path.join(self.base, document_store)
+            engine = PySearch.PySearch(base, document_store=document_store)
+            engine.index('a', {'text': 'An apple.'})
+
+            # Fails on the repeated doc id, after a shard with ``a`` in it.
+            documents = [('a', {'text': 'A zebra.'}), ('c', {'text': 'A cat.'}),
+                         ('b', {'text': 'A bee.'}), ('b', {'text': 'A bear.'})]
+
+            with self.assertRaises(ValueError):
+                engine.parallel_index(documents, workers=2, shard_size=1)
+
+            with self.assertRaises(KeyError):
+                engine.parallel_index(documents[:2] + [('d', {'title': 'no text'})], workers=2, shard_size=1)
+
+            for engine in (engine, PySearch.PySearch(base)):
+                self.assertEqual(engine.load_document('a'), {'text': 'An apple.'})
+                self.assertEqual(engine.search('apple')['results'][0]['id'], 'a')
+                self.assertEqual(engine.search('zebra')['total_hits'], 0)
+                self.assertEqual(engine.get_total_docs(), 1)
+                self.assertEqual(len(engine.doc_ids), 1)
+
+    def test_legacy_segments(self):
+        # A legacy segment refers to a doc id without an ordinal, so it's
+        # merged by the parent.
+        seg_name = self.engine.set_name_seg('peter')
+
+        with open(seg_name, 'w') as seg_file:
+            seg_file.write('peter\t{"email_0": [3]}\n')
+
+        self.engine.parallel_index(EMAILS, workers=2)
+
+        self.assertTrue(segmentFormat.is_binary_segment(seg_name))
+        self.assertEqual(self.engine.doc_ids.external(0), 'email_1')
+        self.assertEqual(self.engine.doc_ids.external(4), 'email_0')
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0], 4: [3]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import random
+
+from pysearch import positional
+from pysearch import segmentFormat
+
+
+class PositionalTests(unittest.TestCase):
+
+    def test_parse_phrases(self):
+        self.assertEqual(positional.token_terms('the TPS reports, on my desk'),
+                         [('tps', 0), ('report', 1), ('desk', 3)])
+        self.assertEqual(positional.parse_phrases('"TPS reports" desk "a" "stapler"'),
+                         [[('tps', 0), ('report', 1)], [('staple', 0)]])
+        self.assertEqual(positional.parse_phrases('no phrases'), [])
+
+    def test_intersect(self):
+        rng = random.Random(0)
+
+        for _ in range(50):
+            lists = [sorted(rng.sample(range(200), rng.randint(0, 120))) for _ in range(rng.randint(1, 4))]
+            expected = sorted(set(lists[0]).intersection(*lists[1:]))
+            self.assertEqual(positional.intersect(lists), expected)
+
+        self.assertEqual(positional.intersect([]), [])
+        self.assertEqual(positional.restrict([1, 3, 5, 7], [2, 4, 6, 8], [0, 3, 7, 9]), ([3, 7], [4, 8]))
+
+    def test_phrase_match(self):
+        self.assertTrue(positional.phrase_match([[0, 4, 9], [5, 12]], [0, 1]))
+        self.assertFalse(positional.phrase_match([[0, 4, 9], [3, 12]], [0, 1]))
+        # Out of order.
+        self.assertFalse(positional.phrase_match([[5], [4]], [0, 1]))
+        # With a stop word (or short token) in between.
+        self.assertTrue(positional.phrase_match([[1, 7], [3, 9], [10]], [0, 2, 3]))
+        self.assertFalse(positional.phrase_match([[1, 7], [3, 9], [11]], [0, 2, 3]))
+
+        rng = random.Random(1)
+
+        for _ in range(100):
+            positions = [sorted(rng.sample(range(30), rng.randint(1, 10))) for _ in range(3)]
+            offsets = [0, 1, 2]
+            expected = any(all(start + offset in token_positions
+                               for token_positions, offset in zip(positions, offsets))
+                           for start in positions[0])
+            self.assertEqual(positional.phrase_match(positions, offsets), expected)
+
+    def test_min_span(self):
+        self.assertEqual(positional.min_span([[0, 10], [4, 11], [20]]), 10)
+        self.assertEqual(positional.min_span([[3], [3]]), 0)
+        self.assertEqual(positional.proximity_boost([[4], [5]], 2.0), 2.0)
+        self.assertEqual(positional.proximity_boost([[4], [8]], 2.0), 0.5)
+        self.assertEqual(positional.proximity_boost([[4]], 2.0), 0.0)
+
+    def test_decode_positions(self):
+        postings = {1: [0, 4], 5: [2], 9: [1, 3, 8]}
+        raw = segmentFormat.encode_postings(postings)
+        self.assertEqual(segmentFormat.decode_positions(raw, [1, 9, 12]), {1: [0, 4], 9: [1, 3, 8]})
+        self.assertEqual(segmentFormat.decode_positions(raw, []), {})
@@ -0,0 +1,360 @@
+import unittest
+import os
+import shutil
+
+from pysearch import PySearch
+from pysearch import maintenance
+
+
+EMAILS = [
+    ('email_1', {'text': "Peter,\n\nI'm going to need those TPS reports on my desk first thing tomorrow! "
+                         "And clean up your desk!\n\nLumbergh"}),
+    ('email_2', {'text': 'Everyone,\n\nM-m-m-m-my red stapler has gone missing. '
+                         'H-h-has a-an-anyone seen it?\n\nMilton'}),
+    ('email_3', {'text': "Peter,\n\nYeah, I'm going to need you to come in on Saturday. "
+                         "Don't forget those reports.\n\nLumbergh"}),
+    ('email_4', {'text': 'How do you feel about becoming Management?\n\nThe Bobs'}),
+]
+
+
+class PySearchTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(PySearchTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "pysearch_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        self.engine = PySearch.PySearch(self.base)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(PySearchTests, self).tearDown()
+
+    def test_index(self):
+        for doc_id, document in EMAILS:
+            self.assertTrue(self.engine.index(doc_id, document))
+
+        self.assertEqual(self.engine.get_total_docs(), 4)
+        self.assertEqual(self.engine.stats.total_length, 51)
+        self.assertEqual(list(self.engine.stats.doc_lengths), [18, 11, 14, 8])
+        self.assertEqual(self.engine.read_stats(), {'version': '1.1.0', 'total_docs': 4, 'generation': 4,
+                                                    'total_length': 51,
+                                                    'bucketing': {'strategy': 'crc32', 'buckets': 1024}})
+        self.assertEqual(sorted(self.engine.load_segment('peter').keys()), [0, 2])
+        self.assertEqual(self.engine.doc_ids.external(2), 'email_3')
+
+        # Re-indexing keeps the ordinal & isn't counted twice.
+        self.engine.index('email_3', EMAILS[2][1])
+        self.assertEqual(len(self.engine.doc_ids), 4)
+        self.assertEqual(self.engine.get_total_docs(), 4)
+        self.assertEqual(self.engine.stats.total_length, 51)
+
+        self.assertRaises(AttributeError, self.engine.index, 'bad', 'not a dict')
+        self.assertRaises(KeyError, self.engine.index, 'bad', {'title': 'no text'})
+
+    def test_search(self):
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        results = self.engine.search('Peter')
+        self.assertEqual(results['total_hits'], 2)
+        self.assertEqual(sorted([res['id'] for res in results['results']]), ['email_1', 'email_3'])
+
+        results = self.engine.search('tps report')
+        self.assertEqual(results['total_hits'], 2)
+        self.assertEqual(results['results'][0]['id'], 'email_1')
+        self.assertEqual(results['results'][0]['text'], EMAILS[0][1]['text'])
+
+        # Unknown terms just don't match.
+        self.assertEqual(self.engine.search('xylophone'), {'total_hits': 0, 'total_hits_exact': True, 'results': []})
+        self.assertEqual(self.engine.search('stapler xylophone')['total_hits'], 1)
+
+    def test_search_paging(self):
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        everything = self.engine.search('peter stapler management', limit=10)
+        self.assertEqual(everything['total_hits'], 4)
+        ranked = [res['id'] for res in everything['results']]
+        self.assertEqual(len(ranked), 4)
+
+        page = self.engine.search('peter stapler management', offset=1, limit=2)
+        self.assertEqual(page['total_hits'], 4)
+        self.assertEqual([res['id'] for res in page['results']], ranked[1:3])
+
+        # Pruning returns the same page.
+        pruned = self.engine.search('peter stapler management', offset=1, limit=2, prune=True)
+        self.assertEqual(pruned['results'], page['results'])
+        self.assertTrue(pruned['total_hits'] <= 4)
+        self.assertEqual(pruned['total_hits_exact'], pruned['total_hits'] == 4)
+
+        self.assertEqual(self.engine.search('peter', limit=0)['results'], [])
+
+    def test_search_fields(self):
+        engine = PySearch.PySearch(self.base, cache_size=10, document_store='packed')
+        engine.index('email_1', dict(EMAILS[0][1], author='Lumbergh', to=['Peter']))
+        engine.index('email_3', dict(EMAILS[2][1], author='Lumbergh'))
+        everything = engine.search('peter')
+
+        projected = engine.search('peter', fields=['to', 'author'])
+        self.assertEqual(projected['total_hits'], 2)
+        self.assertEqual(projected['results'], [
+            {'author': 'Lumbergh', 'to': ['Peter'], 'id': 'email_1', 'score': everything['results'][0]['score']},
+            {'author': 'Lumbergh', 'id': 'email_3', 'score': everything['results'][1]['score']},
+        ])
+
+        lazy = engine.search('peter', lazy=True)['results']
+        self.assertEqual(lazy[0].id, 'email_1')
+        self.assertEqual(lazy[0].loaded, {})
+        self.assertEqual(lazy[0]['author'], 'Lumbergh')
+        self.assertEqual(lazy[0].loaded, {'author': 'Lumbergh'})
+        self.assertEqual([result.to_dict() for result in lazy], everything['results'])
+
+        # Cached, but still lazy.
+        lazy = engine.search('peter', lazy=True, fields=['to'])['results']
+        self.assertEqual(engine.search('peter', lazy=True, fields=['to'])['results'][0]['to'], ['Peter'])
+        self.assertEqual(engine.cache_stats()['hits'], 1)
+
+        with self.assertRaises(KeyError):
+            lazy[0]['author']
+
+        with self.assertRaises(KeyError):
+            lazy[1]['to']
+
+    def test_search_many(self):
+        self.engine.bulk_index(EMAILS)
+        engine = PySearch.PySearch(self.base, cache_size=10)
+        queries = ['peter', 'tps report', 'stapler', 'peter', '', 'xylophone', 'management bobs']
+        expected = [self.engine.search(query, limit=2, fields=['text']) for query in queries]
+        engine.search('stapler', limit=2, fields=['text'])
+
+        output = engine.search_many(queries, limit=2, fields=['text'], batch_size=4)
+        self.assertEqual(output['results'], expected)
+        self.assertEqual([batch['queries'] for batch in output['batches']], [4, 3])
+        # 'stapler' came from the result cache, the others share their documents.
+        self.assertEqual(output['batches'][0]['documents'], 2)
+        self.assertTrue(output['batches'][0]['terms'] < sum(len(query) for query in queries[:4]))
+        self.assertEqual(sorted(output['batches'][0]['seconds']), ['documents', 'postings', 'scoring', 'total'])
+
+        # Results are independent copies.
+        output['results'][0]['results'][0]['text'] = 'tampered'
+        self.assertEqual(output['results'][3], expected[3])
+
+    def test_search_phrases(self):
+        self.engine.bulk_index(EMAILS)
+
+        results = self.engine.search('"TPS reports"')
+        self.assertEqual(results['total_hits'], 1)
+        self.assertEqual([res['id'] for res in results['results']], ['email_1'])
+        self.assertEqual(self.engine.search('"reports TPS"')['total_hits'], 0)
+        self.assertEqual(self.engine.search('"those reports" peter')['total_hits'], 1)
+        self.assertEqual(self.engine.search('"xylophone reports"')['total_hits'], 0)
+
+        # Both have the words, the one with them together comes first.
+        plain = self.engine.search('need reports')
+        boosted = self.engine.search('need reports', proximity=5.0)
+        self.assertEqual(boosted['total_hits'], plain['total_hits'])
+        self.assertEqual([res['id'] for res in boosted['results']], ['email_1', 'email_3'])
+        self.assertTrue(boosted['results'][0]['score'] > plain['results'][0]['score'])
+        self.assertRaises(ValueError, self.engine.search, 'need reports', prune=True, proximity=1.0)
+
+        queries = ['"TPS reports"', 'need reports', '"those reports" peter']
+        expected = [self.engine.search(query, proximity=5.0) for query in queries]
+        self.assertEqual(self.engine.search_many(queries, proximity=5.0)['results'], expected)
+
+    def test_search_boolean(self):
+        self.engine.bulk_index(EMAILS)
+
+        def ids(query):
+            return sorted(res['id'] for res in self.engine.search(query, boolean=True)['results'])
+
+        self.assertEqual(ids('peter AND reports'), ['email_1', 'email_3'])
+        self.assertEqual(ids('peter NOT desk'), ['email_3'])
+        self.assertEqual(ids('(stapler OR management) NOT milton'), ['email_4'])
+        self.assertEqual(ids('"tps reports" OR stapler'), ['email_1', 'email_2'])
+        self.assertEqual(ids('peter xylophone'), [])
+        self.assertEqual(self.engine.search('the', boolean=True)['total_hits'], 0)
+
+        # Excluded terms don't count towards the score.
+        scores = {res['id']: res['score'] for res in self.engine.search('peter')['results']}
+        self.assertEqual(self.engine.search('peter NOT desk', boolean=True)['results'][0]['score'],
+                         scores['email_3'])
+        self.assertRaises(ValueError, self.engine.search, 'NOT peter', boolean=True)
+        self.assertRaises(ValueError, self.engine.search, 'peter', boolean=True, proximity=1.0)
+
+        queries = ['peter AND reports', 'peter NOT desk', '"tps reports" OR stapler']
+        expected = [self.engine.search(query, boolean=True) for query in queries]
+        self.assertEqual(self.engine.search_many(queries, boolean=True)['results'], expected)
+        self.assertEqual([self.engine.search(query, boolean=True, prune=True)['results'] for query in queries],
+                         [result['results'] for result in expected])
+
+    def test_result_cache(self):
+        engine = PySearch.PySearch(self.base, cache_size=10)
+        self.assertEqual(self.engine.cache_stats(), None)
+
+        for doc_id, document in EMAILS[:2]:
+            engine.index(doc_id, document)
+
+        first = engine.search('Peter')
+        self.assertEqual(first['total_hits'], 1)
+        self.assertEqual(engine.cache_stats()['misses'], 1)
+
+        # Same terms, same page.
+        first['results'].append('tampered')
+        self.assertEqual(engine.search('peter, PETER'), engine.search('Peter'))
+        self.assertEqual(engine.search('Peter')['total_hits'], 1)
+        self.assertEqual(engine.cache_stats()['hits'], 3)
+
+        # A different page is a different entry.
+        engine.search('Peter', limit=1)
+        self.assertEqual(engine.cache_stats()['misses'], 2)
+
+        # Indexing (even through another instance) makes the entries stale.
+        self.assertEqual(self.engine.get_generation(), 2)
+        self.engine.index(*EMAILS[2])
+        self.assertEqual(self.engine.get_generation(), 3)
+        self.assertEqual(engine.search('Peter')['total_hits'], 2)
+        self.assertEqual(engine.cache_stats()['invalidations'], 2)
+
+    def test_bulk_index(self):
+        self.assertEqual(self.engine.bulk_index(EMAILS), 4)
+        self.assertEqual(self.engine.get_total_docs(), 4)
+
+        other = PySearch.PySearch(os.path.join(self.base, 'per_doc'))
+
+        for doc_id, document in EMAILS:
+            other.index(doc_id, document)
+
+        for query in ['Peter', 'tps report', 'stapler', 'management bobs']:
+            self.assertEqual(self.engine.search(query), other.search(query))
+
+    def test_writer_flushes(self):
+        with self.engine.writer(max_docs=2) as writer:
+            writer.add('email_1', EMAILS[0][1])
+            self.assertEqual(writer.buffered_docs, 1)
+            self.assertEqual(self.engine.get_total_docs(), 0)
+
+            writer.add('email_2', EMAILS[1][1])
+            self.assertEqual(writer.buffered_docs, 0)
+            self.assertEqual(self.engine.get_total_docs(), 2)
+
+            writer.add('email_3', EMAILS[2][1])
+
+        self.assertEqual(self.engine.get_total_docs(), 3)
+        self.assertEqual(self.engine.search('Peter')['total_hits'], 2)
+
+        with self.engine.writer(max_bytes=1) as writer:
+            writer.add('email_4', EMAILS[3][1])
+            self.assertEqual(writer.buffered_docs, 0)
+
+        self.assertEqual(self.engine.get_total_docs(), 4)
+
+    def test_reindex(self):
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        self.engine.index('email_1', {'text': 'Peter, the printer is jammed.'})
+
+        # The postings of terms the document lost are gone, the others are
+        # replaced.
+        self.assertEqual(self.engine.get_total_docs(), 4)
+        self.assertEqual(self.engine.stats.total_length, 36)
+        self.assertEqual(self.engine.load_segment('tps'), 'Not Found')
+        self.assertEqual(self.engine.load_segment('desk'), 'Not Found')
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0]})
+        self.assertEqual(self.engine.load_segment('printe'), {0: [1]})
+        self.assertEqual(self.engine.search('tps report')['total_hits'], 1)
+        self.assertEqual(self.engine.search('printer')['results'][0]['id'], 'email_1')
+
+    def test_delete(self):
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        self.assertTrue(self.engine.delete('email_3'))
+        self.assertFalse(self.engine.delete('email_3'))
+        self.assertFalse(self.engine.delete('nope'))
+
+        self.assertEqual(self.engine.get_total_docs(), 3)
+        self.assertEqual(self.engine.stats.total_length, 37)
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0]})
+        self.assertEqual(self.engine.load_segment('saturd'), 'Not Found')
+        self.assertEqual(self.engine.search('Peter')['total_hits'], 1)
+        self.assertFalse(os.path.exists(self.engine.set_name_docs('email_3')))
+
+        # Indexing it again brings it back, with the same ordinal.
+        self.engine.index(*EMAILS[2])
+        self.assertEqual(self.engine.get_total_docs(), 4)
+        self.assertEqual(self.engine.load_segment('peter'), {0: [0], 2: [0]})
+
+    def test_writer_reindex(self):
+        self.engine.index(*EMAILS[0])
+
+        with self.engine.writer() as writer:
+            writer.add('email_1', {'text': 'Peter, the printer is jammed.'})
+            writer.add('email_2', {'text': 'Where is my stapler?'})
+            writer.add('email_2', EMAILS[1][1])
+
+        other = PySearch.PySearch(os.path.join(self.base, 'per_doc'))
+        other.index('email_1', {'text': 'Peter, the printer is jammed.'})
+        other.index(*EMAILS[1])
+
+        self.assertEqual(self.engine.get_total_docs(), 2)
+        self.assertEqual(self.engine.stats.total_length, other.stats.total_length)
+        self.assertEqual(self.engine.load_segment('tps'), 'Not Found')
+        self.assertEqual(self.engine.load_segment('where'), 'segment not exist')
+
+        for query in ['Peter', 'tps report', 'stapler', 'printer']:
+            self.assertEqual(self.engine.search(query), other.search(query))
+
+    def test_length_norms(self):
+        self.engine.bulk_index([
+            ('long', {'text': 'stapler ' + ' '.join('filler{0}'.format(number) for number in range(60))}),
+            ('short', {'text': 'red stapler'}),
+        ] + [EMAILS[0], EMAILS[2], EMAILS[3]])
+
+        # The short document wins, unless lengths are ignored.
+        self.assertEqual([res['id'] for res in self.engine.search('stapler')['results']], ['short', 'long'])
+        flat = PySearch.PySearch(self.base, bm25_b=0)
+        self.assertEqual([res['score'] for res in flat.search('stapler')['results']][0],
+                         [res['score'] for res in flat.search('stapler')['results']][1])
+        self.assertEqual(len(self.engine.stats.doc_norms), 5)
+
+        # An index from before lengths were recorded scores them all alike,
+        # until they're recounted.
+        expected = self.engine.search('stapler')
+        os.remove(self.engine.doc_lengths_path)
+        os.remove(self.engine.doc_norms_path)
+        self.engine.write_stats({'total_length': 0})
+        engine = PySearch.PySearch(self.base)
+        self.assertEqual(engine.search('stapler')['results'][0]['id'], 'long')
+
+        self.assertEqual(maintenance.compute_norms(self.base), 5)
+        engine = PySearch.PySearch(self.base)
+        self.assertEqual(engine.stats.total_length, 63 + 18 + 14 + 8)
+        self.assertEqual(engine.search('stapler'), expected)
+
+    def test_rebuild_forward_index(self):
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        # An index from before the forward index, with inflated stats.
+        os.remove(self.engine.forward_path + '.dat')
+        os.remove(self.engine.forward_path + '.off')
+        self.engine.write_stats({'total_docs': 7})
+
+        self.assertEqual(maintenance.rebuild_forward_index(self.base), 4)
+
+        engine = PySearch.PySearch(self.base)
+        self.assertEqual(engine.get_total_docs(), 4)
+        self.assertEqual(engine.stats.total_length, 51)
+        self.assertEqual(engine.forward.terms(3), [
+            'abo', 'abou', 'about', 'bec', 'beco', 'becom', 'becomi', 'bob', 'bobs', 'fee', 'feel', 'how',
+            'man', 'mana', 'manag', 'manage', 'you',
+        ])
+        self.assertTrue(engine.delete('email_1'))
+        self.assertEqual(engine.load_segment('tps'), 'Not Found')
+
+
+if __name__ == '__main__':
+    unittest.main()
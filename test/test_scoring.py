@@ -0,0 +1,169 @@
+import unittest
+import random
+from unittest import mock
+
+from pysearch import PySearch
+from pysearch import scoring
+
+
+class ScoringTests(unittest.TestCase):
+
+    def make_matches(self, seed=0, total_docs=500):
+        rng = random.Random(seed)
+        terms = ['hel', 'hell', 'hello', 'wor', 'missing']
+        per_term_counts = {}
+
+        for term in terms[:-1]:
+            ordinals = sorted(rng.sample(range(total_docs), rng.randint(1, total_docs // 2)))
+            per_term_counts[term] = (ordinals, [rng.randint(1, 9) for _ in ordinals])
+
+        per_term_docs = {term: len(ordinals) for term, (ordinals, _) in per_term_counts.items()}
+        return terms, per_term_docs, per_term_counts
+
+    def expected(self, terms, per_term_docs, per_term_counts, total_docs):
+        per_doc_counts = {}
+
+        for term, (ordinals, counts) in per_term_counts.items():
+            for ordinal, count in zip(ordinals, counts):
+                per_doc_counts.setdefault(ordinal, {})[term] = count
+
+        return {
+            ordinal: PySearch.bm25_relevance(terms, per_term_docs, current_doc, total_docs)
+            for ordinal, current_doc in per_doc_counts.items()
+        }
+
+    def check(self):
+        terms, per_term_docs, per_term_counts = self.make_matches()
+        expected = self.expected(terms, per_term_docs, per_term_counts, 500)
+        ordinals, scores = scoring.bm25_scores(terms, per_term_docs, per_term_counts, 500)
+
+        self.assertEqual([int(ordinal) for ordinal in ordinals], sorted(expected))
+        self.assertEqual([float(score) for score in scores], [expected[int(ordinal)] for ordinal in ordinals])
+
+        # Nothing matched.
+        ordinals, scores = scoring.bm25_scores(['missing'], {}, {}, 500)
+        self.assertEqual((len(ordinals), len(scores)), (0, 0))
+
+    def check_top_k(self):
+        ordinals, scores = scoring.bm25_scores(*self.make_matches(), 500)
+        expected = sorted(zip(ordinals, scores), key=lambda pair: (-pair[1], pair[0]))
+        expected = [(int(ordinal), float(score)) for ordinal, score in expected]
+
+        for count in [0, 1, 5, 20, len(expected), len(expected) + 5]:
+            self.assertEqual(scoring.top_k(ordinals, scores, count), expected[:count])
+
+        # Ties go to the lowest ordinal.
+        self.assertEqual(scoring.top_k([1, 2, 3, 4], [0.5, 0.7, 0.5, 0.5], 2), [(2, 0.7), (1, 0.5)])
+
+    def check_wand_top_k(self):
+        for seed in range(5):
+            terms, per_term_docs, per_term_counts = self.make_matches(seed)
+            per_term_max_counts = {term: max(counts) for term, (_, counts) in per_term_counts.items()}
+            ordinals, scores = scoring.bm25_scores(terms, per_term_docs, per_term_counts, 500)
+
+            for count in [1, 10, 50]:
+                best, total_hits, exact = scoring.wand_top_k(
+                    terms, per_term_docs, per_term_counts, per_term_max_counts, 500, count)
+                self.assertEqual(best, scoring.top_k(ordinals, scores, count))
+
+                if exact:
+                    self.assertEqual(total_hits, len(ordinals))
+                else:
+                    self.assertTrue(max(per_term_docs.values()) <= total_hits <= len(ordinals))
+
+            # Asking for everything can't skip anything.
+            best, total_hits, exact = scoring.wand_top_k(
+                terms, per_term_docs, per_term_counts, per_term_max_counts, 500, 500)
+            self.assertEqual((total_hits, exact), (len(ordinals), True))
+
+    def check_norms(self):
+        terms, per_term_docs, per_term_counts = self.make_matches()
+        rng = random.Random(2)
+        lengths = [rng.randint(1, 400) for _ in range(500)]
+        norms = scoring.LengthNorms(bytes(scoring.encode_norm(length) for length in lengths), 100.0)
+        ordinals, scores = scoring.bm25_scores(terms, per_term_docs, per_term_counts, 500, norms=norms)
+        expected = {}
+
+        for term in terms[:-1]:
+            term_idf = scoring.idf(per_term_docs[term], 500)
+
+            for ordinal, count in zip(*per_term_counts[term]):
+                doc_k = 1.2 * (0.25 + 0.75 * scoring.NORM_LENGTHS[scoring.encode_norm(lengths[ordinal])] / 100.0)
+                expected[ordinal] = expected.get(ordinal, 0) + count * term_idf / (count + doc_k)
+
+        self.assertEqual([int(ordinal) for ordinal in ordinals], sorted(expected))
+
+        for ordinal, score in zip(ordinals, scores):
+            self.assertAlmostEqual(float(score), 0.5 + expected[int(ordinal)] / (2 * len(terms)))
+
+        per_term_max_counts = {term: max(counts) for term, (_, counts) in per_term_counts.items()}
+
+        for count in [1, 10, 50]:
+            best, _, _ = scoring.wand_top_k(
+                terms, per_term_docs, per_term_counts, per_term_max_counts, 500, count, norms=norms)
+            self.assertEqual(best, scoring.top_k(ordinals, scores, count))
+
+        # Without normalization, the scores are the same as without norms.
+        flat = scoring.LengthNorms(norms.doc_norms, 100.0, b=0)
+        self.assertEqual(
+            [float(score) for score in scoring.bm25_scores(terms, per_term_docs, per_term_counts, 500, norms=flat)[1]],
+            [float(score) for score in scoring.bm25_scores(terms, per_term_docs, per_term_counts, 500)[1]])
+        # Documents without a norm count as average.
+        self.assertEqual(norms[10000], 1.2)
+
+    def test_norms_python(self):
+        with mock.patch.object(scoring, 'numpy', None):
+            self.check_norms()
+
+    @unittest.skipIf(scoring.numpy is None, 'NumPy is not installed')
+    def test_norms_numpy(self):
+        self.check_norms()
+
+    def test_encode_norm(self):
+        self.assertEqual([scoring.encode_norm(length) for length in [0, 1, 39]], [0, 1, 39])
+        self.assertEqual(scoring.encode_norm(2 ** 32 - 1), 255)
+
+        for length in [40, 100, 5000, 10 ** 6]:
+            decoded = scoring.NORM_LENGTHS[scoring.encode_norm(length)]
+            self.assertTrue(length / 1.1 <= decoded <= length)
+
+    def test_top_k_python(self):
+        with mock.patch.object(scoring, 'numpy', None):
+            self.check_top_k()
+            self.check_wand_top_k()
+
+    @unittest.skipIf(scoring.numpy is None, 'NumPy is not installed')
+    def test_top_k_numpy(self):
+        self.check_top_k()
+        self.check_wand_top_k()
+
+    def test_wand_skips(self):
+        # One rare, high scoring term & one that's everywhere.
+        total_docs = 1000
+        per_term_counts = {
+            'rare': ([10, 500], [5, 5]),
+            'common': (list(range(900)), [1] * 900),
+        }
+        per_term_docs = {'rare': 2, 'common': 900}
+        best, total_hits, exact = scoring.wand_top_k(
+            ['rare', 'common'], per_term_docs, per_term_counts, {'rare': 5, 'common': 1}, total_docs, 2)
+
+        self.assertEqual([ordinal for ordinal, _ in best], [10, 500])
+        self.assertFalse(exact)
+        self.assertTrue(900 <= total_hits < 902)
+
+    def test_idf(self):
+        self.assertAlmostEqual(scoring.idf(1, 4), 0.8613531161467861)
+        self.assertAlmostEqual(scoring.idf(2, 4), 0.25192963641259225)
+
+    @unittest.skipIf(scoring.numpy is None, 'NumPy is not installed')
+    def test_bm25_scores_numpy(self):
+        self.check()
+
+    def test_bm25_scores_python(self):
+        with mock.patch.object(scoring, 'numpy', None):
+            self.check()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
+import json
 from pysearch import segmentHandler
+from pysearch import segmentFormat
 import os
 import shutil
 
@@ -45,6 +47,18 @@ class SegmentsTests(unittest.TestCase):
 
     def test_set_name_seg(self):
         path_prefix = os.path.join(os.getcwd(), 'segment_tests', 'index')
+        # New indexes hash all the UTF-8 bytes into 1024 buckets.
+        self.assertEqual(self.handler.bucketing.config(), {'strategy': 'crc32', 'buckets': 1024})
+        self.assertEqual(self.handler.set_name_seg('hello'), os.path.join(path_prefix, '286.index'))
+        self.assertEqual(self.handler.set_name_seg('world'), os.path.join(path_prefix, '143.index'))
+        self.assertEqual(self.handler.set_name_seg('déjà'), os.path.join(path_prefix, '1f8.index'))
+        self.assertEqual(self.handler.set_name_seg('日本'), os.path.join(path_prefix, '1cc.index'))
+
+        # The original buckets, by the MD5 of the ASCII characters only.
+        self.handler.use_bucketing('md5')
+        self.assertEqual(segmentHandler.SegmentHandler(self.base).bucketing.config(), {'strategy': 'md5'})
+        self.assertEqual(self.handler.set_name_seg('déjà'), self.handler.set_name_seg('dj'))
+        self.assertEqual(self.handler.set_name_seg('日本'), os.path.join(path_prefix, 'd41d8c.index'))
         self.assertEqual(self.handler.set_name_seg('hello'), os.path.join(path_prefix,'5d4140.index' ))
         self.assertEqual(self.handler.set_name_seg('world'), os.path.join(path_prefix, '7d7930.index'))
         self.assertEqual(self.handler.set_name_seg('truly'), os.path.join(path_prefix, 'f499b3.index'))
@@ -60,19 +74,53 @@ class SegmentsTests(unittest.TestCase):
         raw_index = self.handler.set_name_seg('hello')
         self.assertFalse(os.path.exists(raw_index))
 
-        self.assertTrue(self.handler.save_segment('hello', {'abc': [1, 5]}))
+        self.assertTrue(self.handler.save_segment('hello', {1: [1, 5]}))
         self.assertTrue(os.path.exists(raw_index))
 
-        with open(raw_index, 'r') as raw_index_file:
-            self.assertEqual(raw_index_file.read(), 'hello\t{"abc": [1, 5]}\n')
+        self.assertTrue(segmentFormat.is_binary_segment(raw_index))
+        self.assertEqual(self.handler.load_segment('hello'), {1: [1, 5]})
 
         self.assertTrue(self.handler.save_segment(
-            'hello', {'abc': [1, 5], 'bcd': [3, 4]}))
+            'hello', {1: [1, 5], 2: [3, 4]}))
         self.assertTrue(os.path.exists(raw_index))
+        self.assertEqual(self.handler.load_segment('hello'), {1: [1, 5], 2: [3, 4]})
+
+        # Overwrites by default, updates when asked to.
+        self.assertTrue(self.handler.save_segment('hello', {7: [2]}))
+        self.assertEqual(self.handler.load_segment('hello'), {7: [2]})
+        self.assertTrue(self.handler.save_segment('hello', {1: [7]}, update=True))
+        self.assertEqual(self.handler.load_segment('hello'), {1: [7], 7: [2]})
+
+    def test_save_segments(self):
+        self.assertTrue(self.handler.save_segment('hello', {1: [1, 5]}))
 
-        with open(raw_index, 'r') as raw_index_file:
-            self.assertEqual(raw_index_file.read(),
-                             'hello\t{"abc": [1, 5], "bcd": [3, 4]}\n')
+        # Both terms hash to separate segments, ``hello`` is updated in place.
+        self.assertEqual(self.handler.save_segments({
+            'hello': {2: [3, 4]},
+            'world': {2: [2]},
+        }), 2)
+        self.assertEqual(self.handler.load_segment('hello'), {1: [1, 5], 2: [3, 4]})
+        self.assertEqual(self.handler.load_segment('world'), {2: [2]})
+
+        # Terms sharing a segment keep it sorted.
+        raw_index = self.handler.set_name_seg('hello')
+
+        with open(raw_index, 'w') as raw_index_file:
+            raw_index_file.write('b\t{"abc": [1]}\nd\t{"abc": [2]}\n')
+
+        self.handler._rewrite_segment(raw_index, {'e': {9: [0]}, 'a': {9: [1]}, 'c': {9: [2]}, 'd': {9: [3]}},
+                                      update=True)
+        abc = self.handler.doc_ids.ordinal('abc')
+
+        records = [(term, segmentFormat.decode_postings(postings))
+                   for term, postings in self.handler._iter_segment(raw_index)]
+        self.assertEqual(records, [
+            ('a', {9: [1]}),
+            ('b', {abc: [1]}),
+            ('c', {9: [2]}),
+            ('d', {abc: [2], 9: [3]}),
+            ('e', {9: [0]}),
+        ])
 
     def test_load_segment(self):
         raw_index = self.handler.set_name_seg('hello')
@@ -86,13 +134,150 @@ class SegmentsTests(unittest.TestCase):
 
         self.assertTrue(os.path.exists(raw_index))
 
-        # Should load the correct term data.
-        self.assertEqual(self.handler.load_segment('hello'),
-                         {'abc': [1, 5], 'bcd': [3, 4]})
+        # Should load the correct term data, with the doc ids of the legacy
+        # segment swapped for ordinals.
+        term_info = self.handler.load_segment('hello')
+        abc = self.handler.doc_ids.ordinal('abc')
+        bcd = self.handler.doc_ids.ordinal('bcd')
+        self.assertEqual(sorted([abc, bcd]), [0, 1])
+        self.assertEqual(term_info, {abc: [1, 5], bcd: [3, 4]})
 
         # Won't hash to the same file & since we didn't put the data there,
         # it fails to lookup.
         self.assertEqual(self.handler.load_segment('binary'), 'segment not exist')
 
+        # Binary segments work the same way.
+        self.assertEqual(self.handler.convert_segments(), 1)
+        self.assertTrue(segmentFormat.is_binary_segment(raw_index))
+        self.assertEqual(self.handler.load_segment('hello'), {abc: [1, 5], bcd: [3, 4]})
+        self.assertEqual(self.handler.load_segment('hellp'), 'segment not exist')
+
+    def test_load_postings(self):
+        self.assertEqual(self.handler.load_postings('hello'), None)
+        self.handler.save_segment('hello', {1: [1, 5], 2: [3]})
+
+        postings = self.handler.load_postings('hello')
+        self.assertEqual(postings, ({1: [1, 5], 2: [3]}, 2))
+        self.assertEqual(self.handler.load_postings('hellp'), None)
+
+        # Decoded once, then served from the cache.
+        self.assertIs(self.handler.load_postings('hello'), postings)
+        self.assertEqual(self.handler.postings_cache.stats()['hits'], 1)
+
+        # Rewriting the segment drops its terms.
+        self.handler.save_segment('hello', {3: [0]}, update=True)
+        self.assertEqual(len(self.handler.postings_cache), 0)
+        self.assertEqual(self.handler.load_postings('hello'), ({1: [1, 5], 2: [3], 3: [0]}, 2))
+
+        # So does another writer replacing the file.
+        other = segmentHandler.SegmentHandler(self.base)
+        other.save_segment('hello', {4: [0]}, update=True)
+        self.assertEqual(sorted(self.handler.load_postings('hello')[0]), [1, 2, 3, 4])
+
+    def test_convert_segments(self):
+        raw_index = self.handler.set_name_seg('hello')
+
+        with open(raw_index, 'w') as raw_index_file:
+            raw_index_file.write('hello\t{"abc": [5, 1]}\nb\t{"x": [0]}\n')
+
+        self.assertEqual(self.handler.convert_segments(), 1)
+        self.assertTrue(segmentFormat.is_binary_segment(raw_index))
+        self.assertEqual(self.handler.load_segment('hello'), {self.handler.doc_ids.ordinal('abc'): [1, 5]})
+
+        # Records get re-sorted on the way through.
+        self.assertEqual([term for term, _ in self.handler._iter_segment(raw_index)], ['b', 'hello'])
+
+        # Already converted segments are left alone.
+        self.assertFalse(self.handler.convert_segment(raw_index))
+        self.assertEqual(self.handler.convert_segments(), 0)
+
+        # The ordinals were persisted.
+        reopened = segmentHandler.SegmentHandler(self.base)
+        self.assertEqual(sorted(reopened.doc_ids.ids), ['abc', 'x'])
+
+    def test_convert_old_segments(self):
+        # Version 2 binary segments had no highest position counts.
+        raw_index = self.handler.set_name_seg('hello')
+
+        with open(raw_index, 'wb') as raw_index_file:
+            segmentFormat.write_segment(raw_index_file, [('hello', b'\x01\x07\x02\x01\x03')])
+            raw_index_file.seek(len(segmentFormat.MAGIC))
+            raw_index_file.write(bytes([2]))
+
+        self.assertEqual(self.handler.load_segment('hello'), {7: [1, 4]})
+        self.assertEqual(self.handler.convert_segments(), 1)
+        self.assertEqual(segmentFormat.segment_version(raw_index), segmentFormat.FORMAT_VERSION)
+        self.assertEqual(self.handler.load_segment('hello'), {7: [1, 4]})
+
+    def test_convert_string_id_segments(self):
+        # Version 1 binary segments stored the doc ids as strings.
+        raw_index = self.handler.set_name_seg('hello')
+        postings = bytearray()
+
+        for value in [1, 3]:
+            segmentFormat.encode_varint(value, postings)
+
+        postings += b'abc'
+
+        for value in [2, 1, 4]:
+            segmentFormat.encode_varint(value, postings)
+
+        with open(raw_index, 'wb') as raw_index_file:
+            segmentFormat.write_segment(raw_index_file, [('hello', bytes(postings))])
+            raw_index_file.seek(len(segmentFormat.MAGIC))
+            raw_index_file.write(bytes([1]))
+
+        self.assertEqual(segmentFormat.segment_version(raw_index), 1)
+        self.assertEqual(self.handler.load_segment('hello'), {0: [1, 5]})
+        self.assertEqual(self.handler.convert_segments(), 1)
+        self.assertEqual(segmentFormat.segment_version(raw_index), segmentFormat.FORMAT_VERSION)
+        self.assertEqual(self.handler.load_segment('hello'), {0: [1, 5]})
+        self.assertEqual(self.handler.doc_ids.external(0), 'abc')
+
+    def test_rebucket(self):
+        self.handler.use_bucketing('md5')
+        terms = {'term{0}'.format(number): {number: [0, 2]} for number in range(200)}
+        terms['ßü'] = {1: [1]}
+        terms['日本'] = {2: [4]}
+        # Both non-ASCII terms land in the same segment.
+        self.assertEqual(self.handler.save_segments(terms), 201)
+
+        # Written before the bucketing was recorded, so they're taken for md5.
+        with open(self.handler.stats_path) as stats_file:
+            stats = json.load(stats_file)
+
+        del stats['bucketing']
+
+        with open(self.handler.stats_path, 'w') as stats_file:
+            json.dump(stats, stats_file)
+
+        handler = segmentHandler.SegmentHandler(self.base)
+        self.assertEqual(handler.bucketing.config(), {'strategy': 'md5'})
+        self.assertRaises(ValueError, handler.use_bucketing, 'crc32')
+        self.assertRaises(ValueError, handler.use_bucketing, 'sha1')
+
+        self.assertEqual(handler.rebucket('crc32', 16), 16)
+        self.assertEqual(len(os.listdir(handler.index_path)), 16)
+        self.assertEqual(segmentHandler.SegmentHandler(self.base).bucketing.config(),
+                         {'strategy': 'crc32', 'buckets': 16})
+
+        for term, term_info in terms.items():
+            self.assertEqual(handler.load_segment(term), term_info)
+
+        stats = handler.bucket_stats()
+        self.assertEqual(stats['bucketing'], {'strategy': 'crc32', 'buckets': 16})
+        self.assertEqual(stats['buckets'], 16)
+        self.assertEqual(stats['terms']['total'], 202)
+        self.assertEqual(stats['bytes']['total'], sum(os.path.getsize(os.path.join(handler.index_path, name))
+                                                      for name in os.listdir(handler.index_path)))
+        self.assertEqual(stats['largest'][0][1], stats['bytes']['max'])
+        self.assertTrue(stats['terms']['min'] <= stats['terms']['p50'] <= stats['terms']['max'])
+
+        # Several passes end up the same.
+        self.assertEqual(handler.rebucket('crc32', 4, max_bytes=100), 4)
+
+        for term, term_info in terms.items():
+            self.assertEqual(handler.load_segment(term), term_info)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import io
+
+from pysearch import segmentFormat
+
+
+class SegmentFormatTests(unittest.TestCase):
+
+    def make_segment(self, records):
+        buf = io.BytesIO()
+        segmentFormat.write_segment(buf, records)
+        data = buf.getvalue()
+        return data, segmentFormat.SegmentFile(lambda offset, length: data[offset:offset + length], len(data))
+
+    def test_varint(self):
+        for value in [0, 1, 127, 128, 300, 16383, 16384, 2 ** 40]:
+            out = bytearray()
+            segmentFormat.encode_varint(value, out)
+            self.assertEqual(segmentFormat.decode_varint(out, 0), (value, len(out)))
+
+        out = bytearray()
+        segmentFormat.encode_varint(300, out)
+        self.assertEqual(bytes(out), b'\xac\x02')
+
+    def test_postings(self):
+        term_info = {7: [9, 1, 4], 0: [0], 300: [200, 100]}
+        encoded = segmentFormat.encode_postings(term_info)
+        self.assertEqual(segmentFormat.decode_postings(encoded), {
+            0: [0],
+            7: [1, 4, 9],
+            300: [100, 200],
+        })
+        self.assertEqual(list(segmentFormat.decode_postings(encoded)), [0, 7, 300])
+        self.assertEqual(encoded, b'\x03\x03\x00\x01\x00\x07\x03\x01\x03\x05\xa5\x02\x02\x64\x64')
+        self.assertEqual(segmentFormat.postings_header(encoded), (3, 3))
+        self.assertEqual(segmentFormat.decode_postings(segmentFormat.encode_postings({})), {})
+        self.assertEqual(segmentFormat.postings_header(segmentFormat.encode_postings({})), (0, 0))
+
+        # Only the ordinals & counts, skipping single & multi-byte positions.
+        self.assertEqual(segmentFormat.decode_counts(encoded), ([0, 7, 300], [1, 3, 2]))
+        wide = segmentFormat.encode_postings({1: [1000, 5, 70000], 2: [], 5: [3, 4]})
+        self.assertEqual(segmentFormat.decode_counts(memoryview(wide)), ([1, 2, 5], [3, 0, 2]))
+        self.assertEqual(segmentFormat.decode_counts(segmentFormat.encode_postings({})), ([], []))
+
+        # Version 2 postings had no highest position count.
+        self.assertEqual(segmentFormat.decode_postings(b'\x01\x07\x02\x01\x03', 2), {7: [1, 4]})
+
+    def test_string_postings(self):
+        encoded = b'\x01\x06d\xc3\xa9j\xc3\xa0\x02\x64\x64'
+        self.assertEqual(segmentFormat.decode_string_postings(encoded), {'déjà': [100, 200]})
+
+    def test_write_segment(self):
+        data, segment = self.make_segment([
+            ('hel', segmentFormat.encode_postings({0: [0]})),
+            ('hello', segmentFormat.encode_postings({1: [1, 2]})),
+        ])
+        self.assertTrue(data.startswith(segmentFormat.HEADER))
+        self.assertTrue(data.endswith(segmentFormat.HEADER))
+        self.assertEqual(segment.term_count, 2)
+        self.assertEqual(segment.block_count, 1)
+
+        # Out of order records are refused.
+        self.assertRaises(ValueError, self.make_segment, [('b', b'\x00'), ('a', b'\x00')])
+        self.assertRaises(ValueError, self.make_segment, [('a', b'\x00'), ('a', b'\x00')])
+
+    def test_find(self):
+        terms = ['term{0:05d}'.format(number) for number in range(0, 1000, 2)]
+        _, segment = self.make_segment(
+            [(term, segmentFormat.encode_postings({number: [number]})) for number, term in enumerate(terms)])
+        self.assertEqual(segment.block_count, 8)
+
+        for number, term in enumerate(terms):
+            self.assertEqual(segment.find(term), {number: [number]})
+
+        # Before, between & after the stored terms.
+        self.assertEqual(segment.find('aaa'), None)
+        self.assertEqual(segment.find('term00001'), None)
+        self.assertEqual(segment.find('term00127'), None)
+        self.assertEqual(segment.find('zzz'), None)
+
+        self.assertEqual([term for term, _ in segment.iter_records()], terms)
+
+    def test_empty_segment(self):
+        _, segment = self.make_segment([])
+        self.assertEqual(segment.find('hello'), None)
+        self.assertEqual(list(segment.iter_records()), [])
+        self.assertRaises(ValueError, segmentFormat.SegmentFile, lambda offset, length: b'', 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import os
+import shutil
+
+from pysearch import segmentHandler
+from pysearch import segmentReader
+
+
+class SegmentReaderTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(SegmentReaderTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "segment_reader_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        self.handler = segmentHandler.SegmentHandler(self.base)
+        self.reader = segmentReader.SegmentReader(max_open=2)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        self.reader.close()
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(SegmentReaderTests, self).tearDown()
+
+    def test_get(self):
+        seg_name = self.handler.set_name_seg('hello')
+
+        # Missing segments.
+        self.assertEqual(self.reader.get(seg_name), None)
+        self.assertEqual(self.reader.find(seg_name, 'hello'), None)
+
+        # Legacy segments aren't mapped.
+        with open(seg_name, 'w') as seg_file:
+            seg_file.write('hello\t{"abc": [1, 5]}\n')
+
+        self.assertEqual(self.reader.get(seg_name), None)
+
+        self.handler.convert_segments()
+        segment = self.reader.get(seg_name)
+        self.assertEqual(segment.find('hello'), {0: [1, 5]})
+        self.assertEqual(self.reader.find(seg_name, 'hello'), {0: [1, 5]})
+        self.assertEqual(self.reader.find(seg_name, 'world'), None)
+
+        # Mapped once, then reused.
+        self.assertIs(self.reader.get(seg_name), segment)
+
+    def test_refresh(self):
+        seg_name = self.handler.set_name_seg('hello')
+        self.handler.save_segment('hello', {0: [1, 5]})
+        segment = self.reader.get(seg_name)
+        self.assertEqual(segment.find('hello'), {0: [1, 5]})
+
+        # The segment gets replaced by a rename, the reader notices.
+        self.handler.save_segment('hello', {1: [2]}, update=True)
+        self.assertIsNot(self.reader.get(seg_name), segment)
+        self.assertEqual(self.reader.find(seg_name, 'hello'), {0: [1, 5], 1: [2]})
+
+        # The old mapping still reads the old data.
+        self.assertEqual(segment.find('hello'), {0: [1, 5]})
+
+        os.remove(seg_name)
+        self.assertEqual(self.reader.get(seg_name), None)
+        self.assertEqual(len(self.reader.segments), 0)
+
+    def test_lru(self):
+        names = []
+
+        for term in ['hello', 'world', 'truly']:
+            self.handler.save_segment(term, {0: [0]})
+            names.append(self.handler.set_name_seg(term))
+
+        self.reader.get(names[0])
+        self.reader.get(names[1])
+        self.reader.get(names[0])
+        self.reader.get(names[2])
+
+        # ``world`` was the least recently used.
+        self.assertEqual(list(self.reader.segments), [names[0], names[2]])
+
+        self.reader.invalidate(names[0])
+        self.assertEqual(list(self.reader.segments), [names[2]])
+
+    def test_shared_reader(self):
+        self.assertIs(segmentReader.shared_reader(), segmentReader.shared_reader())
+        self.assertIs(self.handler.segment_reader, segmentReader.shared_reader())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+import asyncio
+import os
+import shutil
+import threading
+
+from pysearch import PySearch
+from pysearch import asyncSearch
+
+from .test_pysearch import EMAILS
+
+
+class SnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(SnapshotTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "snapshot_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        self.engine = PySearch.PySearch(self.base, snapshots=True)
+        self.engine.snapshots.grace = 0
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(SnapshotTests, self).tearDown()
+
+    def index_files(self):
+        return sorted(name for name in os.listdir(self.engine.index_path) if name.endswith('.index'))
+
+    def test_versions(self):
+        self.engine.index('email_1', dict(EMAILS)['email_1'])
+        snapshot = self.engine.snapshots.current
+        self.assertEqual(snapshot.generation, 2)
+        self.assertEqual(snapshot.total_docs, 1)
+        # Every segment is a new version, named after its bucket.
+        self.assertEqual(self.index_files(), sorted(snapshot.segments.values()))
+        self.assertTrue(all(name.endswith('.0000000002.index') for name in self.index_files()))
+        seg_name = self.engine.set_name_seg('peter')
+        self.assertEqual(self.engine.segment_file(seg_name),
+                         os.path.join(self.engine.index_path, snapshot.segments[os.path.basename(seg_name)]))
+
+        # Re-indexing retires the old versions, which go once nothing pins
+        # them.
+        self.engine.index('email_1', {'text': 'Peter, the stapler is mine.'})
+        self.assertEqual(self.engine.snapshots.current.generation, 3)
+        self.assertEqual(self.index_files(), sorted(self.engine.snapshots.current.segments.values()))
+        self.assertEqual(self.engine.search('stapler')['total_hits'], 1)
+        self.assertEqual(self.engine.search('tps')['total_hits'], 0)
+
+        # Picked up by later instances.
+        engine = PySearch.PySearch(self.base)
+        self.assertIsNotNone(engine.snapshots)
+        self.assertEqual(engine.search('stapler')['total_hits'], 1)
+
+    def test_pinned(self):
+        for doc_id, document in EMAILS[:2]:
+            self.engine.index(doc_id, document)
+
+        with self.engine.snapshot() as snapshot:
+            self.assertIs(self.engine.pinned_snapshot(), snapshot)
+            pinned_files = set(snapshot.segments.values())
+
+            for doc_id, document in EMAILS[2:]:
+                self.engine.index(doc_id, document)
+
+            self.engine.delete('email_1')
+            # The pinned search sees neither the new documents nor the delete.
+            results = self.engine.search('peter')
+            self.assertEqual(results['total_hits'], 1)
+            self.assertEqual(results['results'][0]['id'], 'email_1')
+            self.assertTrue(pinned_files <= set(self.index_files()))
+
+        self.assertIsNone(self.engine.pinned_snapshot())
+        self.assertEqual(self.engine.search('peter')['total_hits'], 1)
+        self.assertEqual(self.engine.search('peter')['results'][0]['id'], 'email_3')
+        self.assertEqual(self.engine.search('stapler')['total_hits'], 1)
+        # Released, so the next commit drops what only it used.
+        self.engine.index('email_9', {'text': 'Is this good for the company?'})
+        self.assertEqual(self.index_files(), sorted(self.engine.snapshots.current.segments.values()))
+
+    def test_existing_index(self):
+        shutil.rmtree(self.base, ignore_errors=True)
+        engine = PySearch.PySearch(self.base)
+
+        for doc_id, document in EMAILS:
+            engine.index(doc_id, document)
+
+        old_files = self.index_files()
+        engine.use_snapshots(grace=0)
+        # The segments written so far are the first snapshot, as they are.
+        self.assertEqual(sorted(engine.snapshots.current.segments.values()), old_files)
+        self.assertEqual(engine.snapshots.current.total_docs, len(EMAILS))
+        self.assertEqual(engine.search('peter')['total_hits'], 2)
+
+        engine.delete('email_1')
+        self.assertEqual(engine.search('peter')['total_hits'], 1)
+        self.assertEqual(self.index_files(), sorted(engine.snapshots.current.segments.values()))
+
+        with self.assertRaises(ValueError):
+            engine.use_lsm()
+
+        with self.assertRaises(ValueError):
+            engine.rebucket('crc32', 64)
+
+        with self.assertRaises(ValueError):
+            PySearch.PySearch(os.path.join(self.base, 'lsm'), layout='lsm').use_snapshots()
+
+    def test_orphans(self):
+        self.engine.index('email_1', dict(EMAILS)['email_1'])
+        orphan = os.path.join(self.engine.index_path, '123.0000000009.index')
+
+        with open(orphan, 'wb'):
+            pass
+
+        self.engine.optimize()
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(self.engine.search('peter')['total_hits'], 1)
+
+    def test_concurrent_readers(self):
+        # Every batch of documents is a single commit, so readers only ever
+        # see whole batches.
+        batch_size = 10
+        batches = 8
+        seen = []
+        errors = []
+        done = threading.Event()
+
+        def read():
+            reader = PySearch.PySearch(self.base)
+
+            try:
+                while not done.is_set():
+                    results = reader.search('memo', limit=100)
+                    seen.append(results['total_hits'])
+
+                    if len(results['results']) != results['total_hits']:
+                        errors.append(results)
+            except Exception as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+
+        for thread in readers:
+            thread.start()
+
+        for batch in range(batches):
+            self.engine.bulk_index([('memo_{0}_{1}'.format(batch, number), {'text': 'A memo about the printer.'})
+                                    for number in range(batch_size)])
+
+        done.set()
+
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(all(total % batch_size == 0 for total in seen))
+        self.assertEqual(self.engine.search('memo', limit=100)['total_hits'], batch_size * batches)
+
+    def test_parallel_and_async(self):
+        self.engine.parallel_index(EMAILS, workers=2, shard_size=2)
+        self.assertEqual(self.index_files(), sorted(self.engine.snapshots.current.segments.values()))
+        self.assertEqual(self.engine.search('peter')['total_hits'], 2)
+
+        async def search():
+            async with asyncSearch.AsyncPySearch(self.base, max_workers=4) as engine:
+                return await engine.search('peter')
+
+        self.assertEqual(asyncio.run(search())['total_hits'], 2)
@@ -0,0 +1,136 @@
+import unittest
+import os
+import random
+import shutil
+
+from pysearch import PySearch
+from pysearch import segmentReader
+from pysearch import termDictionary
+
+from .test_pysearch import EMAILS
+
+
+def edit_distance(left, right):
+    row = list(range(len(right) + 1))
+
+    for number, char in enumerate(left):
+        previous, row[0] = row[0], number + 1
+
+        for other, other_char in enumerate(right):
+            previous, row[other + 1] = row[other + 1], min(row[other + 1] + 1, row[other] + 1,
+                                                           previous + (char != other_char))
+
+    return row[-1]
+
+
+class TermDictionaryTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(TermDictionaryTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "term_dictionary_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        self.reader = segmentReader.SegmentReader()
+        self.dictionary = termDictionary.TermDictionary(os.path.join(self.base, 'terms'), self.reader,
+                                                        merge_factor=4)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(TermDictionaryTests, self).tearDown()
+
+    def test_add_and_merge(self):
+        self.dictionary.add(['report', 'peter', 'desk'])
+        self.dictionary.add(['reports', 'peter', 'stapler'])
+        self.dictionary.add([])
+
+        self.assertEqual(len(self.dictionary.files), 2)
+        self.assertEqual(list(self.dictionary.iter_terms()), ['desk', 'peter', 'report', 'reports', 'stapler'])
+        self.assertEqual(list(self.dictionary.iter_terms('pf')), ['report', 'reports', 'stapler'])
+        self.assertTrue('peter' in self.dictionary)
+        self.assertFalse('pete' in self.dictionary)
+
+        # The files are merged once there are ``merge_factor`` of them.
+        self.dictionary.add(['memo'])
+        self.dictionary.add(['milton'])
+        self.assertEqual(len(self.dictionary.files), 1)
+        self.assertEqual(len(os.listdir(self.dictionary.path)), 2)
+
+        # Other instances pick the changes up.
+        other = termDictionary.TermDictionary(self.dictionary.path, self.reader)
+        self.assertEqual(self.dictionary.prefix('m'), ['memo', 'milton'])
+        self.assertEqual(other.prefix('m'), ['memo', 'milton'])
+        self.dictionary.compact(['memo', 'peter'])
+        self.assertTrue(other.refresh())
+        self.assertEqual(list(other.iter_terms()), ['memo', 'peter'])
+
+    def test_prefix(self):
+        words = ['{0}{1}'.format(prefix, number) for prefix in ('ab', 'abc', 'b', 'déjà') for number in range(100)]
+        self.dictionary.add(words[::2])
+        self.dictionary.add(words[1::2])
+
+        self.assertEqual(self.dictionary.prefix('abc'), sorted(word for word in words if word.startswith('abc')))
+        self.assertEqual(self.dictionary.prefix('ab1', limit=3), ['ab1', 'ab10', 'ab11'])
+        self.assertEqual(self.dictionary.prefix('déjà9'), sorted(word for word in words if word.startswith('déjà9')))
+        self.assertEqual(self.dictionary.prefix('c'), [])
+
+    def test_fuzzy(self):
+        rng = random.Random(0)
+        words = sorted(set(''.join(rng.choice('abcde') for _ in range(rng.randint(1, 7))) for _ in range(3000)))
+        self.dictionary.add(words[:1000])
+        self.dictionary.add(words[1000:])
+
+        for word in ('abcd', 'eeb', 'a', 'cadbea'):
+            for max_edits in (0, 1, 2):
+                expected = sorted((edit_distance(word, other), other) for other in words
+                                  if edit_distance(word, other) <= max_edits)
+                self.assertEqual(self.dictionary.fuzzy(word, max_edits), [other for _, other in expected])
+
+        self.assertEqual(len(self.dictionary.fuzzy('abcd', 2, limit=5)), 5)
+
+    def test_parse_pattern(self):
+        self.assertEqual(termDictionary.parse_pattern('Rep*'), ('prefix', 'rep', 0))
+        self.assertEqual(termDictionary.parse_pattern('the*'), ('prefix', 'the', 0))
+        self.assertEqual(termDictionary.parse_pattern('stapelr~'), ('fuzzy', 'stapelr', 2))
+        self.assertEqual(termDictionary.parse_pattern('stapelr~1'), ('fuzzy', 'stapelr', 1))
+        self.assertEqual(termDictionary.parse_pattern('stapler'), None)
+        self.assertEqual(termDictionary.parse_pattern('*'), None)
+        self.assertEqual(termDictionary.parse_pattern('tps,report*'), None)
+
+    def test_token_search(self):
+        base = os.path.join(self.base, 'engine')
+        engine = PySearch.PySearch(base, analysis='tokens')
+        engine.bulk_index(EMAILS)
+
+        self.assertEqual(engine.load_segment('reports'), {0: [7], 2: [12]})
+        self.assertEqual(engine.expand_word('rep*'), ['reports'])
+        self.assertEqual(engine.expand_word('stapelr~'), ['stapler'])
+        self.assertEqual(engine.expand_word('stapelr~1'), [])
+        self.assertEqual(engine.expand_word('stapler'), None)
+
+        # Whole words only, unless expanded.
+        self.assertEqual(engine.search('rep')['total_hits'], 0)
+        self.assertEqual(sorted(result['id'] for result in engine.search('rep*')['results']), ['email_1', 'email_3'])
+        self.assertEqual([result['id'] for result in engine.search('stapelr~')['results']], ['email_2'])
+        self.assertEqual([result['id'] for result in engine.search('"tps reports" desk')['results']], ['email_1'])
+        self.assertEqual([result['id'] for result in engine.search('pet* NOT tps', boolean=True)['results']],
+                         ['email_3'])
+        self.assertEqual(engine.search('peter nothing*', boolean=True)['total_hits'], 0)
+        self.assertEqual(engine.search('peter OR nothing*', boolean=True)['total_hits'], 2)
+
+        # New words are expanded into right away, & the mode sticks.
+        engine.index('email_5', {'text': 'Stapled reports.'})
+        engine.parallel_index([('email_6', {'text': 'Staplers everywhere.'})], workers=2)
+        reopened = PySearch.PySearch(base)
+        self.assertEqual(reopened.gram_range, (1, None))
+        self.assertEqual(reopened.expand_word('stapl*'), ['stapled', 'stapler', 'staplers'])
+        self.assertRaises(ValueError, PySearch.PySearch, base, analysis='ngrams')
+        ngrams = PySearch.PySearch(os.path.join(self.base, 'ngrams'))
+        ngrams.index('email_1', EMAILS[0][1])
+        self.assertRaises(ValueError, ngrams.use_token_terms)
+
+        # Optimizing drops the words no document has anymore.
+        engine.delete('email_2')
+        self.assertEqual(engine.expand_word('stapl*'), ['stapled', 'stapler', 'staplers'])
+        self.assertTrue(engine.optimize())
+        self.assertEqual(engine.expand_word('stapl*'), ['stapled', 'staplers'])
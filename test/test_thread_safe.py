@@ -0,0 +1,93 @@
+import unittest
+import os
+import shutil
+import threading
+
+from pysearch import PySearch
+
+from .test_pysearch import EMAILS
+
+
+class ThreadSafeTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(ThreadSafeTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "thread_safe_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        self.engine = PySearch.PySearch(self.base, thread_safe=True, cache_size=10)
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(ThreadSafeTests, self).tearDown()
+
+    def test_shared_engine(self):
+        self.assertIsNotNone(self.engine.snapshots)
+
+        for doc_id, document in EMAILS:
+            self.engine.index(doc_id, document)
+
+        batch_size = 5
+        seen = []
+        errors = []
+        done = threading.Event()
+
+        def read():
+            try:
+                while not done.is_set():
+                    seen.append(self.engine.search('memo', limit=100)['total_hits'])
+                    self.engine.search('peter stapler')
+            except Exception as error:
+                errors.append(error)
+
+        def write(writer):
+            try:
+                for batch in range(4):
+                    # A batch is a single commit.
+                    self.engine.bulk_index([('memo_{0}_{1}_{2}'.format(writer, batch, number),
+                                             {'text': 'A memo about the printer.'})
+                                            for number in range(batch_size)])
+                    self.engine.index('note_{0}'.format(writer), {'text': 'Note number {0}.'.format(batch)})
+
+                self.engine.delete('email_{0}'.format(writer + 1))
+            except Exception as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        writers = [threading.Thread(target=write, args=(writer,)) for writer in range(2)]
+
+        for thread in readers + writers:
+            thread.start()
+
+        for thread in writers:
+            thread.join()
+
+        done.set()
+
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(all(total % batch_size == 0 for total in seen))
+        self.assertEqual(self.engine.search('memo', limit=100)['total_hits'], 2 * 4 * batch_size)
+        self.assertEqual(self.engine.search('note')['total_hits'], 2)
+        self.assertEqual(self.engine.get_total_docs(), len(EMAILS) + 2 * 4 * batch_size + 2 - 2)
+        self.assertEqual(self.engine.search('peter')['results'][0]['id'], 'email_3')
+
+    def test_writer_between_writes(self):
+        self.engine.index('email_1', dict(EMAILS)['email_1'])
+
+        with self.engine.writer() as writer:
+            writer.add('email_1', {'text': 'The red stapler.'})
+            # Written before the batch is, which replaces it.
+            self.engine.index('email_1', {'text': 'Is this good for the company?'})
+
+        self.assertEqual(self.engine.search('stapler')['total_hits'], 1)
+        self.assertEqual(self.engine.search('company')['total_hits'], 0)
+        self.assertEqual(self.engine.search('peter')['total_hits'], 0)
+        self.assertEqual(self.engine.get_total_docs(), 1)
+
+    def test_lsm(self):
+        with self.assertRaises(ValueError):
+            PySearch.PySearch(os.path.join(self.base, 'lsm'), layout='lsm', thread_safe=True)
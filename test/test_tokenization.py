@@ -1,3 +1,4 @@
+import io
 import unittest
 import re
 from pysearch import tokenization
@@ -57,6 +58,40 @@ class TokenizationTest(unittest.TestCase):
         })
 
 
+    def test_iter_tokens(self):
+        blob = "This is a truly splendid example of some tokens. Top notch, really.\n\nDéjà vu,again!"
+        expected = tokenization.make_tokens(blob)
+
+        self.assertEqual(list(tokenization.iter_tokens(blob)), expected)
+
+        # Tokens straddling the chunk boundaries come out whole.
+        for chunk_size in (1, 2, 3, 7, 16):
+            self.assertEqual(list(tokenization.iter_tokens(blob, chunk_size=chunk_size)), expected)
+            self.assertEqual(list(tokenization.iter_tokens(io.StringIO(blob), chunk_size=chunk_size)), expected)
+            # Multi-byte characters split across reads get decoded.
+            tokens = tokenization.iter_tokens(io.BytesIO(blob.encode('utf-8')), chunk_size=chunk_size)
+            self.assertEqual(list(tokens), expected)
+
+        self.assertEqual(list(tokenization.iter_tokens('')), [])
+        self.assertEqual(list(tokenization.iter_tokens('The end', chunk_size=4)), ['end'])
+
+    def test_analyze(self):
+        self.assertEqual(list(tokenization.analyze('Hello, my world', chunk_size=4)), [
+            ('hel', 0), ('hell', 0), ('hello', 0), ('wor', 2), ('worl', 2), ('world', 2),
+        ])
+        self.assertEqual(tokenization.collect_terms([('hel', 0), ('hel', 0), ('hel', 3), ('wor', 3)]), {
+            'hel': [0, 3],
+            'wor': [3],
+        })
+
+    def test_make_terms(self):
+        blob = 'Yeah, the TPS reports. Reports on reports!'
+        terms, length = tokenization.make_terms(io.StringIO(blob), chunk_size=5)
+
+        self.assertEqual(terms, tokenization.make_ngrams(tokenization.make_tokens(blob)))
+        self.assertEqual(terms['rep'], [2, 3, 4])
+        self.assertEqual(length, 5)
+
     def test_hash_name(self):
         self.assertEqual(tokenization.hash_name('hello'), '5d4140')
         self.assertEqual(tokenization.hash_name('world'), '7d7930')
@@ -0,0 +1,151 @@
+import unittest
+import os
+import shutil
+import threading
+
+from pysearch import PySearch
+from pysearch import writeAheadLog
+
+from .test_pysearch import EMAILS
+
+
+class WriteAheadLogTests(unittest.TestCase):
+
+    def setUp(self):
+        # Set up environment for testing
+        super(WriteAheadLogTests, self).setUp()
+        self.base = os.path.join(os.getcwd(), "write_ahead_log_tests")
+        shutil.rmtree(self.base, ignore_errors=True)
+        self.wal_path = os.path.join(self.base, 'wal')
+        self.applied = []
+
+    def tearDown(self):
+        # Tear down the environment after testing
+        shutil.rmtree(self.base, ignore_errors=True)
+        super(WriteAheadLogTests, self).tearDown()
+
+    def test_append_and_replay(self):
+        log = writeAheadLog.WriteAheadLog(self.wal_path, self.applied.extend)
+        log.start()
+        seqs = [log.append({'n': number}) for number in range(5)]
+        self.assertEqual(seqs, [1, 2, 3, 4, 5])
+        log.wait_applied()
+        self.assertEqual(self.applied, [{'n': number} for number in range(5)])
+        log.close()
+
+        # Everything was applied, so there's nothing to replay.
+        log = writeAheadLog.WriteAheadLog(self.wal_path, self.applied.extend)
+        self.assertEqual(log.replay(), 0)
+        self.assertEqual(log.append({'n': 5}), 6)
+        log.close()
+
+    def crash(self, written):
+        # An apply that fails once ``written`` is set, like a crash would.
+        def apply(records):
+            written.wait()
+            raise OSError('Disk gone.')
+
+        return apply
+
+    def test_replay_after_crash(self):
+        written = threading.Event()
+        log = writeAheadLog.WriteAheadLog(self.wal_path, self.crash(written))
+        log.start()
+        log.append({'n': 0})
+        log.wait_durable(log.append({'n': 1}))
+        written.set()
+
+        with self.assertRaises(RuntimeError):
+            log.wait_applied()
+
+        log.close()
+
+        log = writeAheadLog.WriteAheadLog(self.wal_path, self.applied.extend)
+        self.assertEqual(log.replay(), 2)
+        self.assertEqual(self.applied, [{'n': 0}, {'n': 1}])
+        log.close()
+
+    def test_torn_record(self):
+        # Without its threads started, nothing gets applied.
+        log = writeAheadLog.WriteAheadLog(self.wal_path, self.applied.extend, max_file_bytes=1)
+
+        for number in range(3):
+            log.append({'n': number})
+
+        log.close()
+        self.assertEqual(len(log.files), 3)
+        name = log.files[-1][1]
+
+        with open(os.path.join(self.wal_path, name), 'ab') as log_file:
+            log_file.write(writeAheadLog.RECORD_HEADER.pack(100, 0, 4) + b'{"n"')
+
+        log = writeAheadLog.WriteAheadLog(self.wal_path, self.applied.extend)
+        self.assertEqual(log.replay(), 3)
+        self.assertEqual(self.applied, [{'n': 0}, {'n': 1}, {'n': 2}])
+        self.assertEqual(log.append({'n': 3}), 4)
+        log.close()
+
+    def test_group_commit(self):
+        log = writeAheadLog.WriteAheadLog(self.wal_path, self.applied.extend, sync_interval=0.01)
+        log.start()
+
+        def write(thread):
+            for number in range(20):
+                log.wait_durable(log.append({'thread': thread, 'n': number}))
+
+        threads = [threading.Thread(target=write, args=(thread,)) for thread in range(8)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        log.close()
+        self.assertEqual(len(self.applied), 160)
+        # Appends from different threads share their fsyncs.
+        self.assertLess(log.syncs, 160)
+
+    def test_engine(self):
+        engine = PySearch.PySearch(self.base, wal=True)
+
+        for doc_id, document in EMAILS:
+            self.assertTrue(engine.index(doc_id, document))
+
+        engine.sync()
+        self.assertEqual(engine.search('peter')['total_hits'], 2)
+        self.assertTrue(engine.delete('email_1'))
+        self.assertFalse(engine.delete('email_1'))
+        self.assertEqual(engine.search('peter')['total_hits'], 1)
+
+        with engine.writer(max_docs=2) as writer:
+            for number in range(5):
+                writer.add('memo_{0}'.format(number), {'text': 'A memo about staplers.'})
+
+        engine.close()
+
+        # Closing applied everything left in the log.
+        engine = PySearch.PySearch(self.base)
+        self.assertEqual(engine.search('memo')['total_hits'], 5)
+        self.assertEqual(engine.get_total_docs(), 8)
+
+    def test_engine_replay(self):
+        written = threading.Event()
+        engine = PySearch.PySearch(self.base, wal=True)
+        engine.wal.apply = self.crash(written)
+
+        for doc_id, document in EMAILS:
+            engine.index(doc_id, document)
+
+        written.set()
+
+        with self.assertRaises(RuntimeError):
+            engine.sync()
+
+        engine.wal.close()
+        self.assertEqual(engine.get_total_docs(), 0)
+
+        engine = PySearch.PySearch(self.base, wal=True)
+        self.assertEqual(engine.get_total_docs(), len(EMAILS))
+        self.assertEqual(engine.search('peter')['total_hits'], 2)
+        engine.close()